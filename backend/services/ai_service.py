@@ -4,23 +4,109 @@ Uses Google Gemini AI with API key rotation support
 """
 
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.generativeai.client import FileServiceClient
+import asyncio
+import itertools
 import json
+import os
 import re
-from typing import Optional, List, Dict
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, AsyncIterator, Callable, Tuple, Any
+
+from backend.services.model_router import ModelRoute, ModelRouter, get_model_router
+from backend.utils.rate_limiter import DEFAULT_MODEL, parse_retry_delay
+from backend.utils.retry import FATAL, QUOTA, RATE, RetryPolicy, classify_error
+
+
+MODEL_NAME = DEFAULT_MODEL
+
+# Bump a component's version whenever its prompt (or the analyze() prompt's
+# section for it) changes, so only that component's cached outputs go stale
+PROMPT_VERSIONS = {
+    "summary": 1,
+    "key_points": 1,
+    "quiz": 1,
+}
+
+# Stands in for the transcript in prompts when it is held in cached context
+CACHED_TRANSCRIPT = "(the full transcript is provided in the cached context)"
+
+
+def bind_model_to_key(model, api_key: str, async_client: bool = False):
+    """
+    Point a GenerativeModel's (sync or async) client at one API key
+    
+    GenerativeModel takes no client argument, so this sets the client attributes
+    of the pinned SDK (google-generativeai 0.8.6). If a newer SDK drops them, the
+    model keeps using the process-wide key from genai.configure.
+    
+    Args:
+        model: GenerativeModel to bind
+        api_key: API key its requests should be sent with
+        async_client: Bind the async client (must be created inside the running event loop)
+        
+    Returns:
+        The same model
+    """
+    attribute = "_async_client" if async_client else "_client"
+    if not hasattr(model, attribute):
+        return model
+    client_class = glm.GenerativeServiceAsyncClient if async_client else glm.GenerativeServiceClient
+    setattr(model, attribute, client_class(client_options={"api_key": api_key}))
+    return model
+
+
+@dataclass
+class AnalysisResult:
+    """Summary, key points and quiz produced by a single analysis call"""
+    summary: Optional[str] = None
+    key_points: Optional[str] = None
+    quiz: Optional[List[Dict]] = None
+    
+    @property
+    def is_complete(self) -> bool:
+        """True if all three components were generated"""
+        return bool(self.summary and self.key_points and self.quiz)
+    
+    def missing_components(self) -> List[str]:
+        """Names of components that still need to be generated"""
+        return [
+            name for name in ("summary", "key_points", "quiz")
+            if not getattr(self, name)
+        ]
 
 
 class AIService:
     """Service for AI-powered content generation using Google Gemini"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, context_cache=None, key_rotator=None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 router: Optional[ModelRouter] = None):
         """
         Initialize AI service with API key
         
         Args:
             api_key: Google Gemini API key
+            context_cache: Optional ContextCache (backend.services.context_cache); long
+                           transcripts are then registered once and referenced by
+                           each request instead of being sent inline
+            key_rotator: Optional APIKeyRotator; every attempt then waits for the
+                         key's rate limits and is recorded, and quota or rate
+                         errors fail over to the next available key
+            retry_policy: Backoff, attempt and deadline settings for failed requests
+            router: Model and generation settings per task (defaults to
+                    GEMINI_MODEL_ROUTES / DEFAULT_ROUTES)
         """
         self.api_key = api_key
+        self.context_cache = context_cache
+        self.key_rotator = key_rotator
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.router = router or get_model_router()
         self.model = None
+        self.last_error = None
+        self._models: Dict[str, Any] = {}
         self.configure_api()
     
     def update_api_key(self, new_key: str):
@@ -37,25 +123,291 @@ class AIService:
         """Configure Google Gemini API"""
         try:
             genai.configure(api_key=self.api_key)
+            self._models = {}
             # Use gemini-2.5-flash for better video and content understanding
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+            self.model = self._model(MODEL_NAME)
             return True
         except Exception as e:
             print(f"Error configuring API: {str(e)}")
             return False
     
-    def generate_summary(self, transcript: str) -> Optional[str]:
+    def _model(self, model_name: str):
+        """Get (or create) a model bound to this service's key"""
+        model = self._models.get(model_name)
+        if model is None:
+            # Bound to this key so services on other keys can run concurrently
+            model = bind_model_to_key(genai.GenerativeModel(model_name), self.api_key)
+            self._models[model_name] = model
+        return model
+    
+    @staticmethod
+    def artifact_versions(router: Optional[ModelRouter] = None) -> Dict[str, str]:
         """
-        Generate comprehensive summary using Gemini
+        Cache version of each generated component: routed model plus prompt version
         
         Args:
-            transcript: Video transcript text
+            router: Model router in use (defaults to the process-wide one)
             
         Returns:
-            Generated summary or None if failed
+            Component name -> version string, e.g. {"summary": "gemini-2.5-flash/v1"}
         """
+        router = router or get_model_router()
+        return {
+            component: f"{router.route(component).model}/v{version}"
+            for component, version in PROMPT_VERSIONS.items()
+        }
+    
+    def _bind_async_client(self, model=None):
+        """Create an async client for this key (must be called inside the running event loop)"""
+        model = model or self.model
+        if isinstance(model, genai.GenerativeModel):
+            bind_model_to_key(model, self.api_key, async_client=True)
+    
+    def _with_context(self, build_prompt: Callable[[str], str], transcript: str,
+                      model_name: str = MODEL_NAME) -> Tuple[str, Any]:
+        """
+        Build a transcript prompt and pick the model to send it to
+        
+        Args:
+            build_prompt: Prompt builder taking the transcript
+            transcript: Transcript text
+            model_name: Model the task is routed to
+            
+        Returns:
+            (prompt, model) - referencing a cached context when one is available,
+            otherwise with the transcript inline and this service's model
+        """
+        if self.context_cache:
+            context = self.context_cache.acquire(self.api_key, transcript, model_name)
+            if context:
+                return build_prompt(CACHED_TRANSCRIPT), self.context_cache.model_for(context, self.api_key)
+        return build_prompt(transcript), self._model(model_name)
+    
+    async def _with_context_async(self, build_prompt: Callable[[str], str], transcript: str,
+                                  model_name: str = MODEL_NAME) -> Tuple[str, Any]:
+        """Async variant of _with_context (registration runs in a worker thread)"""
+        if self.context_cache:
+            return await asyncio.to_thread(self._with_context, build_prompt, transcript, model_name)
+        return build_prompt(transcript), self._model(model_name)
+    
+    def _generate(self, prompt, model=None, **kwargs):
+        """Send a request, remembering any error so callers can react to 429s"""
+        self.last_error = None
+        try:
+            return (model or self.model).generate_content(prompt, **kwargs)
+        except Exception as e:
+            self.last_error = e
+            raise
+    
+    async def _generate_async(self, prompt, model=None, **kwargs):
+        """Async variant of _generate"""
+        self.last_error = None
         try:
-            prompt = f"""
+            model = model or self.model
+            self._bind_async_client(model)
+            return await model.generate_content_async(prompt, **kwargs)
+        except Exception as e:
+            self.last_error = e
+            raise
+    
+    def _fail_over(self, model_name: str = MODEL_NAME) -> bool:
+        """Switch to the rotator's best other key for the model; False if there is none"""
+        if not self.key_rotator:
+            return False
+        
+        new_key = self.key_rotator.get_next_key(model_name)
+        if not new_key or new_key == self.api_key:
+            return False
+        
+        print(f"🔄 Switching to API key ...{new_key[-4:]}")
+        self.update_api_key(new_key)
+        return True
+    
+    def _slot_wait(self, started: float, route: ModelRoute, model_name: str) -> float:
+        """Longest wait for a request slot: the deadline, and the primary's latency budget"""
+        max_wait = self.retry_policy.remaining(started)
+        budget = route.budget_for(model_name)
+        return max_wait if budget is None else min(max_wait, budget)
+    
+    def _acquire(self, started: float, route: ModelRoute, model_name: str) -> Optional[str]:
+        """
+        Wait for a request slot within the deadline
+        
+        Tries every key on the current model, then moves on to the route's fallback.
+        
+        Returns:
+            The model a slot was taken for, or None if no key is available
+        """
+        if not self.key_rotator:
+            return model_name
+        
+        while model_name:
+            for _ in range(len(self.key_rotator.keys)):
+                max_wait = self._slot_wait(started, route, model_name)
+                if self.key_rotator.acquire(self.api_key, model_name, max_wait=max_wait):
+                    return model_name
+                if not self._fail_over(model_name):
+                    break
+            model_name = route.fallback_for(model_name)
+        return None
+    
+    async def _acquire_async(self, started: float, route: ModelRoute, model_name: str) -> Optional[str]:
+        """Async variant of _acquire"""
+        if not self.key_rotator:
+            return model_name
+        
+        while model_name:
+            for _ in range(len(self.key_rotator.keys)):
+                max_wait = self._slot_wait(started, route, model_name)
+                if await self.key_rotator.acquire_async(self.api_key, model_name, max_wait=max_wait):
+                    return model_name
+                if not self._fail_over(model_name):
+                    break
+            model_name = route.fallback_for(model_name)
+        return None
+    
+    def _on_success(self, model_name: str):
+        """Account for a successful request"""
+        # Errors of earlier, retried attempts no longer describe this call
+        self.last_error = None
+        if self.key_rotator:
+            self.key_rotator.record_request(self.api_key, model_name)
+            self.key_rotator.report_success(self.api_key, model_name)
+    
+    def _on_failure(self, error: Exception, attempt: int, started: float,
+                    route: ModelRoute, model_name: str) -> Tuple[Optional[float], str]:
+        """
+        Account for a failed request and decide whether to retry
+        
+        Quota and rate errors switch to another key when the rotator has one;
+        failing that - or on a 5xx or timeout (e.g. the latency budget) - the
+        route's lighter fallback model is tried, both immediately. Otherwise
+        errors back off with jitter. Fatal errors, the attempt limit and the
+        deadline end the call.
+        
+        Args:
+            error: Exception raised by the request
+            attempt: Zero-based attempt number
+            started: time.monotonic() when the call began
+            route: Route of the task
+            model_name: Model the failed request went to
+            
+        Returns:
+            (seconds to wait before retrying or None to give up, model to retry on)
+        """
+        self.last_error = error
+        kind = classify_error(error)
+        if self.key_rotator:
+            self.key_rotator.record_request(self.api_key, model_name)
+            self.key_rotator.report_failure(self.api_key, error, model_name)
+        
+        if kind == FATAL or attempt + 1 >= self.retry_policy.max_attempts:
+            return None, model_name
+        
+        fallback = route.fallback_for(model_name)
+        if kind in (QUOTA, RATE) and self._fail_over(model_name):
+            delay = 0.0
+        elif fallback:
+            print(f"↘️ {model_name} unavailable, falling back to {fallback}")
+            model_name, delay = fallback, 0.0
+        elif kind == QUOTA:
+            return None, model_name
+        else:
+            retry_after = parse_retry_delay(error) if kind == RATE else None
+            delay = self.retry_policy.backoff(attempt, retry_after)
+        
+        if delay > self.retry_policy.remaining(started):
+            return None, model_name
+        
+        print(f"🔁 {kind.capitalize()} error, retrying in {delay:.1f}s "
+              f"(attempt {attempt + 2}/{self.retry_policy.max_attempts})")
+        return delay, model_name
+    
+    @staticmethod
+    def _request_options(route: ModelRoute, model_name: str,
+                         generation_config: Optional[Dict] = None) -> Dict[str, Any]:
+        """generate_content arguments for a route: its config, plus the latency budget as timeout"""
+        options = {"generation_config": route.config_for(generation_config)}
+        budget = route.budget_for(model_name)
+        if budget:
+            options["request_options"] = {"timeout": budget}
+        return options
+    
+    def _request(self, task: str, build_prompt: Callable[[str], str], transcript: str,
+                 inline: bool = False, generation_config: Optional[Dict] = None):
+        """
+        Send a task's prompt on its routed model, retrying per the retry policy
+        
+        Args:
+            task: Routing task (see backend.services.model_router.TASKS)
+            build_prompt: Prompt builder taking the transcript
+            transcript: Transcript text
+            inline: Always send the text inline (never as cached context)
+            generation_config: Settings applied over the route's generation_config
+            
+        Returns:
+            The response (raises the last error once retries are exhausted)
+        """
+        route = self.router.route(task)
+        model_name = route.model
+        started = time.monotonic()
+        for attempt in itertools.count():
+            model_name = self._acquire(started, route, model_name)
+            if not model_name:
+                raise self.last_error or RuntimeError("No API key available within the deadline")
+            
+            # Rebuilt per attempt, so a failed-over key or model gets its own context
+            if inline:
+                prompt, model = build_prompt(transcript), self._model(model_name)
+            else:
+                prompt, model = self._with_context(build_prompt, transcript, model_name)
+            try:
+                response = self._generate(
+                    prompt, model, **self._request_options(route, model_name, generation_config)
+                )
+            except Exception as e:
+                delay, model_name = self._on_failure(e, attempt, started, route, model_name)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            
+            self._on_success(model_name)
+            return response
+    
+    async def _request_async(self, task: str, build_prompt: Callable[[str], str], transcript: str,
+                             inline: bool = False, generation_config: Optional[Dict] = None):
+        """Async variant of _request"""
+        route = self.router.route(task)
+        model_name = route.model
+        started = time.monotonic()
+        for attempt in itertools.count():
+            model_name = await self._acquire_async(started, route, model_name)
+            if not model_name:
+                raise self.last_error or RuntimeError("No API key available within the deadline")
+            
+            if inline:
+                prompt, model = build_prompt(transcript), self._model(model_name)
+            else:
+                prompt, model = await self._with_context_async(build_prompt, transcript, model_name)
+            try:
+                response = await self._generate_async(
+                    prompt, model, **self._request_options(route, model_name, generation_config)
+                )
+            except Exception as e:
+                delay, model_name = self._on_failure(e, attempt, started, route, model_name)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            
+            self._on_success(model_name)
+            return response
+    
+    @staticmethod
+    def _summary_prompt(transcript: str) -> str:
+        """Build the summary prompt"""
+        return f"""
             You are an expert educational content analyzer. Analyze the following YouTube video transcript and provide a comprehensive summary.
             
             Transcript:
@@ -69,25 +421,11 @@ class AIService:
             
             Format your response in a clear, structured way suitable for students.
             """
-            
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Error generating summary: {str(e)}")
-            return None
     
-    def extract_key_points(self, transcript: str) -> Optional[str]:
-        """
-        Extract core learning points from transcript
-        
-        Args:
-            transcript: Video transcript text
-            
-        Returns:
-            Extracted key points or None if failed
-        """
-        try:
-            prompt = f"""
+    @staticmethod
+    def _key_points_prompt(transcript: str) -> str:
+        """Build the key points prompt"""
+        return f"""
             You are an expert educator. Analyze the following YouTube video transcript and extract the most important learning points.
             
             Transcript:
@@ -101,27 +439,11 @@ class AIService:
             
             Format each point as a numbered list with brief explanations where needed.
             """
-            
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Error extracting key points: {str(e)}")
-            return None
     
-    def generate_quiz(self, transcript: str, max_retries: int = 1) -> Optional[List[Dict]]:
-        """
-        Generate exactly 10 quiz questions from transcript
-        
-        Args:
-            transcript: Video transcript text
-            max_retries: Maximum number of retry attempts
-            
-        Returns:
-            List of quiz questions or None if failed
-        """
-        for attempt in range(max_retries):
-            try:
-                prompt = f"""
+    @staticmethod
+    def _quiz_prompt(transcript: str) -> str:
+        """Build the quiz prompt"""
+        return f"""
                 You are an expert quiz creator. Based on the following YouTube video transcript, create EXACTLY 10 multiple-choice questions.
                 
                 Transcript:
@@ -152,36 +474,487 @@ class AIService:
                 
                 Return ONLY the JSON array, nothing else.
                 """
-                
-                response = self.model.generate_content(prompt)
-                quiz_text = response.text.strip()
-                
-                # Extract JSON from response
-                json_match = re.search(r'\[.*\]', quiz_text, re.DOTALL)
-                if json_match:
-                    quiz_json = json_match.group(0)
-                    quiz_data = json.loads(quiz_json)
-                    
-                    # Ensure exactly 10 questions
-                    if len(quiz_data) == 10:
-                        return quiz_data
-                    elif len(quiz_data) > 10:
-                        return quiz_data[:10]
-                    else:
-                        # Less than 10, retry
-                        print(f"Generated {len(quiz_data)} questions, retrying... (Attempt {attempt + 1})")
-                        continue
-                else:
-                    print(f"Could not parse quiz JSON, retrying... (Attempt {attempt + 1})")
-                    continue
-                    
-            except json.JSONDecodeError as e:
-                print(f"Error parsing quiz JSON: {str(e)}, retrying... (Attempt {attempt + 1})")
-                continue
+    
+    @staticmethod
+    def _analysis_prompt(transcript: str) -> str:
+        """Build the combined summary + key points + quiz prompt"""
+        return f"""
+            You are an expert educator and quiz creator. Analyze the following YouTube video transcript.
+            
+            Transcript:
+            {transcript}
+            
+            Produce three things:
+            
+            1. "summary": A comprehensive summary in Markdown suitable for students, containing
+               a brief overview (2-3 sentences), main topics covered (bullet points),
+               a detailed summary organized by sections, and key takeaways.
+            
+            2. "key_points": 8-12 core learning points that students MUST remember, in Markdown
+               as a numbered list with brief explanations where needed. They should be factual,
+               specific, exam-oriented, clear and concise, and cover all major concepts.
+            
+            3. "quiz": EXACTLY 10 multiple-choice questions testing understanding of key concepts.
+               Each question must have 4 options (A, B, C, D) and only ONE correct answer.
+               Include a mix of difficulty levels (easy, medium, hard).
+            
+            Format your response as a single JSON object with this structure:
+            {{
+                "summary": "Markdown summary here",
+                "key_points": "Markdown numbered list here",
+                "quiz": [
+                    {{
+                        "question": "Question text here?",
+                        "options": {{
+                            "A": "Option A text",
+                            "B": "Option B text",
+                            "C": "Option C text",
+                            "D": "Option D text"
+                        }},
+                        "correct_answer": "A",
+                        "explanation": "Brief explanation of why this is correct"
+                    }}
+                ]
+            }}
+            
+            Return ONLY the JSON object, nothing else.
+            """
+    
+    @staticmethod
+    def _chunk_prompt(chunk_text: str, label: str, total: int) -> str:
+        """Build the map-step prompt for one chunk of a long transcript"""
+        return f"""
+            You are an expert note-taker. The following is {label} of {total} of a long YouTube video transcript.
+            
+            Transcript excerpt:
+            {chunk_text}
+            
+            Write dense, well-organized notes for this excerpt that capture:
+            - Every topic and concept covered, in order
+            - Important facts, definitions, formulas, names and numbers
+            - Examples and explanations that clarify the concepts
+            
+            These notes will be combined with notes from the other parts to produce a summary,
+            key learning points and a quiz, so do not omit anything that could be examined.
+            Return only the notes in Markdown.
+            """
+    
+    @staticmethod
+    def _transcription_prompt(label: str) -> str:
+        """Build the prompt for transcribing one audio segment with timestamps"""
+        return f"""
+            Transcribe this audio clip ({label}) of a YouTube video completely and accurately.
+            
+            Return ONLY a JSON array with one object per sentence or short passage, in order:
+            [{{"start": 12.5, "text": "exact spoken words"}}]
+            
+            - "start": seconds from the beginning of THIS clip where the passage begins
+            - "text": the spoken words only - no commentary, speaker labels or notes
+            - The clip may begin or end mid-sentence; transcribe those partial words too
+            """
+    
+    @staticmethod
+    def _file_transcription_prompt() -> str:
+        """Build the prompt for transcribing a whole uploaded audio file"""
+        return """Please transcribe this audio file completely and accurately.
+Provide the full transcription of all spoken content.
+Do not add any commentary or notes - just the transcription."""
+    
+    def generate_summary(self, transcript: str) -> Optional[str]:
+        """
+        Generate comprehensive summary using Gemini
+        
+        Args:
+            transcript: Video transcript text
+            
+        Returns:
+            Generated summary or None if failed
+        """
+        try:
+            response = self._request("summary", self._summary_prompt, transcript)
+            return response.text
+        except Exception as e:
+            print(f"Error generating summary: {str(e)}")
+            return None
+    
+    def extract_key_points(self, transcript: str) -> Optional[str]:
+        """
+        Extract core learning points from transcript
+        
+        Args:
+            transcript: Video transcript text
+            
+        Returns:
+            Extracted key points or None if failed
+        """
+        try:
+            response = self._request("key_points", self._key_points_prompt, transcript)
+            return response.text
+        except Exception as e:
+            print(f"Error extracting key points: {str(e)}")
+            return None
+    
+    def generate_quiz(self, transcript: str, max_retries: int = 2) -> Optional[List[Dict]]:
+        """
+        Generate exactly 10 quiz questions from transcript
+        
+        Args:
+            transcript: Video transcript text
+            max_retries: Attempts at getting a usable quiz (API errors are retried
+                         separately, per the retry policy)
+            
+        Returns:
+            List of quiz questions or None if failed
+        """
+        try:
+            for attempt in range(max_retries):
+                response = self._request("quiz", self._quiz_prompt, transcript)
+                quiz_data = self._parse_quiz(response.text, attempt)
+                if quiz_data:
+                    return quiz_data
+        except Exception as e:
+            print(f"Error generating quiz: {str(e)}")
+            return None
+        
+        # If every answer was unusable
+        print(f"Failed to generate quiz after {max_retries} attempts")
+        return None
+    
+    def analyze(self, transcript: str) -> Optional[AnalysisResult]:
+        """
+        Generate summary, key points and quiz in a single structured call
+        
+        Sends the transcript once and asks Gemini for a JSON object holding
+        all three components, so one video costs one request instead of three.
+        
+        Args:
+            transcript: Video transcript text
+            
+        Returns:
+            AnalysisResult (components that failed to parse are None) or None if failed
+        """
+        try:
+            response = self._request(
+                "analysis", self._analysis_prompt, transcript,
+                generation_config={"response_mime_type": "application/json"}
+            )
+            return self._parse_analysis(response.text)
+        except Exception as e:
+            print(f"Error analyzing transcript: {str(e)}")
+            return None
+    
+    def summarize_chunk(self, chunk_text: str, label: str, total: int) -> Optional[str]:
+        """
+        Map step: condense one chunk of a long transcript into notes
+        
+        Args:
+            chunk_text: Transcript excerpt
+            label: Position of the chunk (e.g. "Part 2 (10:05-20:11)")
+            total: Number of chunks in the transcript
+            
+        Returns:
+            Notes for the chunk or None if failed
+        """
+        try:
+            response = self._request(
+                "chunk_map", lambda text: self._chunk_prompt(text, label, total), chunk_text, inline=True
+            )
+            return response.text
+        except Exception as e:
+            print(f"Error summarizing chunk: {str(e)}")
+            return None
+    
+    async def summarize_chunk_async(self, chunk_text: str, label: str, total: int) -> Optional[str]:
+        """Async variant of summarize_chunk"""
+        try:
+            response = await self._request_async(
+                "chunk_map", lambda text: self._chunk_prompt(text, label, total), chunk_text, inline=True
+            )
+            return response.text
+        except Exception as e:
+            print(f"Error summarizing chunk: {str(e)}")
+            return None
+    
+    async def transcribe_audio_async(self, audio: bytes, mime_type: str, label: str) -> Optional[List[Dict]]:
+        """
+        Transcribe one audio segment, sent inline, into timestamped passages
+        
+        Args:
+            audio: Encoded audio of the segment
+            mime_type: Its MIME type (e.g. "audio/mp3")
+            label: Position of the segment (e.g. "Part 2 (10:00-20:15)")
+            
+        Returns:
+            [{"start": seconds from the segment start, "text": ...}] or None if failed
+        """
+        try:
+            response = await self._request_async(
+                "transcription",
+                lambda _: [self._transcription_prompt(label), {"mime_type": mime_type, "data": audio}],
+                "",
+                inline=True,
+                generation_config={"response_mime_type": "application/json"}
+            )
+            return self._parse_timed_passages(response.text)
+        except Exception as e:
+            print(f"Error transcribing {label}: {str(e)}")
+            return None
+    
+    def transcribe_file(self, audio_path: str, mime_type: Optional[str] = None,
+                        stats: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Transcribe a whole audio file uploaded through the File API
+        
+        Runs as a "transcription" request with this service's rate limiting,
+        usage accounting, retries and key failover. Uploads belong to the
+        uploading key's project, so the file is uploaded again if the request
+        fails over to another key; every upload is deleted afterwards.
+        
+        Args:
+            audio_path: Path to audio file
+            mime_type: Its MIME type (None: guessed from the extension)
+            stats: Optional dict that receives "upload_seconds"
+            
+        Returns:
+            Transcribed text or None if failed
+        """
+        uploads: Dict[str, Tuple[FileServiceClient, Any]] = {}
+        
+        def build_prompt(_):
+            if self.api_key not in uploads:
+                # A file client bound to this key, like the models from _model()
+                client = FileServiceClient(client_options={"api_key": self.api_key})
+                print("📤 Uploading audio to Gemini...")
+                started = time.monotonic()
+                uploads[self.api_key] = (client, client.create_file(
+                    path=audio_path, mime_type=mime_type, display_name=os.path.basename(audio_path)
+                ))
+                if stats is not None:
+                    stats["upload_seconds"] = round(time.monotonic() - started, 2)
+                print(f"✅ Uploaded in {time.monotonic() - started:.1f}s")
+            return [self._file_transcription_prompt(), uploads[self.api_key][1]]
+        
+        try:
+            response = self._request("transcription", build_prompt, "", inline=True)
+            return response.text.strip()
+        except Exception as e:
+            if classify_error(e) == QUOTA:
+                print("❌ API Quota Exceeded: daily request limit reached on every key")
+                print("   Please wait 24 hours or use videos with captions")
+            else:
+                print(f"❌ Error transcribing audio: {str(e)}")
+            return None
+        finally:
+            for client, uploaded in uploads.values():
+                try:
+                    client.delete_file(name=uploaded.name)
+                except Exception:
+                    pass
+    
+    async def _stream_async(self, task: str, build_prompt: Callable[[str], str],
+                            transcript: str) -> AsyncIterator[str]:
+        """
+        Yield response text chunks of a task's routed model as they arrive
+        
+        Failures before the first chunk are retried like any request; once text
+        has been yielded an error ends the stream. Either way the error that
+        ended it is raised, so a consumer that gets through the iteration
+        without one has the complete text.
+        """
+        self.last_error = None
+        route = self.router.route(task)
+        model_name = route.model
+        started = time.monotonic()
+        for attempt in itertools.count():
+            model_name = await self._acquire_async(started, route, model_name)
+            if not model_name:
+                raise self.last_error or RuntimeError("No API key available within the deadline")
+            
+            streamed = False
+            try:
+                prompt, model = await self._with_context_async(build_prompt, transcript, model_name)
+                self._bind_async_client(model)
+                response = await model.generate_content_async(
+                    prompt, stream=True, **self._request_options(route, model_name)
+                )
+                async for chunk in response:
+                    if chunk.parts:
+                        streamed = True
+                        yield chunk.text
             except Exception as e:
-                print(f"Error generating quiz: {str(e)}, retrying... (Attempt {attempt + 1})")
+                delay, model_name = self._on_failure(e, attempt, started, route, model_name)
+                if delay is None or streamed:
+                    print(f"Error streaming response: {str(e)}")
+                    raise
+                await asyncio.sleep(delay)
                 continue
+            
+            self._on_success(model_name)
+            return
+    
+    def stream_summary_async(self, transcript: str) -> AsyncIterator[str]:
+        """
+        Stream the summary as it is generated
+        
+        Args:
+            transcript: Video transcript text
+            
+        Returns:
+            Async iterator of text chunks; raises if the stream could not be completed
+        """
+        return self._stream_async("summary", self._summary_prompt, transcript)
+    
+    def stream_key_points_async(self, transcript: str) -> AsyncIterator[str]:
+        """
+        Stream the key points as they are generated
+        
+        Args:
+            transcript: Video transcript text
+            
+        Returns:
+            Async iterator of text chunks; raises if the stream could not be completed
+        """
+        return self._stream_async("key_points", self._key_points_prompt, transcript)
+    
+    async def generate_summary_async(self, transcript: str) -> Optional[str]:
+        """Async variant of generate_summary"""
+        try:
+            response = await self._request_async("summary", self._summary_prompt, transcript)
+            return response.text
+        except Exception as e:
+            print(f"Error generating summary: {str(e)}")
+            return None
+    
+    async def extract_key_points_async(self, transcript: str) -> Optional[str]:
+        """Async variant of extract_key_points"""
+        try:
+            response = await self._request_async("key_points", self._key_points_prompt, transcript)
+            return response.text
+        except Exception as e:
+            print(f"Error extracting key points: {str(e)}")
+            return None
+    
+    async def generate_quiz_async(self, transcript: str, max_retries: int = 2) -> Optional[List[Dict]]:
+        """Async variant of generate_quiz"""
+        try:
+            for attempt in range(max_retries):
+                response = await self._request_async("quiz", self._quiz_prompt, transcript)
+                quiz_data = self._parse_quiz(response.text, attempt)
+                if quiz_data:
+                    return quiz_data
+        except Exception as e:
+            print(f"Error generating quiz: {str(e)}")
+            return None
         
-        # If all retries failed
         print(f"Failed to generate quiz after {max_retries} attempts")
         return None
+    
+    async def analyze_async(self, transcript: str) -> Optional[AnalysisResult]:
+        """Async variant of analyze"""
+        try:
+            response = await self._request_async(
+                "analysis", self._analysis_prompt, transcript,
+                generation_config={"response_mime_type": "application/json"}
+            )
+            return self._parse_analysis(response.text)
+        except Exception as e:
+            print(f"Error analyzing transcript: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _parse_quiz(text: str, attempt: int = 0) -> Optional[List[Dict]]:
+        """
+        Parse the JSON array returned by a quiz call
+        
+        Args:
+            text: Raw model response
+            attempt: Zero-based attempt number (for log messages)
+            
+        Returns:
+            List of exactly 10 questions or None if unusable
+        """
+        # Extract JSON from response
+        json_match = re.search(r'\[.*\]', text.strip(), re.DOTALL)
+        if not json_match:
+            print(f"Could not parse quiz JSON, retrying... (Attempt {attempt + 1})")
+            return None
+        
+        try:
+            quiz_data = AIService._normalize_quiz(json.loads(json_match.group(0)))
+        except json.JSONDecodeError as e:
+            print(f"Error parsing quiz JSON: {str(e)}, retrying... (Attempt {attempt + 1})")
+            return None
+        
+        if not quiz_data:
+            # Less than 10, retry
+            print(f"Generated too few questions, retrying... (Attempt {attempt + 1})")
+        return quiz_data
+    
+    @staticmethod
+    def _parse_analysis(text: str) -> Optional[AnalysisResult]:
+        """Parse the JSON object returned by an analysis call"""
+        json_match = re.search(r'\{.*\}', text.strip(), re.DOTALL)
+        if not json_match:
+            print("Could not parse analysis JSON")
+            return None
+        
+        try:
+            data = json.loads(json_match.group(0))
+        except json.JSONDecodeError as e:
+            print(f"Error parsing analysis JSON: {str(e)}")
+            return None
+        
+        summary = data.get("summary")
+        key_points = data.get("key_points")
+        quiz = data.get("quiz")
+        
+        return AnalysisResult(
+            summary=summary.strip() if isinstance(summary, str) and summary.strip() else None,
+            key_points=key_points.strip() if isinstance(key_points, str) and key_points.strip() else None,
+            quiz=AIService._normalize_quiz(quiz) if isinstance(quiz, list) else None
+        )
+    
+    @staticmethod
+    def _parse_timed_passages(text: str) -> Optional[List[Dict]]:
+        """Parse the JSON array returned by a segment transcription call"""
+        json_match = re.search(r'\[.*\]', text.strip(), re.DOTALL)
+        if not json_match:
+            print("Could not parse transcription JSON")
+            return None
+        
+        try:
+            items = json.loads(json_match.group(0))
+        except json.JSONDecodeError as e:
+            print(f"Error parsing transcription JSON: {str(e)}")
+            return None
+        
+        passages = []
+        for item in items:
+            if not isinstance(item, dict) or not str(item.get("text", "")).strip():
+                continue
+            start = item.get("start", 0)
+            if isinstance(start, str):
+                # Tolerate "MM:SS" / "HH:MM:SS" timestamps
+                try:
+                    start = sum(float(part) * 60 ** i for i, part in enumerate(reversed(start.split(":"))))
+                except ValueError:
+                    start = 0
+            passages.append({"start": max(0.0, float(start or 0)), "text": str(item["text"]).strip()})
+        
+        return sorted(passages, key=lambda passage: passage["start"]) or None
+    
+    @staticmethod
+    def _normalize_quiz(quiz_data: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Ensure a quiz has exactly 10 questions
+        
+        Args:
+            quiz_data: Parsed quiz questions
+            
+        Returns:
+            First 10 questions, or None if fewer were generated
+        """
+        if len(quiz_data) < 10:
+            print(f"Generated {len(quiz_data)} questions, expected 10")
+            return None
+        return quiz_data[:10]
@@ -0,0 +1,375 @@
+"""
+Batch Ingestion
+Pre-processes a list of YouTube URLs or video IDs into the cache without the
+UI, so course catalogs can be warmed overnight. Progress is checkpointed, and
+a run stopped by quota exhaustion resumes where it left off
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.ai_service import AIService
+from backend.services.context_cache import GeminiContextCache
+from backend.services.pipeline import ProcessingPipeline, StageEvent
+from backend.services.playlist_service import Playlist, PlaylistService
+from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.cache_manager import CacheManager, COMPONENTS, DEFAULT_TTL
+from backend.utils.url_utils import URLUtils
+
+
+_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Requests a video needs in the worst case (one per generation stage); a video
+# is only started while the key pool has at least this much daily quota left
+REQUESTS_PER_VIDEO = 3
+
+# Exit codes: all done, some videos failed, stopped on quota (rerun to resume)
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_QUOTA = 2
+
+
+def read_video_ids(path: Path, playlists: Optional[PlaylistService] = None
+                   ) -> Tuple[List[str], List[Playlist]]:
+    """
+    Read video IDs from a file of URLs or IDs (one per line, # for comments)
+    
+    Args:
+        path: Input file
+        playlists: Expands playlist and channel URLs (they are skipped without it)
+        
+    Returns:
+        (unique video IDs in file order, expanded playlists)
+    """
+    video_ids = []
+    expanded = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            entry = line.split("#", 1)[0].strip()
+            if not entry:
+                continue
+            
+            if URLUtils.is_collection_url(entry):
+                playlist = playlists.expand(entry) if playlists else None
+                if not playlist:
+                    print(f"⚠️ Line {line_number}: could not expand playlist: {entry}")
+                    continue
+                expanded.append(playlist)
+                found = playlist.video_ids
+            else:
+                video_id = entry if _VIDEO_ID.match(entry) else URLUtils.extract_video_id(entry)
+                if not video_id:
+                    print(f"⚠️ Line {line_number}: not a YouTube URL or video ID: {entry}")
+                    continue
+                found = [video_id]
+            
+            for video_id in found:
+                if video_id not in seen:
+                    seen.add(video_id)
+                    video_ids.append(video_id)
+    return video_ids, expanded
+
+
+class Checkpoint:
+    """Per-video batch progress, saved as JSON after every change"""
+    
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Load (or start) a checkpoint
+        
+        Args:
+            path: Checkpoint file, or None to keep progress in memory only
+        """
+        self.path = Path(path) if path else None
+        self.videos: Dict[str, Dict[str, Any]] = {}
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.videos = json.load(f).get("videos", {})
+                print(f"📍 Resuming from checkpoint {self.path} ({len(self.videos)} entries)")
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable checkpoint {self.path}: {e}")
+    
+    def attempts(self, video_id: str) -> int:
+        """Failed attempts recorded for a video"""
+        return self.videos.get(video_id, {}).get("attempts", 0)
+    
+    def mark(self, video_id: str, status: str, error: Optional[str] = None):
+        """
+        Record a video's outcome
+        
+        Args:
+            video_id: YouTube video ID
+            status: "done", "cached", "failed" or "pending"
+            error: Failure reason, if any
+        """
+        entry = self.videos.setdefault(video_id, {"attempts": 0})
+        entry["status"] = status
+        entry["updated_at"] = datetime.now().isoformat()
+        if status == "failed":
+            entry["attempts"] += 1
+            entry["error"] = error
+        else:
+            entry.pop("error", None)
+        self._save()
+    
+    def _save(self):
+        """Write atomically, so an interrupted run never leaves a truncated file"""
+        if not self.path:
+            return
+        temp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(temp_path, 'w') as f:
+            json.dump({"videos": self.videos}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+@dataclass
+class BatchReport:
+    """Outcome of a batch run"""
+    done: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    pending: List[str] = field(default_factory=list)
+    quota_exhausted: bool = False
+    
+    @property
+    def exit_code(self) -> int:
+        if self.quota_exhausted:
+            return EXIT_QUOTA
+        return EXIT_FAILURES if self.failed else EXIT_OK
+    
+    def stats(self, video_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Count outcomes, optionally for a subset of videos (e.g. one playlist)
+        
+        Args:
+            video_ids: Videos to count, or None for the whole batch
+            
+        Returns:
+            {"done": ..., "cached": ..., "failed": ..., "pending": ...}
+        """
+        wanted = set(video_ids) if video_ids is not None else None
+        return {
+            status: sum(1 for video_id in getattr(self, status) if wanted is None or video_id in wanted)
+            for status in ("done", "cached", "failed", "pending")
+        }
+
+
+class BatchIngestor:
+    """Runs the processing pipeline over many videos with a bounded worker pool"""
+    
+    def __init__(self, key_rotator: APIKeyRotator, cache: CacheManager, checkpoint: Checkpoint,
+                 workers: int = 2, max_attempts: int = 3, mode: str = "auto",
+                 context_cache=None,
+                 on_progress: Optional[Callable[[str, str], None]] = None):
+        """
+        Initialize batch ingestor
+        
+        Args:
+            key_rotator: Source of API keys and quota
+            cache: Cache the results are written to
+            checkpoint: Progress record shared across runs
+            workers: Videos processed concurrently (capped by the keys with quota left)
+            max_attempts: Failed attempts after which a video is skipped on later runs
+            mode: Pipeline mode ("auto", "parallel" or "single")
+            context_cache: Optional ContextCache passed to the pipeline
+            on_progress: Optional callback receiving (video_id, status) as each video
+                         is started ("processing") and finished ("done", "cached",
+                         "failed" or "pending")
+        """
+        self.key_rotator = key_rotator
+        self.cache = cache
+        self.checkpoint = checkpoint
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.mode = mode
+        self.context_cache = context_cache
+        self.on_progress = on_progress
+        self._quota_exhausted = asyncio.Event()
+    
+    def _is_cached(self, video_id: str) -> bool:
+        """All components cached (checked without counting a cache hit or miss)"""
+        return len(self.cache.get_cached_components(video_id)) == len(COMPONENTS)
+    
+    def _remaining_quota(self) -> int:
+        """Requests left today across the whole key pool (0 for keys the server reported exhausted)"""
+        return self.key_rotator.remaining_requests()
+    
+    def _progress(self, video_id: str, status: str):
+        """Send a per-video progress update to the listener, if any"""
+        if self.on_progress:
+            self.on_progress(video_id, status)
+    
+    def _pipeline(self, video_id: str) -> ProcessingPipeline:
+        """Pipeline for one video, logging its stage events"""
+        def on_event(event: StageEvent):
+            if event.status in ("completed", "cached", "failed"):
+                icon = {"completed": "✅", "cached": "♻️", "failed": "❌"}[event.status]
+                print(f"   [{video_id}] {icon} {event.stage} ({event.elapsed:.1f}s)")
+        
+        return ProcessingPipeline(
+            self.key_rotator,
+            cache=self.cache,
+            on_event=on_event,
+            mode=self.mode,
+            context_cache=self.context_cache
+        )
+    
+    async def run(self, video_ids: List[str]) -> BatchReport:
+        """
+        Process every video that is not cached yet
+        
+        Args:
+            video_ids: Videos to ingest
+            
+        Returns:
+            BatchReport
+        """
+        report = BatchReport()
+        queue: asyncio.Queue = asyncio.Queue()
+        for video_id in video_ids:
+            if self._is_cached(video_id):
+                report.cached.append(video_id)
+                self.checkpoint.mark(video_id, "cached")
+                self._progress(video_id, "cached")
+            elif self.checkpoint.attempts(video_id) >= self.max_attempts:
+                print(f"⏭️ [{video_id}] skipped after {self.max_attempts} failed attempts")
+                report.failed.append(video_id)
+                self._progress(video_id, "failed")
+            else:
+                queue.put_nowait(video_id)
+        
+        print(f"📋 {len(video_ids)} videos: {len(report.cached)} already cached, {queue.qsize()} to process")
+        
+        # One worker per key with quota left (up to --workers), so workers rarely queue on a key
+        workers = min(self.workers, queue.qsize(), len(self.key_rotator.get_available_keys(self.workers)))
+        if queue.qsize() and not workers:
+            self._quota_exhausted.set()
+        
+        await asyncio.gather(*[self._worker(queue, report) for _ in range(workers)])
+        
+        while not queue.empty():
+            video_id = queue.get_nowait()
+            report.pending.append(video_id)
+            self._progress(video_id, "pending")
+        report.quota_exhausted = self._quota_exhausted.is_set()
+        return report
+    
+    async def _worker(self, queue: asyncio.Queue, report: BatchReport):
+        """Take videos off the queue until it is empty or quota runs out"""
+        while not queue.empty() and not self._quota_exhausted.is_set():
+            if self._remaining_quota() < REQUESTS_PER_VIDEO:
+                self._quota_exhausted.set()
+                return
+            
+            video_id = queue.get_nowait()
+            self._progress(video_id, "processing")
+            status = await self._process(video_id)
+            self._progress(video_id, status)
+            if status == "pending":
+                # Interrupted by quota: leave it for the next run
+                report.pending.append(video_id)
+            else:
+                getattr(report, status).append(video_id)
+    
+    async def _process(self, video_id: str) -> str:
+        """
+        Run the pipeline for one video and checkpoint the outcome
+        
+        Returns:
+            "done", "failed" or "pending" (stopped by quota; resumes from the cache)
+        """
+        started = time.monotonic()
+        print(f"▶️ [{video_id}] processing")
+        try:
+            result = await self._pipeline(video_id).run(video_id)
+        except Exception as e:
+            print(f"❌ [{video_id}] {str(e)}")
+            self.checkpoint.mark(video_id, "failed", error=str(e))
+            return "failed"
+        
+        missing = result.analysis.missing_components() if result.transcript else list(COMPONENTS)
+        if not missing:
+            print(f"✅ [{video_id}] cached in {time.monotonic() - started:.1f}s")
+            self.checkpoint.mark(video_id, "done")
+            return "done"
+        
+        if result.transcript and not self.key_rotator.has_available_quota():
+            print(f"⏸️ [{video_id}] quota exhausted, missing: {', '.join(missing)}")
+            self._quota_exhausted.set()
+            self.checkpoint.mark(video_id, "pending")
+            return "pending"
+        
+        error = result.error or f"could not generate {', '.join(missing)}"
+        print(f"❌ [{video_id}] {error}")
+        self.checkpoint.mark(video_id, "failed", error=error)
+        return "failed"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point (see ingest.py)
+    
+    Args:
+        argv: Arguments (defaults to sys.argv)
+        
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(
+        description="Pre-process YouTube videos into the cache (summary, key points, quiz)"
+    )
+    parser.add_argument("input", type=Path, help="File with one YouTube URL or video ID per line")
+    parser.add_argument("--checkpoint", type=Path,
+                        help="Progress file (default: <input>.checkpoint.json)")
+    parser.add_argument("--workers", type=int, default=2, help="Videos processed concurrently")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Skip videos that already failed this many times")
+    parser.add_argument("--mode", choices=("auto", "parallel", "single"), default="auto",
+                        help="Pipeline mode")
+    parser.add_argument("--cache-dir", default="cache", help="Cache directory")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Register long transcripts as Gemini cached context")
+    args = parser.parse_args(argv)
+    
+    video_ids, playlists = read_video_ids(args.input, PlaylistService(args.cache_dir))
+    if not video_ids:
+        print("❌ No video IDs found in input")
+        return EXIT_FAILURES
+    
+    cache = CacheManager(
+        cache_dir=args.cache_dir,
+        max_bytes=int(os.getenv("CACHE_MAX_MB", "500")) * 1024 * 1024,
+        ttl=DEFAULT_TTL,
+        versions=AIService.artifact_versions()
+    )
+    ingestor = BatchIngestor(
+        APIKeyRotator(),
+        cache,
+        Checkpoint(args.checkpoint or args.input.with_suffix(".checkpoint.json")),
+        workers=args.workers,
+        max_attempts=args.max_attempts,
+        mode=args.mode,
+        context_cache=GeminiContextCache() if args.context_cache else None
+    )
+    report = asyncio.run(ingestor.run(video_ids))
+    
+    print(f"\n📊 Done: {len(report.done)}, already cached: {len(report.cached)}, "
+          f"failed: {len(report.failed)}, pending: {len(report.pending)}")
+    for playlist in playlists:
+        stats = report.stats(playlist.video_ids)
+        print(f"   📚 {playlist.title} ({len(playlist.entries)} videos, "
+              f"{playlist.total_duration / 3600:.1f} h): {stats['done']} done, {stats['cached']} cached, "
+              f"{stats['failed']} failed, {stats['pending']} pending")
+    if report.quota_exhausted:
+        print("⏸️ API quota exhausted - rerun the same command to resume once quota resets")
+    return report.exit_code
@@ -0,0 +1,266 @@
+"""
+Caption Discovery
+Lists a video's caption tracks once, picks the best one by a configurable
+language and manual-vs-generated preference, and caches the track list
+per video so later lookups (and videos without captions) skip YouTube
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from youtube_transcript_api import (
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+    YouTubeTranscriptApi,
+)
+
+
+# Track lists rarely change; videos without captions are rechecked sooner,
+# since auto-generated captions appear some time after upload
+DEFAULT_TRACKS_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_NO_CAPTIONS_TTL_SECONDS = 60 * 60
+
+# A live track listing (needed to download a track) is reused for this long
+_LIVE_LISTING_SECONDS = 5 * 60
+
+# Listing errors that mean "this video has no usable captions" (cached), as
+# opposed to network or blocking errors (not cached)
+_NO_CAPTIONS_ERRORS = (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable)
+
+
+@dataclass
+class CaptionTrack:
+    """Metadata of one caption track"""
+    language: str
+    language_code: str
+    is_generated: bool
+    is_translatable: bool = False
+
+
+class CaptionDiscovery:
+    """Caption track listing, selection and download with a per-video metadata cache"""
+    
+    def __init__(self, cache_dir: str = "cache", languages: Optional[List[str]] = None,
+                 prefer_manual: bool = True, any_language: bool = True,
+                 ttl: float = DEFAULT_TRACKS_TTL_SECONDS,
+                 no_captions_ttl: float = DEFAULT_NO_CAPTIONS_TTL_SECONDS):
+        """
+        Initialize caption discovery
+        
+        Args:
+            cache_dir: Directory of the metadata database
+            languages: Preferred language codes, best first (a code also matches its
+                       regional variants, e.g. "en" matches "en-GB")
+            prefer_manual: Prefer uploaded captions over auto-generated ones in the
+                           same language
+            any_language: Fall back to any track when no preferred language exists
+            ttl: Seconds a cached track list is trusted
+            no_captions_ttl: Seconds a "no captions" result is trusted
+        """
+        self.languages = languages or ["en"]
+        self.prefer_manual = prefer_manual
+        self.any_language = any_language
+        self.ttl = ttl
+        self.no_captions_ttl = no_captions_ttl
+        self._live: Dict[str, Tuple[float, Any]] = {}
+        
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path / "metadata.db", check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS caption_tracks (
+                    video_id TEXT PRIMARY KEY,
+                    tracks TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+    
+    @classmethod
+    def from_env(cls, cache_dir: str = "cache") -> "CaptionDiscovery":
+        """
+        Build from CAPTION_LANGUAGES (e.g. "en,hi") and CAPTION_PREFERENCE
+        ("manual" or "generated")
+        
+        Returns:
+            CaptionDiscovery
+        """
+        languages = [code.strip() for code in os.getenv("CAPTION_LANGUAGES", "en").split(",") if code.strip()]
+        prefer_manual = os.getenv("CAPTION_PREFERENCE", "manual").strip().lower() != "generated"
+        return cls(cache_dir, languages=languages, prefer_manual=prefer_manual)
+    
+    @staticmethod
+    def _list(video_id: str):
+        """List tracks with whichever youtube-transcript-api version is installed"""
+        if hasattr(YouTubeTranscriptApi, "list_transcripts"):
+            return YouTubeTranscriptApi.list_transcripts(video_id)
+        return YouTubeTranscriptApi().list(video_id)
+    
+    def tracks(self, video_id: str, refresh: bool = False) -> Optional[List[CaptionTrack]]:
+        """
+        Caption tracks of a video, from the metadata cache when fresh
+        
+        Args:
+            video_id: YouTube video ID
+            refresh: Ignore the cached track list
+            
+        Returns:
+            Track list (empty if the video has no captions), or None if listing failed
+        """
+        if not refresh:
+            cached = self._load(video_id)
+            if cached is not None:
+                return cached
+        
+        try:
+            listing = self._list(video_id)
+        except _NO_CAPTIONS_ERRORS as e:
+            print(f"⚠️ No captions for {video_id}: {type(e).__name__}")
+            self._store(video_id, [])
+            return []
+        except Exception as e:
+            print(f"⚠️ Could not list captions: {str(e)}")
+            return None
+        
+        with self._lock:
+            self._live[video_id] = (time.monotonic(), listing)
+        tracks = [
+            CaptionTrack(
+                language=track.language,
+                language_code=track.language_code,
+                is_generated=track.is_generated,
+                is_translatable=track.is_translatable
+            )
+            for track in listing
+        ]
+        self._store(video_id, tracks)
+        return tracks
+    
+    def select(self, tracks: List[CaptionTrack]) -> Optional[CaptionTrack]:
+        """
+        Pick the best track by language preference, then manual vs generated
+        
+        Args:
+            tracks: Available tracks
+            
+        Returns:
+            Best track, or None if none is acceptable
+        """
+        def kind_rank(track: CaptionTrack) -> int:
+            return int(track.is_generated == self.prefer_manual)
+        
+        for language in self.languages:
+            matches = [
+                track for track in tracks
+                if track.language_code == language or track.language_code.startswith(language + "-")
+            ]
+            if matches:
+                # Stable sort: exact code before regional variant of the same kind
+                return sorted(matches, key=lambda track: (kind_rank(track), track.language_code != language))[0]
+        
+        if self.any_language and tracks:
+            return sorted(tracks, key=kind_rank)[0]
+        return None
+    
+    def fetch(self, video_id: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """
+        Download the best caption track
+        
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            Tuple of (transcript_text, segments) or (None, None) if there are no usable captions
+        """
+        tracks = self.tracks(video_id)
+        if not tracks:
+            return None, None
+        
+        track = self.select(tracks)
+        if not track:
+            print(f"⚠️ No captions in {', '.join(self.languages)}")
+            return None, None
+        
+        try:
+            listing = self._live_listing(video_id) or self._list(video_id)
+            source = next(
+                candidate for candidate in listing
+                if candidate.language_code == track.language_code
+                and candidate.is_generated == track.is_generated
+            )
+            data = source.fetch()
+        except Exception as e:
+            # The cached track list may be out of date
+            print(f"⚠️ Could not fetch {track.language_code} captions: {str(e) or type(e).__name__}")
+            self.invalidate(video_id)
+            return None, None
+        
+        # youtube-transcript-api 1.x returns snippet objects, 0.x plain dicts
+        segments = data.to_raw_data() if hasattr(data, "to_raw_data") else list(data)
+        transcript_text = " ".join(segment["text"] for segment in segments)
+        kind = "auto-generated" if track.is_generated else "manual"
+        print(f"✅ Extracted transcript from {kind} {track.language_code} captions: {len(transcript_text)} characters")
+        return transcript_text, segments
+    
+    def _live_listing(self, video_id: str):
+        """Listing fetched moments ago by tracks(), if still usable"""
+        cutoff = time.monotonic() - _LIVE_LISTING_SECONDS
+        with self._lock:
+            entry = self._live.pop(video_id, None)
+            # Drop listings nobody fetched from, so the dict stays small
+            for stale in [key for key, (listed_at, _) in self._live.items() if listed_at < cutoff]:
+                del self._live[stale]
+        if entry and entry[0] >= cutoff:
+            return entry[1]
+        return None
+    
+    def invalidate(self, video_id: str):
+        """Forget a video's cached track list"""
+        with self._lock, self._conn:
+            self._live.pop(video_id, None)
+            self._conn.execute("DELETE FROM caption_tracks WHERE video_id = ?", (video_id,))
+    
+    def _load(self, video_id: str) -> Optional[List[CaptionTrack]]:
+        """Cached track list, if still fresh"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tracks, fetched_at FROM caption_tracks WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        if not row:
+            return None
+        
+        tracks = [CaptionTrack(**track) for track in json.loads(row[0])]
+        ttl = self.ttl if tracks else self.no_captions_ttl
+        if time.time() - row[1] >= ttl:
+            return None
+        return tracks
+    
+    def _store(self, video_id: str, tracks: List[CaptionTrack]):
+        """Cache a track list"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO caption_tracks (video_id, tracks, fetched_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps([asdict(track) for track in tracks]), time.time())
+            )
+
+
+_shared_discovery: Optional[CaptionDiscovery] = None
+_shared_lock = threading.Lock()
+
+
+def get_caption_discovery() -> CaptionDiscovery:
+    """Process-wide caption discovery configured from the environment"""
+    global _shared_discovery
+    with _shared_lock:
+        if _shared_discovery is None:
+            _shared_discovery = CaptionDiscovery.from_env()
+        return _shared_discovery
@@ -0,0 +1,207 @@
+"""
+Context Cache
+Registers a transcript (plus a shared system instruction) once as Gemini
+cached context, so the summary, key points and quiz requests reference it
+instead of re-sending the full transcript as input
+"""
+
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.generativeai import caching
+
+from backend.services.ai_service import MODEL_NAME, bind_model_to_key
+from backend.utils.rate_limiter import is_rate_limit_error
+from backend.utils.transcript_chunker import TranscriptChunker
+
+
+SYSTEM_INSTRUCTION = (
+    "You are an expert educator. The user content is the transcript of a YouTube video; "
+    "every request about 'the transcript' refers to it. Answer for students, accurately "
+    "and only from the transcript."
+)
+
+# How long a registered context lives on the server
+DEFAULT_CONTEXT_TTL = timedelta(hours=1)
+
+# Gemini rejects cached contexts below this size, and small ones are cheap to resend
+MIN_CONTEXT_TOKENS = 1024
+
+# Handles this close to expiring are recreated rather than reused
+REFRESH_MARGIN_SECONDS = 60
+
+# Serializes the public-API fallback, which goes through the process-wide genai.configure
+_configure_lock = threading.Lock()
+
+
+@dataclass
+class CachedContext:
+    """Handle on a transcript registered as cached context for one API key"""
+    name: str
+    api_key: str
+    digest: str
+    expires_at: float               # time.time() at which the server drops it
+    handle: Any = None              # backend-specific object (CachedContent, or the text for the fake)
+    
+    def is_live(self, now: float) -> bool:
+        """True if the context can still be referenced"""
+        return self.expires_at - REFRESH_MARGIN_SECONDS > now
+
+
+class ContextCache(ABC):
+    """
+    Interface for cached transcript contexts
+    
+    Subclasses implement _create() and model_for(); handle reuse within the TTL
+    and per-transcript locking are shared.
+    """
+    
+    def __init__(self, ttl: timedelta = DEFAULT_CONTEXT_TTL, min_tokens: int = MIN_CONTEXT_TOKENS,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initialize context cache
+        
+        Args:
+            ttl: Lifetime of each registered context
+            min_tokens: Transcripts estimated below this are sent inline instead
+            clock: Wall-clock source (overridable in tests)
+        """
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._contexts: Dict[Tuple[str, str, str], CachedContext] = {}
+        self._entry_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._unsupported: Set[Tuple[str, str]] = set()
+    
+    def acquire(self, api_key: str, text: str, model: str = MODEL_NAME) -> Optional[CachedContext]:
+        """
+        Get a live context holding `text` for this key, registering it if needed
+        
+        Concurrent callers for the same key and text share one registration.
+        
+        Args:
+            api_key: API key the requests will be sent with (contexts are per key)
+            text: Transcript (or map-step notes) to cache
+            model: Model the requests go to (contexts are per model too)
+            
+        Returns:
+            CachedContext, or None if the text should be sent inline
+        """
+        if TranscriptChunker.estimate_tokens(text) < self.min_tokens:
+            return None
+        
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        entry = (api_key, model, digest)
+        with self._lock:
+            if (api_key, model) in self._unsupported:
+                return None
+            self._prune(self.clock())
+            entry_lock = self._entry_locks.setdefault(entry, threading.Lock())
+        
+        with entry_lock:
+            context = self._contexts.get(entry)
+            if context and context.is_live(self.clock()):
+                return context
+            
+            try:
+                context = self._create(api_key, text, digest, model)
+            except Exception as e:
+                print(f"⚠️ Could not cache transcript context, sending it inline: {str(e)}")
+                self._contexts.pop(entry, None)
+                if not is_rate_limit_error(e):
+                    # e.g. context caching unavailable for this key's tier or model
+                    with self._lock:
+                        self._unsupported.add((api_key, model))
+                return None
+            
+            self._contexts[entry] = context
+            return context
+    
+    def _prune(self, now: float):
+        """
+        Drop expired contexts and idle per-entry locks (caller holds self._lock)
+        
+        A lock that is currently held belongs to a registration in progress and is kept.
+        """
+        for entry in [e for e, c in self._contexts.items() if not c.is_live(now)]:
+            del self._contexts[entry]
+        for entry in [e for e, lock in self._entry_locks.items()
+                      if e not in self._contexts and not lock.locked()]:
+            del self._entry_locks[entry]
+    
+    @abstractmethod
+    def _create(self, api_key: str, text: str, digest: str, model: str) -> CachedContext:
+        """Register `text` as a new context for `model` (raises on failure)"""
+    
+    @abstractmethod
+    def model_for(self, context: CachedContext, api_key: str) -> Any:
+        """
+        Model that answers prompts against a cached context
+        
+        Args:
+            context: Handle from acquire()
+            api_key: API key to send requests with
+            
+        Returns:
+            Object with generate_content / generate_content_async, like GenerativeModel
+        """
+
+
+class GeminiContextCache(ContextCache):
+    """Context cache backed by the Gemini cachedContents API"""
+    
+    def _create(self, api_key: str, text: str, digest: str, model: str) -> CachedContext:
+        cached = self._register(
+            api_key,
+            model=model,
+            display_name=f"transcript-{digest[:16]}",
+            system_instruction=SYSTEM_INSTRUCTION,
+            contents=[text],
+            ttl=self.ttl
+        )
+        print(f"📌 Cached transcript context {cached.name}")
+        return CachedContext(
+            name=cached.name,
+            api_key=api_key,
+            digest=digest,
+            expires_at=self.clock() + self.ttl.total_seconds(),
+            handle=cached
+        )
+    
+    @staticmethod
+    def _register(api_key: str, **kwargs) -> "caching.CachedContent":
+        """
+        Create a CachedContent with the given key
+        
+        caching.CachedContent.create() only uses the process-wide client, so with the
+        pinned SDK (google-generativeai 0.8.6) its request helpers are used with a
+        key-bound client. If a newer SDK drops those private helpers, fall back to the
+        public create() under genai.configure, serialized so keys don't interleave.
+        
+        Args:
+            api_key: API key that owns the context
+            **kwargs: Arguments for caching.CachedContent.create()
+            
+        Returns:
+            The created CachedContent
+        """
+        prepare = getattr(caching.CachedContent, "_prepare_create_request", None)
+        from_obj = getattr(caching.CachedContent, "_from_obj", None)
+        if prepare and from_obj:
+            client = glm.CacheServiceClient(client_options={"api_key": api_key})
+            return from_obj(client.create_cached_content(prepare(**kwargs)))
+        
+        with _configure_lock:
+            genai.configure(api_key=api_key)
+            return caching.CachedContent.create(**kwargs)
+    
+    def model_for(self, context: CachedContext, api_key: str) -> Any:
+        return bind_model_to_key(genai.GenerativeModel.from_cached_content(context.handle), api_key)
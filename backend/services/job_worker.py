@@ -0,0 +1,228 @@
+"""
+Job Worker
+Long-running process that claims jobs from the JobQueue and runs the
+processing pipeline for them, recording progress events (and the text
+streamed so far) on the job and saving each component to the cache as
+soon as it lands
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from backend.services.ai_service import AIService
+from backend.services.context_cache import GeminiContextCache
+from backend.services.pipeline import ProcessingPipeline, StageEvent
+from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.cache_manager import CacheManager, COMPONENTS, DEFAULT_TTL
+from backend.utils.job_queue import Job, JobQueue
+
+
+# Streamed summary / key points text is written to the job at most this often
+STREAM_FLUSH_SECONDS = 1.0
+
+
+class JobWorker:
+    """Runs queued jobs, a few at a time, until stopped"""
+    
+    def __init__(self, key_rotator: APIKeyRotator, cache: CacheManager, queue: JobQueue,
+                 concurrency: int = 2, poll_interval: float = 2.0, mode: str = "auto",
+                 context_cache=None, worker_id: Optional[str] = None):
+        """
+        Initialize worker
+        
+        Args:
+            key_rotator: Source of API keys and quota
+            cache: Cache the results are written to (and the UI reads from)
+            queue: Job queue shared with the app
+            concurrency: Jobs processed at the same time
+            poll_interval: Seconds between checks of an empty queue
+            mode: Pipeline mode ("auto", "parallel" or "single")
+            context_cache: Optional ContextCache passed to the pipeline
+            worker_id: Name recorded on claimed jobs (default: host, PID and a random suffix)
+        """
+        self.key_rotator = key_rotator
+        self.cache = cache
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.mode = mode
+        self.context_cache = context_cache
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._running: Dict[str, Job] = {}
+    
+    @staticmethod
+    def _event_record(event: StageEvent) -> Optional[Dict[str, Any]]:
+        """Compact, JSON-serializable form of a stage event (None for streamed chunks)"""
+        if event.status == "chunk":
+            return None
+        
+        record = {
+            "stage": event.stage,
+            "status": event.status,
+            "elapsed": round(event.elapsed, 1),
+            "error": event.error,
+        }
+        # Components themselves are read from the cache; only small details travel here
+        if event.stage == "transcript" and event.result:
+            record["words"] = len(event.result.split())
+        elif event.stage in ("normalize", "map"):
+            record["detail"] = event.result
+        return record
+    
+    async def run(self, once: bool = False):
+        """
+        Process jobs until cancelled
+        
+        Args:
+            once: Exit as soon as the queue is empty (e.g. for a cron job)
+        """
+        print(f"👷 Worker {self.worker_id} started ({self.concurrency} concurrent jobs)")
+        self.queue.heartbeat(self.worker_id)
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.gather(*[self._slot(once) for _ in range(self.concurrency)])
+        finally:
+            heartbeat.cancel()
+            # Jobs interrupted by shutdown go back to the queue for the next worker
+            for job_id in list(self._running):
+                self.queue.requeue(job_id)
+                print(f"↩️ Requeued job {job_id[:8]}")
+            self.queue.unregister(self.worker_id)
+            print(f"👋 Worker {self.worker_id} stopped")
+    
+    async def _heartbeat(self):
+        """Keep the worker and its running jobs marked alive"""
+        interval = max(1.0, self.queue.stale_after / 4)
+        while True:
+            await asyncio.sleep(interval)
+            self.queue.heartbeat(self.worker_id)
+            for job_id in list(self._running):
+                self.queue.touch(job_id)
+    
+    async def _slot(self, once: bool):
+        """Claim and run one job at a time"""
+        while True:
+            if not self.key_rotator.has_available_quota():
+                # Leave jobs queued until quota resets rather than failing them
+                if once:
+                    return
+                await asyncio.sleep(self.poll_interval * 10)
+                continue
+            
+            job = self.queue.claim(self.worker_id)
+            if not job:
+                if once:
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+            
+            self._running[job.id] = job
+            try:
+                await self._process(job)
+            finally:
+                self._running.pop(job.id, None)
+    
+    async def _process(self, job: Job):
+        """Run the pipeline for a claimed job and record its outcome"""
+        print(f"▶️ [{job.video_id}] job {job.id[:8]} (attempt {job.attempts})")
+        streamed: Dict[str, List[str]] = {}
+        flushed_at: Dict[str, float] = {}
+        
+        def on_event(event: StageEvent):
+            if event.status == "chunk":
+                # The app polls the job, so streamed text reaches it in throttled snapshots
+                streamed.setdefault(event.stage, []).append(event.result)
+                now = time.monotonic()
+                if now - flushed_at.get(event.stage, 0.0) >= STREAM_FLUSH_SECONDS:
+                    flushed_at[event.stage] = now
+                    self.queue.set_partial(job.id, event.stage, "".join(streamed[event.stage]))
+                return
+            
+            if event.stage in streamed and event.status in ("completed", "failed"):
+                # Completed text is read from the cache from now on
+                del streamed[event.stage]
+                self.queue.set_partial(job.id, event.stage, None)
+            record = self._event_record(event)
+            if record:
+                self.queue.add_event(job.id, record)
+        
+        pipeline = ProcessingPipeline(
+            self.key_rotator,
+            cache=self.cache,
+            on_event=on_event,
+            mode=self.mode,
+            stream=True,
+            context_cache=self.context_cache
+        )
+        try:
+            result = await pipeline.run(job.video_id)
+        except Exception as e:
+            print(f"❌ [{job.video_id}] {str(e)}")
+            self.queue.finish(job.id, error=str(e))
+            return
+        
+        missing = result.analysis.missing_components() if result.transcript else list(COMPONENTS)
+        if missing and not self.key_rotator.has_available_quota():
+            # Quota ran out mid-job: retry once it resets instead of failing the video
+            print(f"⏸️ [{job.video_id}] out of quota, job {job.id[:8]} requeued")
+            self.queue.requeue(job.id)
+        elif missing:
+            error = result.error or f"Could not generate {', '.join(missing)}"
+            print(f"❌ [{job.video_id}] {error}")
+            self.queue.finish(job.id, error=error)
+        else:
+            print(f"✅ [{job.video_id}] job {job.id[:8]} done")
+            self.queue.finish(job.id)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point (see worker.py)
+    
+    Args:
+        argv: Arguments (defaults to sys.argv)
+        
+    Returns:
+        Process exit code
+    """
+    parser = argparse.ArgumentParser(description="Process queued videos in the background")
+    parser.add_argument("--workers", type=int, default=2, help="Jobs processed concurrently")
+    parser.add_argument("--mode", choices=("auto", "parallel", "single"), default="auto",
+                        help="Pipeline mode")
+    parser.add_argument("--cache-dir", default="cache", help="Cache directory (shared with the app)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between checks of an empty queue")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--context-cache", action="store_true",
+                        default=os.getenv("GEMINI_CONTEXT_CACHE", "").lower() in ("1", "true", "yes"),
+                        help="Register long transcripts as Gemini cached context")
+    args = parser.parse_args(argv)
+    
+    cache = CacheManager(
+        cache_dir=args.cache_dir,
+        max_bytes=int(os.getenv("CACHE_MAX_MB", "500")) * 1024 * 1024,
+        ttl=DEFAULT_TTL,
+        versions=AIService.artifact_versions()
+    )
+    queue = JobQueue(os.path.join(args.cache_dir, "jobs.db"))
+    queue.prune()
+    worker = JobWorker(
+        APIKeyRotator(),
+        cache,
+        queue,
+        concurrency=args.workers,
+        poll_interval=args.poll_interval,
+        mode=args.mode,
+        context_cache=GeminiContextCache() if args.context_cache else None
+    )
+    
+    try:
+        asyncio.run(worker.run(once=args.once))
+    except KeyboardInterrupt:
+        pass
+    return 0
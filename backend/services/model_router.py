@@ -0,0 +1,164 @@
+"""
+Model Router
+Maps each task (summary, key points, quiz, analysis, chunk map, transcription)
+to a model with its own generation settings, plus a lighter fallback model
+used when the primary is rate limited, overloaded or slower than its budget
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field, fields, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.utils.rate_limiter import DEFAULT_MODEL
+
+
+LIGHT_MODEL = "gemini-2.5-flash-lite"
+
+TASKS = ("summary", "key_points", "quiz", "analysis", "chunk_map", "transcription")
+
+
+@dataclass
+class ModelRoute:
+    """Model and generation settings for one task"""
+    model: str
+    generation_config: Dict[str, Any] = field(default_factory=dict)
+    max_output_tokens: Optional[int] = None
+    fallback: Optional[str] = None          # lighter model tried when the primary fails
+    latency_budget: Optional[float] = None  # seconds the primary may take (slot wait, then request)
+    
+    def models(self) -> List[str]:
+        """Models to try, primary first"""
+        if self.fallback and self.fallback != self.model:
+            return [self.model, self.fallback]
+        return [self.model]
+    
+    def fallback_for(self, model: str) -> Optional[str]:
+        """Model to fall back to after `model` fails (None once on the fallback)"""
+        models = self.models()
+        index = models.index(model) if model in models else len(models)
+        return models[index + 1] if index + 1 < len(models) else None
+    
+    def budget_for(self, model: str) -> Optional[float]:
+        """Latency budget applied to `model` - only the primary, and only if it has a fallback"""
+        if model == self.model and self.fallback_for(model):
+            return self.latency_budget
+        return None
+    
+    def config_for(self, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Generation config for a request on this route
+        
+        Args:
+            overrides: Call-specific settings (e.g. response_mime_type), applied last
+            
+        Returns:
+            generation_config dictionary
+        """
+        config = {**self.generation_config, **(overrides or {})}
+        if self.max_output_tokens:
+            config.setdefault("max_output_tokens", self.max_output_tokens)
+        return config
+
+
+DEFAULT_ROUTES = {
+    # Long-form notes: the full model, with room for its thinking tokens
+    "summary": ModelRoute(DEFAULT_MODEL, max_output_tokens=8192,
+                          fallback=LIGHT_MODEL, latency_budget=60),
+    # Short bullet lists do not need the full model
+    "key_points": ModelRoute(LIGHT_MODEL, max_output_tokens=4096,
+                             fallback=DEFAULT_MODEL, latency_budget=30),
+    "quiz": ModelRoute(DEFAULT_MODEL, max_output_tokens=8192,
+                       fallback=LIGHT_MODEL, latency_budget=60),
+    "analysis": ModelRoute(DEFAULT_MODEL, generation_config={"response_mime_type": "application/json"},
+                           max_output_tokens=16384, fallback=LIGHT_MODEL, latency_budget=90),
+    # Map step over transcript chunks: many small, latency-sensitive requests
+    "chunk_map": ModelRoute(LIGHT_MODEL, max_output_tokens=4096,
+                            fallback=DEFAULT_MODEL, latency_budget=45),
+    "transcription": ModelRoute(DEFAULT_MODEL, fallback=LIGHT_MODEL, latency_budget=300),
+}
+
+
+class ModelRouter:
+    """Resolves the model route of each task"""
+    
+    def __init__(self, routes: Optional[Dict[str, ModelRoute]] = None):
+        """
+        Initialize router
+        
+        Args:
+            routes: Task -> ModelRoute overriding DEFAULT_ROUTES
+        """
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+    
+    def route(self, task: str) -> ModelRoute:
+        """
+        Get the route of a task
+        
+        Args:
+            task: One of TASKS
+            
+        Returns:
+            ModelRoute (the summary route for unknown tasks)
+        """
+        return self.routes.get(task) or self.routes["summary"]
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Dict[str, Any]]) -> "ModelRouter":
+        """
+        Build a router from plain settings, each overriding fields of the default route
+        
+        Args:
+            config: e.g. {"key_points": {"model": "gemini-2.5-flash", "max_output_tokens": 2048}}
+            
+        Returns:
+            ModelRouter
+        """
+        known = {f.name for f in fields(ModelRoute)}
+        routes = {}
+        for task, settings in config.items():
+            settings = {name: value for name, value in settings.items() if name in known}
+            base = DEFAULT_ROUTES.get(task)
+            if base:
+                routes[task] = replace(base, **settings)
+            elif "model" in settings:
+                routes[task] = ModelRoute(**settings)
+        return cls(routes)
+    
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Build a router from GEMINI_MODEL_ROUTES (inline JSON or a path to a JSON file)
+        
+        Returns:
+            ModelRouter (the defaults if the variable is unset or unreadable)
+        """
+        value = os.getenv("GEMINI_MODEL_ROUTES", "").strip()
+        if not value:
+            return cls()
+        
+        try:
+            if value.startswith("{"):
+                config = json.loads(value)
+            else:
+                with open(Path(value), 'r') as f:
+                    config = json.load(f)
+            return cls.from_config(config)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable GEMINI_MODEL_ROUTES: {str(e)}")
+            return cls()
+
+
+_shared_router: Optional[ModelRouter] = None
+_shared_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router configured from the environment"""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter.from_env()
+        return _shared_router
@@ -0,0 +1,451 @@
+"""
+Async Processing Pipeline
+Fetches the transcript, then runs summary, key points and quiz generation
+concurrently - each stage on its own API key from APIKeyRotator
+"""
+
+import asyncio
+import functools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.ai_service import AIService, AnalysisResult
+from backend.services.model_router import ModelRouter, get_model_router
+from backend.services.transcript_service import TranscriptService
+from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.single_flight import SingleFlight, get_single_flight
+from backend.utils.transcript_chunker import TranscriptChunker
+from backend.utils.transcript_normalizer import TranscriptNormalizer
+
+
+# Generation stages that can run concurrently once the transcript is known
+STAGES = ("summary", "key_points", "quiz")
+
+
+@dataclass
+class StageEvent:
+    """Progress notification emitted as each pipeline stage starts and finishes"""
+    stage: str                      # "transcript", "normalize", "map", "analysis", "summary", "key_points" or "quiz"
+    status: str                     # "started", "chunk" (streamed text), "cached", "completed" or "failed"
+    result: Any = None
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class PipelineResult:
+    """Everything the pipeline produced for one video"""
+    video_id: str
+    transcript: Optional[str] = None
+    segments: Optional[List[Dict]] = None     # caption segments, when captions were used
+    notes: Optional[str] = None               # map-step notes for long transcripts
+    analysis: AnalysisResult = field(default_factory=AnalysisResult)
+    error: Optional[str] = None
+    
+    @property
+    def source_text(self) -> Optional[str]:
+        """Text the generation stages work from: chunk notes if any, else the transcript"""
+        return self.notes or self.transcript
+
+
+class ProcessingPipeline:
+    """Runs transcript -> summary / key points / quiz with asyncio"""
+    
+    _STAGE_METHODS = {
+        "summary": AIService.generate_summary_async,
+        "key_points": AIService.extract_key_points_async,
+        "quiz": AIService.generate_quiz_async,
+    }
+    
+    # Stages whose text can be streamed chunk by chunk
+    _STREAM_METHODS = {
+        "summary": AIService.stream_summary_async,
+        "key_points": AIService.stream_key_points_async,
+    }
+    
+    def __init__(self, key_rotator: APIKeyRotator, cache=None,
+                 on_event: Optional[Callable[[StageEvent], None]] = None,
+                 mode: str = "auto", stream: bool = False,
+                 chunker: Optional[TranscriptChunker] = None,
+                 normalizer: Optional[TranscriptNormalizer] = None,
+                 context_cache=None, router: Optional[ModelRouter] = None,
+                 single_flight: Optional[SingleFlight] = None):
+        """
+        Initialize pipeline
+        
+        Args:
+            key_rotator: Source of API keys and usage accounting
+            cache: Optional CacheManager; cached components are reused and each new
+                   one is saved as soon as it lands
+            on_event: Optional callback receiving a StageEvent per stage transition
+            mode: "parallel" runs one request per stage concurrently, "single" makes one
+                  combined analyze() request, "auto" goes parallel only when there is a
+                  separate key with quota for every stage
+            stream: Stream summary and key points, emitting a "chunk" event per piece
+                    of text (only applies when stages run as separate requests)
+            chunker: Splits long transcripts for parallel map-reduce; short
+                     transcripts bypass it
+            normalizer: Cleans the transcript before any prompt is built
+            context_cache: Optional ContextCache; the transcript is registered once and
+                           the stages run as separate requests on one key that all
+                           reference it
+            router: Model per task (defaults to the process-wide router)
+            single_flight: Coalesces concurrent work on the same video and component
+                           (defaults to the group shared by all pipelines using the
+                           same cache directory)
+        """
+        self.key_rotator = key_rotator
+        self.cache = cache
+        self.on_event = on_event
+        self.mode = mode
+        self.stream = stream
+        self.chunker = chunker or TranscriptChunker()
+        self.normalizer = normalizer or TranscriptNormalizer()
+        self.context_cache = context_cache
+        self.router = router or get_model_router()
+        if single_flight is None:
+            cache_dir = getattr(cache, "cache_dir", None)
+            single_flight = get_single_flight(str(cache_dir / "inflight.db")) if cache_dir else SingleFlight(None)
+        self.single_flight = single_flight
+    
+    def _emit(self, stage: str, status: str, started: float, result: Any = None,
+              error: Optional[str] = None):
+        """Send a StageEvent to the listener, if any"""
+        if self.on_event:
+            self.on_event(StageEvent(
+                stage=stage,
+                status=status,
+                result=result,
+                elapsed=time.monotonic() - started,
+                error=error
+            ))
+    
+    async def run(self, video_id: str) -> PipelineResult:
+        """
+        Process a video end to end
+        
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            PipelineResult with whatever components could be produced
+        """
+        result = PipelineResult(video_id=video_id)
+        
+        # Resume from whatever an earlier (e.g. quota-interrupted) run cached
+        self._load_cached(result)
+        
+        if not result.transcript:
+            result.transcript, result.segments = await self._fetch_transcript(video_id)
+            if not result.transcript:
+                result.error = "Could not extract transcript"
+                return result
+            # Generated content is cached by transcript, so a re-upload or mirror
+            # of an already processed video is served without new requests
+            self._load_cached(result)
+        
+        if not result.analysis.missing_components():
+            return result
+        
+        if self.chunker.needs_chunking(result.transcript):
+            await self._map_chunks(result)
+        
+        await self.generate(result)
+        return result
+    
+    def _load_cached(self, result: PipelineResult):
+        """Fill missing parts of `result` from the cache, emitting a "cached" event for each"""
+        if not self.cache:
+            return
+        
+        started = time.monotonic()
+        cached = self.cache.get_cached_components(result.video_id)
+        if cached.get("transcript") and not result.transcript:
+            result.transcript = cached["transcript"]
+            self._emit("transcript", "cached", started, result=result.transcript)
+        
+        for stage in result.analysis.missing_components():
+            if cached.get(stage):
+                setattr(result.analysis, stage, cached[stage])
+                self._emit(stage, "cached", started, result=cached[stage])
+    
+    def _cached_component(self, video_id: str, component: str) -> Any:
+        """A component another pipeline stored meanwhile (None without a cache)"""
+        if not self.cache:
+            return None
+        return self.cache.get_cached_components(video_id).get(component)
+    
+    async def _fetch_transcript(self, video_id: str):
+        """Fetch the transcript once for all concurrent pipelines on this video"""
+        started = time.monotonic()
+        self._emit("transcript", "started", started)
+        
+        def lookup():
+            transcript = self._cached_component(video_id, "transcript")
+            return (transcript, self.cache.get_segments(video_id), None) if transcript else None
+        
+        transcript, segments, stats = await self.single_flight.do(
+            f"{video_id}:transcript",
+            functools.partial(self._download_transcript, video_id),
+            lookup if self.cache else None
+        )
+        
+        if not transcript:
+            self._emit("transcript", "failed", started, error="Could not extract transcript")
+            return None, None
+        
+        self._emit("transcript", "completed", started, result=transcript)
+        if stats:
+            self._emit("normalize", "completed", started, result=stats)
+        return transcript, segments
+    
+    async def _download_transcript(self, video_id: str):
+        """
+        Fetch (captions first, then audio), normalize and cache the transcript
+        
+        Returns:
+            (transcript, caption segments, normalization stats), all None on failure
+        """
+        transcription_model = self.router.route("transcription").model
+        transcript_service = TranscriptService(self.key_rotator.get_next_key(transcription_model),
+                                               router=self.router, key_rotator=self.key_rotator)
+        transcript, segments = await asyncio.to_thread(transcript_service.get_transcript, video_id)
+        
+        if not transcript:
+            return None, None, None
+        
+        # Strip caption noise once, before it is billed as input tokens
+        normalized = self.normalizer.normalize(transcript, segments)
+        if normalized.text:
+            transcript, segments = normalized.text, normalized.segments
+        
+        if self.cache:
+            self.cache.save_to_cache(video_id, transcript=transcript, segments=segments)
+        return transcript, segments, normalized.stats
+    
+    async def _map_chunks(self, result: PipelineResult):
+        """
+        Map step for long transcripts: condense each chunk into notes in parallel
+        
+        The notes (in transcript order) become the input of the summary, key points
+        and quiz stages. A chunk whose request fails keeps its raw text.
+        
+        Args:
+            result: PipelineResult with a transcript; `notes` is set in place
+        """
+        if not result.segments and self.cache:
+            # Transcripts loaded from the cache come without their caption timing
+            result.segments = self.cache.get_segments(result.video_id)
+        
+        chunks = self.chunker.chunk(result.transcript, result.segments)
+        if len(chunks) < 2:
+            return
+        
+        _, keys = self._task_keys("chunk_map", len(chunks))
+        if not keys:
+            return
+        
+        started = time.monotonic()
+        self._emit("map", "started", started)
+        
+        notes = await asyncio.gather(*[
+            self._call(
+                keys[i % len(keys)],
+                functools.partial(AIService.summarize_chunk_async, label=chunk.label, total=len(chunks)),
+                chunk.text
+            )
+            for i, chunk in enumerate(chunks)
+        ])
+        
+        result.notes = "\n\n".join(
+            f"## {chunk.label}\n\n{note or chunk.text}"
+            for chunk, note in zip(chunks, notes)
+        )
+        self._emit("map", "completed", started, result=len(chunks))
+    
+    def _task_keys(self, task: str, count: int) -> Tuple[Optional[str], List[str]]:
+        """
+        Keys ranked on the model a task is routed to
+        
+        Each model has its own quota and entitlement, so keys are picked for the
+        task's primary model, or its fallback when the primary has none left.
+        
+        Args:
+            task: Routing task (see backend.services.model_router.TASKS)
+            count: Maximum number of keys wanted
+            
+        Returns:
+            (model the keys were ranked on, up to `count` keys) - (None, []) if no quota is left
+        """
+        for model in self.router.route(task).models():
+            keys = self.key_rotator.get_available_keys(count, model)
+            if keys:
+                return model, keys
+        return None, []
+    
+    async def generate(self, result: PipelineResult):
+        """
+        Fill in the missing components of `result.analysis`
+        
+        Args:
+            result: PipelineResult with a transcript (and notes, if chunked); updated in place
+        """
+        missing = result.analysis.missing_components()
+        if not missing:
+            return
+        
+        keys = self._stage_keys(missing)
+        if not keys:
+            result.error = "API quota exhausted"
+            return
+        
+        # With a context cache the transcript is only uploaded once, so separate
+        # (streamable) stage requests no longer multiply the input tokens
+        use_single = self.mode == "single" or (
+            self.mode == "auto" and not self.context_cache
+            and len(missing) > 1 and len(set(keys.values())) < len(missing)
+        )
+        if use_single:
+            analysis_keys = self._stage_keys(["analysis"])
+            if analysis_keys:
+                await self._run_analysis(result, analysis_keys["analysis"])
+                missing = result.analysis.missing_components()
+                if not missing:
+                    return
+                keys = self._stage_keys(missing)
+                if not keys:
+                    result.error = "API quota exhausted"
+                    return
+        
+        for stage in missing:
+            if stage not in keys:
+                self._emit(stage, "failed", time.monotonic(), error="API quota exhausted")
+        
+        # One stage per key; with fewer keys than stages, keys are shared round-robin
+        await asyncio.gather(*[
+            self._run_stage(result, stage, keys[stage])
+            for stage in missing if stage in keys
+        ])
+    
+    def _stage_keys(self, stages: List[str]) -> Dict[str, str]:
+        """
+        Starting key for each generation stage, ranked on the model the stage is routed to
+        
+        Stages on the same model get distinct keys while there are enough and share
+        them round-robin otherwise. With a context cache every stage uses one key.
+        
+        Args:
+            stages: Stages (or "analysis") to run
+            
+        Returns:
+            Stage -> key, leaving out stages with no quota on their route (empty if none has any)
+        """
+        used: Dict[str, int] = {}
+        keys = {}
+        for stage in stages:
+            model, candidates = self._task_keys(stage, len(stages))
+            if not candidates:
+                continue
+            keys[stage] = candidates[used.get(model, 0) % len(candidates)]
+            used[model] = used.get(model, 0) + 1
+        
+        if self.context_cache and keys:
+            # Cached contexts belong to one key; stages on other keys would each re-register it
+            shared = next(iter(keys.values()))
+            return {stage: shared for stage in keys}
+        return keys
+    
+    async def _call(self, key: str, method: Callable, transcript: str) -> Any:
+        """
+        Run one AIService method starting on a key
+        
+        The service waits for each key's rate limits, records every request,
+        retries transient failures and fails over to other keys on 429s.
+        
+        Args:
+            key: API key to start with
+            method: Unbound async AIService method
+            transcript: Transcript text
+            
+        Returns:
+            The method's result, or None if it failed
+        """
+        service = AIService(key, context_cache=self.context_cache, key_rotator=self.key_rotator,
+                            router=self.router)
+        return await method(service, transcript)
+    
+    async def _run_analysis(self, result: PipelineResult, key: str):
+        """Generate all components with a single combined request"""
+        started = time.monotonic()
+        self._emit("analysis", "started", started)
+        
+        async def compute():
+            analysis = await self._call(key, AIService.analyze_async, result.source_text)
+            if analysis and self.cache:
+                self.cache.save_to_cache(result.video_id, analysis=analysis)
+            return analysis
+        
+        def lookup():
+            cached = self.cache.get_cached_components(result.video_id)
+            if any(cached.get(stage) for stage in STAGES):
+                return AnalysisResult(**{stage: cached.get(stage) for stage in STAGES})
+            return None
+        
+        analysis = await self.single_flight.do(
+            f"{result.video_id}:analysis", compute, lookup if self.cache else None
+        )
+        
+        if not analysis:
+            self._emit("analysis", "failed", started, error="Combined analysis failed")
+            return
+        
+        for stage in STAGES:
+            value = getattr(analysis, stage)
+            if value:
+                setattr(result.analysis, stage, value)
+        
+        self._emit("analysis", "completed", started, result=result.analysis)
+    
+    async def _run_stage(self, result: PipelineResult, stage: str, key: str):
+        """Generate one component on the given key"""
+        started = time.monotonic()
+        self._emit(stage, "started", started)
+        
+        method = self._STAGE_METHODS[stage]
+        if self.stream and stage in self._STREAM_METHODS:
+            method = functools.partial(self._stream_stage, stage, started)
+        
+        async def compute():
+            value = await self._call(key, method, result.source_text)
+            if value and self.cache:
+                self.cache.save_to_cache(result.video_id, **{stage: value})
+            return value
+        
+        # Concurrent pipelines on this video share one request; a pipeline that joins
+        # another's stream gets the full text at the end instead of chunks
+        value = await self.single_flight.do(
+            f"{result.video_id}:{stage}",
+            compute,
+            functools.partial(self._cached_component, result.video_id, stage) if self.cache else None
+        )
+        
+        if not value:
+            self._emit(stage, "failed", started, error=f"Could not generate {stage}")
+            return
+        
+        setattr(result.analysis, stage, value)
+        self._emit(stage, "completed", started, result=value)
+    
+    async def _stream_stage(self, stage: str, started: float, service: AIService,
+                            transcript: str) -> Optional[str]:
+        """Stream one stage, emitting each chunk, and return the full text (None if cut short)"""
+        chunks = []
+        try:
+            async for chunk in self._STREAM_METHODS[stage](service, transcript):
+                chunks.append(chunk)
+                self._emit(stage, "chunk", started, result=chunk)
+        except Exception as e:
+            print(f"Error streaming {stage}: {str(e)}")
+            return None
+        return "".join(chunks) or None
@@ -0,0 +1,193 @@
+"""
+Playlist Service
+Expands playlist and channel URLs into video ID lists with yt_dlp flat
+extraction (no media is downloaded) and caches the result, so the same
+course playlist is not re-fetched on every request
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import yt_dlp
+
+from backend.utils.url_utils import URLUtils
+
+
+_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Playlists and channels gain videos over time, so expansions are refreshed periodically
+DEFAULT_METADATA_TTL_SECONDS = 6 * 60 * 60
+
+# Upper bound on videos taken from one playlist or channel
+DEFAULT_MAX_VIDEOS = 500
+
+
+@dataclass
+class PlaylistEntry:
+    """One video of a playlist, as listed by flat extraction"""
+    video_id: str
+    title: Optional[str] = None
+    duration: Optional[float] = None    # seconds, when YouTube lists it
+
+
+@dataclass
+class Playlist:
+    """An expanded playlist or channel"""
+    url: str
+    title: str
+    entries: List[PlaylistEntry] = field(default_factory=list)
+    fetched_at: float = 0.0
+    
+    @property
+    def video_ids(self) -> List[str]:
+        return [entry.video_id for entry in self.entries]
+    
+    @property
+    def total_duration(self) -> float:
+        """Listed duration of all videos in seconds"""
+        return sum(entry.duration or 0 for entry in self.entries)
+
+
+class PlaylistService:
+    """Flat playlist/channel expansion with a SQLite metadata cache"""
+    
+    def __init__(self, cache_dir: str = "cache", ttl: float = DEFAULT_METADATA_TTL_SECONDS,
+                 max_videos: int = DEFAULT_MAX_VIDEOS):
+        """
+        Initialize playlist service
+        
+        Args:
+            cache_dir: Directory of the metadata database
+            ttl: Seconds an expansion is reused before it is fetched again
+            max_videos: Most videos taken from one playlist or channel
+        """
+        self.ttl = ttl
+        self.max_videos = max_videos
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path / "metadata.db", check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    url TEXT PRIMARY KEY,
+                    title TEXT,
+                    entries TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+    
+    def expand(self, url: str, refresh: bool = False) -> Optional[Playlist]:
+        """
+        List the videos of a playlist or channel
+        
+        Args:
+            url: Playlist or channel URL
+            refresh: Ignore the cached expansion
+            
+        Returns:
+            Playlist, or None if it could not be expanded
+        """
+        url = URLUtils.normalize_collection_url(url)
+        if not url:
+            print("❌ Not a playlist or channel URL")
+            return None
+        
+        if not refresh:
+            cached = self._load(url)
+            if cached and time.time() - cached.fetched_at < self.ttl:
+                print(f"♻️ Playlist loaded from cache: {cached.title} ({len(cached.entries)} videos)")
+                return cached
+        
+        playlist = self._fetch(url)
+        if playlist:
+            self._store(playlist)
+        return playlist
+    
+    def _fetch(self, url: str) -> Optional[Playlist]:
+        """Flat-extract a playlist or channel (metadata only)"""
+        ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'playlistend': self.max_videos,
+            'quiet': True,
+            'no_warnings': True,
+            'ignoreerrors': True,
+        }
+        
+        try:
+            print(f"📚 Expanding playlist {url}...")
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            print(f"❌ Could not expand playlist: {str(e)}")
+            return None
+        
+        if not info:
+            print("❌ Could not expand playlist")
+            return None
+        
+        entries = []
+        seen = set()
+        for entry in self._video_entries(info):
+            if entry["id"] not in seen and len(entries) < self.max_videos:
+                seen.add(entry["id"])
+                entries.append(PlaylistEntry(
+                    video_id=entry["id"],
+                    title=entry.get("title"),
+                    duration=entry.get("duration")
+                ))
+        
+        playlist = Playlist(
+            url=url,
+            title=info.get("title") or url,
+            entries=entries,
+            fetched_at=time.time()
+        )
+        print(f"✅ Playlist expanded: {playlist.title} ({len(entries)} videos)")
+        return playlist
+    
+    def _video_entries(self, info: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Video entries of an extraction result, descending into nested playlists (channel tabs)"""
+        for entry in info.get("entries") or []:
+            if not entry:
+                # ignoreerrors leaves None for unavailable videos
+                continue
+            if entry.get("entries"):
+                yield from self._video_entries(entry)
+            elif _VIDEO_ID.match(entry.get("id") or "") and entry.get("ie_key", "Youtube") == "Youtube":
+                yield entry
+    
+    def _load(self, url: str) -> Optional[Playlist]:
+        """Read a cached expansion"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, entries, fetched_at FROM playlists WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        
+        title, entries, fetched_at = row
+        return Playlist(
+            url=url,
+            title=title,
+            entries=[PlaylistEntry(**entry) for entry in json.loads(entries)],
+            fetched_at=fetched_at
+        )
+    
+    def _store(self, playlist: Playlist):
+        """Cache an expansion"""
+        entries = json.dumps([entry.__dict__ for entry in playlist.entries])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playlists (url, title, entries, fetched_at) VALUES (?, ?, ?, ?)",
+                (playlist.url, playlist.title, entries, playlist.fetched_at)
+            )
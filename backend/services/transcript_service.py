@@ -1,22 +1,71 @@
 """
 YouTube Transcript Service
-Uses YouTube captions first, falls back to audio extraction + AI transcription
+Uses YouTube captions first, falls back to audio extraction + transcription
+(Gemini or an on-device engine, see transcription_backends)
 """
 
-from youtube_transcript_api import YouTubeTranscriptApi
-from typing import Tuple, List, Dict, Optional
+from typing import Any, Tuple, List, Dict, Optional
 import os
+import shutil
+import subprocess
+import time
 import yt_dlp
-import google.generativeai as genai
 from pathlib import Path
 import tempfile
 
+from backend.services.caption_discovery import CaptionDiscovery, get_caption_discovery
+from backend.services.model_router import ModelRouter, get_model_router
+from backend.services.transcription_backends import (
+    GeminiTranscriptionBackend,
+    LocalTranscriptionBackend,
+    TranscriptionBackend,
+    backend_order,
+    order_backends,
+)
+from backend.utils.audio_segmenter import AudioSegmenter
+
+
+# Audio acquisition modes for the transcription fallback:
+#   "speech" - smallest speech-adequate stream; Opus is remuxed to Ogg without
+#              re-encoding, anything else is downsampled to mono 16 kHz
+#   "mp3"    - best audio re-encoded to 192 kbps MP3 (the original behaviour)
+AUDIO_MODES = ("speech", "mp3")
+
+# Prefer a low-bitrate Opus stream (YouTube format 249/250, ~50-70 kbps), then any
+# low-bitrate audio (e.g. 48 kbps AAC), then the smallest audio stream at all
+SPEECH_AUDIO_FORMAT = "bestaudio[acodec=opus][abr<=80]/bestaudio[abr<=80]/worstaudio/bestaudio"
+
 
 class TranscriptService:
     """Service for handling YouTube transcript extraction"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize with optional API key for audio transcription fallback"""
+    def __init__(self, api_key: Optional[str] = None, router: Optional[ModelRouter] = None,
+                 captions: Optional[CaptionDiscovery] = None, audio_mode: Optional[str] = None,
+                 key_rotator=None, segmenter: Optional[AudioSegmenter] = None,
+                 segment_concurrency: int = 4, backends: Optional[Dict[str, TranscriptionBackend]] = None,
+                 backend_order_setting: Optional[str] = None):
+        """
+        Initialize with optional API key for audio transcription fallback
+        
+        Audio is transcribed by the backends in TRANSCRIPTION_BACKENDS order (see
+        transcription_backends). With Gemini, long audio is split into overlapping
+        segments transcribed concurrently; with a key_rotator the segments are
+        spread over every key with quota.
+        
+        Args:
+            backends: Backend name -> TranscriptionBackend (default: Gemini and local)
+            backend_order_setting: Overrides TRANSCRIPTION_BACKENDS, e.g. "local,gemini"
+        """
+        self.router = router or get_model_router()
+        self.key_rotator = key_rotator
+        self.segmenter = segmenter or AudioSegmenter()
+        self.backend_order = backend_order(backend_order_setting)
+        self.captions = captions or get_caption_discovery()
+        self.audio_mode = audio_mode or os.getenv("TRANSCRIPTION_AUDIO_MODE", "speech")
+        if self.audio_mode not in AUDIO_MODES:
+            self.audio_mode = "speech"
+        # Size and timing of the last audio fallback (see _download_audio)
+        self.audio_stats: Dict[str, Any] = {}
         if api_key:
             self.api_key = api_key
         else:
@@ -29,53 +78,37 @@ class TranscriptService:
                     self.api_key = os.getenv("GOOGLE_API_KEY")
             except:
                 self.api_key = os.getenv("GOOGLE_API_KEY")
+        
+        self.backends = backends or {
+            "gemini": GeminiTranscriptionBackend(self.api_key, self.router, key_rotator=key_rotator,
+                                                 segmenter=self.segmenter,
+                                                 segment_concurrency=segment_concurrency),
+            "local": LocalTranscriptionBackend(),
+        }
     
-    @staticmethod
-    def _get_caption_transcript(video_id: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+    def _get_caption_transcript(self, video_id: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
         """
         Try to get transcript from YouTube captions (fast method)
         
+        The track list is fetched once (or read from the metadata cache) and the
+        best track is chosen by the configured language preference.
+        
         Args:
             video_id: YouTube video ID
             
         Returns:
             Tuple of (transcript_text, transcript_list) or (None, None) if failed
         """
-        try:
-            # Try to get transcript in multiple languages
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            
-            # Try to get English transcript first
-            try:
-                transcript = transcript_list.find_transcript(["en"])
-                transcript_data = transcript.fetch()
-            except:
-                # If English not available, get any available transcript
-                try:
-                    transcript = transcript_list.find_generated_transcript(["en"])
-                    transcript_data = transcript.fetch()
-                except:
-                    # Get the first available transcript in any language
-                    available_transcripts = list(transcript_list)
-                    if available_transcripts:
-                        transcript_data = available_transcripts[0].fetch()
-                    else:
-                        raise Exception("No captions available")
-            
-            # Combine all transcript segments into one text
-            transcript_text = " ".join([item["text"] for item in transcript_data])
-            
-            print(f"✅ Extracted transcript from captions: {len(transcript_text)} characters")
-            return transcript_text, transcript_data
-            
-        except Exception as e:
-            print(f"⚠️ Captions not available: {str(e)}")
-            return None, None
+        return self.captions.fetch(video_id)
     
     def _download_audio(self, video_id: str) -> Optional[str]:
         """
         Download audio from YouTube video
         
+        In "speech" mode the smallest speech-adequate stream is downloaded and kept
+        in its codec where Gemini accepts it; size and timing are recorded in
+        self.audio_stats.
+        
         Args:
             video_id: YouTube video ID
             
@@ -86,15 +119,11 @@ class TranscriptService:
             # Create temp directory for audio
             temp_dir = tempfile.mkdtemp()
             output_path = os.path.join(temp_dir, f"{video_id}")
+            speech = self.audio_mode == "speech"
             
             ydl_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'outtmpl': output_path,
+                'format': SPEECH_AUDIO_FORMAT if speech else 'bestaudio/best',
+                'outtmpl': output_path + ('.%(ext)s' if speech else ''),
                 'quiet': True,
                 'no_warnings': True,
                 # Add headers to bypass bot detection
@@ -112,80 +141,101 @@ class TranscriptService:
                 # Use external downloader for better success rate
                 'external_downloader': 'aria2c' if os.system('which aria2c > /dev/null 2>&1') == 0 else None,
             }
+            if not speech:
+                ydl_opts['postprocessors'] = [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': 'mp3',
+                    'preferredquality': '192',
+                }]
             
             video_url = f"https://www.youtube.com/watch?v={video_id}"
             
             print(f"📥 Downloading audio from video...")
+            started = time.monotonic()
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
+                info = ydl.extract_info(video_url, download=True)
+                downloaded = ydl.prepare_filename(info) if info else None
+            download_seconds = time.monotonic() - started
             
-            # Return the path to the mp3 file
-            audio_file = f"{output_path}.mp3"
-            if os.path.exists(audio_file):
-                print(f"✅ Audio downloaded: {audio_file}")
-                return audio_file
-            else:
+            if not speech:
+                # Return the path to the mp3 file
+                audio_file = f"{output_path}.mp3"
+                if os.path.exists(audio_file):
+                    print(f"✅ Audio downloaded: {audio_file}")
+                    self.audio_stats = {
+                        "mode": self.audio_mode,
+                        "bytes": os.path.getsize(audio_file),
+                        "download_seconds": round(download_seconds, 2),
+                    }
+                    return audio_file
+                else:
+                    print(f"❌ Audio file not found after download")
+                    return None
+            
+            if not downloaded or not os.path.exists(downloaded):
                 print(f"❌ Audio file not found after download")
                 return None
+            
+            self.audio_stats = {
+                "mode": self.audio_mode,
+                "format_id": info.get("format_id"),
+                "codec": info.get("acodec"),
+                "abr": info.get("abr"),
+                "duration": info.get("duration"),
+                "download_bytes": os.path.getsize(downloaded),
+                "download_seconds": round(download_seconds, 2),
+            }
+            
+            started = time.monotonic()
+            audio_file = self._prepare_speech_audio(downloaded, info.get("acodec") or "")
+            self.audio_stats["convert_seconds"] = round(time.monotonic() - started, 2)
+            self.audio_stats["bytes"] = os.path.getsize(audio_file)
+            
+            print(f"✅ Audio downloaded: {audio_file} "
+                  f"({self.audio_stats['bytes'] / (1024 * 1024):.1f} MB, {self.audio_stats['codec']} "
+                  f"@ {self.audio_stats['abr'] or '?'} kbps, {download_seconds:.1f}s download, "
+                  f"{self.audio_stats['convert_seconds']:.1f}s convert)")
+            return audio_file
                 
         except Exception as e:
             print(f"❌ Error downloading audio: {str(e)}")
             return None
     
-    def _transcribe_audio_with_gemini(self, audio_path: str) -> Optional[str]:
+    @staticmethod
+    def _prepare_speech_audio(path: str, codec: str) -> str:
         """
-        Transcribe audio file using Gemini AI
+        Make a downloaded stream uploadable with as little work as possible
+        
+        Opus is copied into an Ogg container (a remux, no re-encode); other codecs
+        are downsampled to mono 16 kHz, which is all speech recognition uses.
         
         Args:
-            audio_path: Path to audio file
+            path: Downloaded audio file
+            codec: Its audio codec as reported by yt_dlp
             
         Returns:
-            Transcribed text or None if failed
+            Path of the file to upload (the download itself if ffmpeg is unavailable)
         """
-        try:
-            if not self.api_key:
-                print("❌ No API key available for transcription")
-                return None
-            
-            print("🤖 Transcribing audio with Gemini AI...")
-            
-            # Configure Gemini
-            genai.configure(api_key=self.api_key)
-            
-            # Upload audio file to Gemini
-            print("📤 Uploading audio to Gemini...")
-            audio_file = genai.upload_file(audio_path)
-            
-            # Use Gemini to transcribe
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            prompt = """Please transcribe this audio file completely and accurately.
-Provide the full transcription of all spoken content.
-Do not add any commentary or notes - just the transcription."""
-            
-            print("⏳ Waiting for transcription...")
-            response = model.generate_content([prompt, audio_file])
-            
-            transcript = response.text.strip()
-            
-            print(f"✅ Transcription complete: {len(transcript)} characters")
-            
-            # Clean up uploaded file
-            try:
-                genai.delete_file(audio_file.name)
-            except:
-                pass
-            
-            return transcript
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"❌ API Quota Exceeded: Free tier limit reached (20 requests/day)")
-                print(f"   Please wait 24 hours or use videos with captions")
-            else:
-                print(f"❌ Error transcribing audio: {error_msg}")
-            return None
+        if not shutil.which("ffmpeg"):
+            print("⚠️ ffmpeg not found, uploading the audio stream as downloaded")
+            return path
+        
+        base, _ = os.path.splitext(path)
+        if codec.startswith("opus"):
+            output, args = base + ".ogg", ["-vn", "-c:a", "copy"]
+        else:
+            output, args = base + ".speech.mp3", ["-vn", "-ac", "1", "-ar", "16000", "-b:a", "32k"]
+        
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", path, *args, output],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0 or not os.path.exists(output):
+            print(f"⚠️ Audio conversion failed, uploading as downloaded: {result.stderr.strip()}")
+            return path
+        
+        os.remove(path)
+        return output
     
     def get_transcript(self, video_id: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
         """
@@ -204,37 +254,43 @@ Do not add any commentary or notes - just the transcription."""
         if transcript:
             return transcript, transcript_data
         
-        # Method 2: Download audio and transcribe with Gemini
+        # Method 2: Download audio and transcribe it (Gemini and/or on-device)
         print("🎵 Captions not available, trying audio extraction...")
         
+        backends = order_backends(self.backends, self.backend_order)
+        if not backends:
+            print("❌ No transcription backend available (no API quota and faster-whisper not installed)")
+            return None, None
+        
         audio_path = self._download_audio(video_id)
         if not audio_path:
             print("❌ Could not download audio")
             return None, None
         
         try:
-            transcript = self._transcribe_audio_with_gemini(audio_path)
-            
-            # Clean up audio file
-            try:
-                os.remove(audio_path)
-                os.rmdir(os.path.dirname(audio_path))
-            except:
-                pass
-            
-            if transcript:
-                return transcript, None
-            else:
-                return None, None
+            duration = self.segmenter.duration(audio_path)
+            for i, backend in enumerate(backends):
+                try:
+                    transcript, segments = backend.transcribe(audio_path, duration)
+                except Exception as e:
+                    print(f"❌ Error in {backend.name} transcription: {str(e)}")
+                    transcript, segments = None, None
                 
-        except Exception as e:
-            print(f"❌ Error in audio transcription: {str(e)}")
+                self.audio_stats.update(backend.stats, backend=backend.name)
+                if transcript:
+                    return transcript, segments
+                if i + 1 < len(backends):
+                    print(f"↪️ {backend.name} transcription failed, trying {backends[i + 1].name}...")
+            
             return None, None
+        
+        finally:
+            # Clean up audio file (and anything left beside it in its temp directory)
+            shutil.rmtree(os.path.dirname(audio_path), ignore_errors=True)
     
-    @staticmethod
-    def get_transcript_info(video_id: str) -> Dict:
+    def get_transcript_info(self, video_id: str) -> Dict:
         """
-        Get information about available transcripts
+        Get information about available transcripts (shares the cached track list)
         
         Args:
             video_id: YouTube video ID
@@ -242,27 +298,19 @@ Do not add any commentary or notes - just the transcription."""
         Returns:
             Dictionary with transcript information
         """
-        try:
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            available = []
-            
-            for transcript in transcript_list:
-                available.append({
-                    "language": transcript.language,
-                    "language_code": transcript.language_code,
-                    "is_generated": transcript.is_generated,
-                    "is_translatable": transcript.is_translatable
-                })
-            
-            return {
-                "available": True,
-                "transcripts": available,
-                "count": len(available)
-            }
-        except Exception as e:
+        tracks = self.captions.tracks(video_id)
+        if tracks is None:
             return {
                 "available": False,
-                "error": str(e),
+                "error": "Could not list captions",
                 "transcripts": [],
                 "count": 0
             }
+        
+        selected = self.captions.select(tracks)
+        return {
+            "available": bool(tracks),
+            "transcripts": [track.__dict__ for track in tracks],
+            "count": len(tracks),
+            "selected": selected.language_code if selected else None
+        }
@@ -0,0 +1,425 @@
+"""
+Transcription Backends
+Interchangeable speech-to-text engines for videos without captions: Gemini
+(spends API quota) and a local CPU engine (faster-whisper, spends none).
+The order they are tried in is configurable, and in "auto" mode the local
+engine goes first when Gemini quota runs low, keeping it for the summary,
+key points and quiz
+"""
+
+import asyncio
+import concurrent.futures
+import importlib.util
+import multiprocessing
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.ai_service import AIService
+from backend.services.model_router import ModelRouter
+from backend.utils.audio_segmenter import AudioClip, AudioSegmenter
+from backend.utils.retry import RetryPolicy
+
+
+# Backend names accepted in TRANSCRIPTION_BACKENDS (e.g. "local,gemini"); "auto"
+# tries Gemini first unless its quota is low
+BACKENDS = ("gemini", "local")
+DEFAULT_ORDER = "auto"
+
+# In "auto" mode, Gemini transcription is skipped first once fewer requests than
+# this are left today for the transcription model across all keys: enough for the
+# summary, key points and quiz of the video being transcribed
+DEFAULT_QUOTA_RESERVE = 3
+
+# Rounds of segment transcription: segments still missing after a round are
+# retried (on whichever keys have quota) in the next one
+SEGMENT_ROUNDS = 3
+
+# Per-request retries of one segment, within a round
+SEGMENT_RETRY_POLICY = RetryPolicy(max_attempts=3, deadline=600.0)
+
+# Upload types Gemini accepts, by file extension
+AUDIO_MIME_TYPES = {".ogg": "audio/ogg", ".mp3": "audio/mp3", ".wav": "audio/wav", ".flac": "audio/flac"}
+
+# Local engine: faster-whisper model and chunking. Chunks are short enough to keep
+# every worker busy on medium-length audio; the overlap keeps cut words whole
+DEFAULT_LOCAL_MODEL = "base"
+LOCAL_CHUNK_SECONDS = (60, 600)
+LOCAL_OVERLAP_SECONDS = 5
+
+
+class TranscriptionBackend(ABC):
+    """Interface of a speech-to-text engine"""
+    
+    name = "base"
+    
+    def __init__(self):
+        # Size and timing of the last transcription, merged into TranscriptService.audio_stats
+        self.stats: Dict[str, Any] = {}
+    
+    def available(self) -> bool:
+        """True if the backend can run at all (installed, configured, has quota)"""
+        return True
+    
+    def quota_low(self) -> bool:
+        """True if using this backend now would eat into scarce API quota"""
+        return False
+    
+    @abstractmethod
+    def transcribe(self, audio_path: str, duration: Optional[float]) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """
+        Transcribe an audio file
+        
+        Args:
+            audio_path: Path to audio file
+            duration: Its length in seconds (None if it could not be probed)
+            
+        Returns:
+            Tuple of (transcript_text, segments) or (None, None) if failed; segments
+            may be None when the backend produces no timestamps
+        """
+
+
+class GeminiTranscriptionBackend(TranscriptionBackend):
+    """Transcription with Gemini: one upload, or overlapping segments spread over the keys"""
+    
+    name = "gemini"
+    
+    def __init__(self, api_key: Optional[str], router: ModelRouter, key_rotator=None,
+                 segmenter: Optional[AudioSegmenter] = None, segment_concurrency: int = 4,
+                 quota_reserve: Optional[int] = None):
+        """
+        Initialize Gemini backend
+        
+        Args:
+            api_key: Key for single-upload transcription (and segments without a rotator)
+            router: Model routing for the "transcription" task
+            key_rotator: Spreads segments over every key with quota
+            segmenter: Splits long audio into overlapping segments
+            segment_concurrency: Segments transcribed at the same time
+            quota_reserve: Requests kept for the other stages (default:
+                           TRANSCRIPTION_QUOTA_RESERVE or DEFAULT_QUOTA_RESERVE)
+        """
+        super().__init__()
+        self.api_key = api_key
+        self.router = router
+        self.key_rotator = key_rotator
+        self.segmenter = segmenter or AudioSegmenter()
+        self.segment_concurrency = max(1, segment_concurrency)
+        if quota_reserve is None:
+            quota_reserve = int(os.getenv("TRANSCRIPTION_QUOTA_RESERVE", str(DEFAULT_QUOTA_RESERVE)))
+        self.quota_reserve = quota_reserve
+    
+    def _model(self) -> str:
+        return self.router.route("transcription").model
+    
+    def available(self) -> bool:
+        if self.key_rotator:
+            return self.key_rotator.get_next_key(self._model()) is not None
+        return bool(self.api_key)
+    
+    def quota_low(self) -> bool:
+        if not self.key_rotator:
+            return False
+        # Transcription requests go through AIService, so they are in this count too
+        return self.key_rotator.remaining_requests(self._model()) < self.quota_reserve
+    
+    def transcribe(self, audio_path: str, duration: Optional[float]) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        self.stats = {}
+        # Long audio: overlapping segments in parallel, with caption-style timestamps
+        if self.segmenter.needs_segmenting(duration):
+            return self._transcribe_segmented(audio_path, duration)
+        
+        transcript = self._transcribe_upload(audio_path)
+        if transcript:
+            return transcript, None
+        return None, None
+    
+    def _transcribe_upload(self, audio_path: str) -> Optional[str]:
+        """
+        Transcribe audio file using Gemini AI
+        
+        The request goes through AIService, so it waits for the key's rate
+        limits, is counted against its quota and fails over on 429s.
+        
+        Args:
+            audio_path: Path to audio file
+            
+        Returns:
+            Transcribed text or None if failed
+        """
+        key = self.key_rotator.get_next_key(self._model()) if self.key_rotator else self.api_key
+        if not key:
+            print("❌ No API key available for transcription")
+            return None
+        
+        print("🤖 Transcribing audio with Gemini AI...")
+        service = AIService(key, key_rotator=self.key_rotator, router=self.router,
+                            retry_policy=SEGMENT_RETRY_POLICY)
+        started = time.monotonic()
+        transcript = service.transcribe_file(
+            audio_path,
+            mime_type=AUDIO_MIME_TYPES.get(os.path.splitext(audio_path)[1]),
+            stats=self.stats
+        )
+        if not transcript:
+            return None
+        
+        self.stats["transcribe_seconds"] = round(time.monotonic() - started, 2)
+        print(f"✅ Transcription complete: {len(transcript)} characters")
+        return transcript
+    
+    def _transcribe_segmented(self, audio_path: str, duration: float) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """
+        Transcribe long audio as overlapping segments in parallel, retrying only the
+        segments that failed, and stitch them into timestamped caption segments
+        
+        Args:
+            audio_path: Path to audio file
+            duration: Its length in seconds
+            
+        Returns:
+            Tuple of (transcript_text, segments) or (None, None) if any segment failed
+        """
+        if not self.api_key and not self.key_rotator:
+            print("❌ No API key available for transcription")
+            return None, None
+        
+        started = time.monotonic()
+        clips = self.segmenter.split(audio_path, duration)
+        results = asyncio.run(self._transcribe_clips(clips))
+        self.stats["segments"] = len(clips)
+        self.stats["transcribe_seconds"] = round(time.monotonic() - started, 2)
+        
+        missing = [clip.label for clip in clips if clip.index not in results]
+        if missing:
+            print(f"❌ Could not transcribe {len(missing)} of {len(clips)} segments: {', '.join(missing)}")
+            return None, None
+        
+        segments = self.segmenter.stitch([(clip, results[clip.index]) for clip in clips])
+        transcript = " ".join(segment["text"] for segment in segments)
+        print(f"✅ Transcription complete: {len(transcript)} characters from {len(clips)} segments "
+              f"({self.stats['transcribe_seconds']:.1f}s)")
+        return transcript, segments
+    
+    async def _transcribe_clips(self, clips: List[AudioClip]) -> Dict[int, List[Dict]]:
+        """
+        Transcribe segments concurrently across keys, in rounds that retry only the failures
+        
+        Args:
+            clips: Audio segments
+            
+        Returns:
+            Segment index -> timestamped passages, for the segments that succeeded
+        """
+        model = self._model()
+        semaphore = asyncio.Semaphore(self.segment_concurrency)
+        
+        async def transcribe(clip: AudioClip, key: str) -> Optional[List[Dict]]:
+            async with semaphore:
+                service = AIService(key, key_rotator=self.key_rotator, router=self.router,
+                                    retry_policy=SEGMENT_RETRY_POLICY)
+                return await service.transcribe_audio_async(clip.data, clip.mime_type, clip.label)
+        
+        results: Dict[int, List[Dict]] = {}
+        pending = list(clips)
+        for round_number in range(SEGMENT_ROUNDS):
+            keys = self.key_rotator.get_available_keys(len(pending), model) if self.key_rotator else [self.api_key]
+            if not keys:
+                print("❌ No API key with quota left for transcription")
+                break
+            if round_number:
+                print(f"🔁 Retrying {len(pending)} failed segment(s)...")
+            
+            # One segment per key; with fewer keys than segments, keys are shared round-robin
+            outputs = await asyncio.gather(*[
+                transcribe(clip, keys[i % len(keys)]) for i, clip in enumerate(pending)
+            ])
+            for clip, passages in zip(pending, outputs):
+                if passages:
+                    results[clip.index] = passages
+            
+            pending = [clip for clip in pending if clip.index not in results]
+            if not pending:
+                break
+        return results
+
+
+class LocalTranscriptionBackend(TranscriptionBackend):
+    """
+    On-device transcription with faster-whisper (optional dependency)
+    
+    The audio is cut into overlapping chunks, each decoded and transcribed in its
+    own worker process with the model loaded once per process, so all cores work
+    at once; chunks are stitched like Gemini segments.
+    """
+    
+    name = "local"
+    
+    def __init__(self, model_size: Optional[str] = None, workers: Optional[int] = None,
+                 language: Optional[str] = None, compute_type: str = "int8"):
+        """
+        Initialize local backend
+        
+        Args:
+            model_size: faster-whisper model, e.g. "tiny", "base", "small" (default:
+                        LOCAL_WHISPER_MODEL or DEFAULT_LOCAL_MODEL)
+            workers: Worker processes (default: LOCAL_TRANSCRIPTION_WORKERS, or half
+                     the cores); the cores are shared out between them
+            language: Spoken language code (None: detected per chunk)
+            compute_type: CTranslate2 quantization; int8 is fastest on CPU
+        """
+        super().__init__()
+        cores = os.cpu_count() or 1
+        self.model_size = model_size or os.getenv("LOCAL_WHISPER_MODEL", DEFAULT_LOCAL_MODEL)
+        self.workers = max(1, workers or int(os.getenv("LOCAL_TRANSCRIPTION_WORKERS", "0")) or cores // 2)
+        self.threads_per_worker = max(1, cores // self.workers)
+        self.language = language or os.getenv("LOCAL_WHISPER_LANGUAGE") or None
+        self.compute_type = compute_type
+    
+    def available(self) -> bool:
+        return importlib.util.find_spec("faster_whisper") is not None
+    
+    def chunks(self, duration: Optional[float]) -> List[Tuple[float, float]]:
+        """
+        Chunk boundaries: about one chunk per worker, within LOCAL_CHUNK_SECONDS
+        
+        Args:
+            duration: Length of the audio in seconds (None: one chunk of unknown length)
+            
+        Returns:
+            (start, end) pairs; consecutive chunks share LOCAL_OVERLAP_SECONDS
+        """
+        if not duration:
+            return [(0.0, 0.0)]
+        shortest, longest = LOCAL_CHUNK_SECONDS
+        length = min(longest, max(shortest, duration / self.workers + LOCAL_OVERLAP_SECONDS))
+        return AudioSegmenter(length, LOCAL_OVERLAP_SECONDS).boundaries(duration)
+    
+    def transcribe(self, audio_path: str, duration: Optional[float]) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        self.stats = {}
+        bounds = self.chunks(duration)
+        workers = min(self.workers, len(bounds))
+        print(f"🖥️ Transcribing locally with faster-whisper ({self.model_size}, {len(bounds)} chunks "
+              f"on {workers} processes x {self.threads_per_worker} threads)...")
+        
+        started = time.monotonic()
+        results = []
+        try:
+            # Spawned processes: forking a process that runs threads (Streamlit, asyncio) is unsafe
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_load_local_model,
+                initargs=(self.model_size, self.threads_per_worker, self.compute_type)
+            ) as pool:
+                futures = [
+                    pool.submit(_transcribe_local_chunk, audio_path, start, end, self.language)
+                    for start, end in bounds
+                ]
+                for index, ((start, end), future) in enumerate(zip(bounds, futures)):
+                    results.append((AudioClip(index=index, start=start, end=end, data=b""), future.result()))
+        except Exception as e:
+            print(f"❌ Error in local transcription: {str(e)}")
+            return None, None
+        
+        self.stats["segments"] = len(bounds)
+        self.stats["transcribe_seconds"] = round(time.monotonic() - started, 2)
+        
+        segments = AudioSegmenter.stitch(results)
+        transcript = " ".join(segment["text"] for segment in segments)
+        if not transcript:
+            print("❌ Local transcription found no speech")
+            return None, None
+        
+        print(f"✅ Transcription complete: {len(transcript)} characters from {len(bounds)} chunks "
+              f"({self.stats['transcribe_seconds']:.1f}s)")
+        return transcript, segments
+
+
+# The model loaded by each local transcription worker process
+_local_model = None
+
+
+def _load_local_model(model_size: str, cpu_threads: int, compute_type: str):
+    """Worker process initializer: load the faster-whisper model once"""
+    global _local_model
+    from faster_whisper import WhisperModel
+    _local_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _transcribe_local_chunk(audio_path: str, start: float, end: float,
+                            language: Optional[str]) -> List[Dict]:
+    """
+    Worker process task: decode one chunk as mono 16 kHz and transcribe it
+    
+    Returns:
+        Passages [{"start": seconds into the chunk, "text": ...}]
+    """
+    import numpy as np
+    from pydub import AudioSegment
+    
+    if end > start:
+        audio = AudioSegment.from_file(
+            audio_path,
+            start_second=start,
+            duration=end - start,
+            parameters=["-ac", "1", "-ar", "16000"]
+        )
+        source = np.array(audio.get_array_of_samples(), dtype=np.float32) / (1 << (8 * audio.sample_width - 1))
+    else:
+        # Unknown length: let faster-whisper decode the whole file
+        source = audio_path
+    
+    segments, _ = _local_model.transcribe(source, language=language, beam_size=1, vad_filter=True)
+    return [{"start": segment.start, "text": segment.text.strip()} for segment in segments if segment.text.strip()]
+
+
+def backend_order(setting: Optional[str] = None) -> List[str]:
+    """
+    Parse a backend order setting
+    
+    Args:
+        setting: Comma-separated backend names, or "auto" (default:
+                 TRANSCRIPTION_BACKENDS or DEFAULT_ORDER)
+        
+    Returns:
+        Backend names in order (["auto"] for automatic ordering)
+    """
+    setting = setting if setting is not None else os.getenv("TRANSCRIPTION_BACKENDS", DEFAULT_ORDER)
+    names = [name.strip().lower() for name in setting.split(",") if name.strip()]
+    if not names or names == ["auto"]:
+        return ["auto"]
+    
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        print(f"⚠️ Unknown transcription backend(s) {', '.join(unknown)}, expected {', '.join(BACKENDS)}")
+    return [name for i, name in enumerate(names) if name in BACKENDS and name not in names[:i]]
+
+
+def order_backends(backends: Dict[str, TranscriptionBackend],
+                   order: List[str]) -> List[TranscriptionBackend]:
+    """
+    Backends to try, in order, skipping those that cannot run
+    
+    Args:
+        backends: Backend name -> backend
+        order: Result of backend_order(); ["auto"] puts Gemini first unless its quota is low
+        
+    Returns:
+        Available backends in the order they should be tried
+    """
+    automatic = order == ["auto"]
+    if automatic:
+        gemini = backends.get("gemini")
+        order = ["local", "gemini"] if gemini and gemini.quota_low() else ["gemini", "local"]
+    
+    chosen = []
+    for name in order:
+        backend = backends.get(name)
+        if backend and backend.available():
+            chosen.append(backend)
+        elif backend and name == "local" and not automatic:
+            print("ℹ️ Local transcription unavailable (pip install faster-whisper to enable it)")
+    return chosen
@@ -3,151 +3,305 @@ API Key Rotation Manager
 Rotates between multiple API keys to maximize free tier quota
 """
 
-import os
-from typing import List, Optional
-from datetime import datetime, timedelta
 import json
+import os
+import re
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.utils.rate_limiter import (
+    RateLimiter, DEFAULT_MODEL, MODEL_LIMITS, get_shared_rate_limiter, parse_retry_delay
+)
+from backend.utils.retry import QUOTA, RATE, TRANSIENT, classify_error
+from backend.utils.usage_store import UsageStore, get_shared_usage_store
+
+
+# GOOGLE_API_KEY, GOOGLE_API_KEY_2, GOOGLE_API_KEY_3, ... (any index)
+_KEY_VARIABLE = re.compile(r'^GOOGLE_API_KEY(?:_(\d+))?$')
+
+# Values left over from the .env / secrets templates
+_PLACEHOLDER_KEYS = {"your_api_key_here", "your_second_api_key_here", "your_third_api_key_here"}
+
+
+@dataclass
+class KeyConfig:
+    """An API key with its own limits and model entitlement"""
+    key: str
+    rpm: Optional[int] = None       # None: the model tier's default (MODEL_LIMITS)
+    rpd: Optional[int] = None
+    models: Optional[List[str]] = None  # None: entitled to every model
+    
+    def allows(self, model: str) -> bool:
+        """True if this key may be used for `model`"""
+        return self.models is None or model in self.models
 
 
 class APIKeyRotator:
     """Manages rotation of multiple API keys"""
     
-    def __init__(self):
-        """Initialize with API keys from environment"""
-        # Load keys from .env
-        self.keys = self._load_keys()
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None,
+                 usage_store: Optional[UsageStore] = None):
+        """
+        Initialize with API keys from environment
+        
+        Args:
+            rate_limiter: Per-key RPM/RPD limiter (defaults to the process-wide one)
+            usage_store: Request counters shared across processes (defaults to
+                         cache/api_usage.db)
+        """
+        # Load keys from .env, secrets and the optional keys file
+        self.configs: Dict[str, KeyConfig] = {config.key: config for config in self._load_keys()}
+        self.keys = list(self.configs)
         self.current_index = 0
-        self.usage_file = Path("cache/api_usage.json")
-        self.usage_file.parent.mkdir(exist_ok=True)
-        self.usage_data = self._load_usage()
+        self.usage_store = usage_store or get_shared_usage_store()
+        
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        for config in self.configs.values():
+            if config.rpm is None and config.rpd is None:
+                continue
+            for model in config.models or [DEFAULT_MODEL]:
+                limits = self.rate_limiter.limits.get(model, MODEL_LIMITS[DEFAULT_MODEL])
+                self.rate_limiter.set_key_limits(
+                    config.key, model,
+                    config.rpm or limits["rpm"],
+                    config.rpd or limits["rpd"]
+                )
+        for model in self.rate_limiter.limits:
+            for key, requests_today in self.usage_store.requests_today(self.keys, model).items():
+                self.rate_limiter.seed_usage(key, requests_today, model)
     
-    def _load_keys(self) -> List[str]:
-        """Load all API keys from environment or Streamlit secrets"""
-        keys = []
+    def _load_keys(self) -> List[KeyConfig]:
+        """
+        Load all API keys from Streamlit secrets or environment, plus GEMINI_KEYS_FILE
+        
+        Indexed variables (GOOGLE_API_KEY, GOOGLE_API_KEY_2, ... GOOGLE_API_KEY_<n>)
+        are read in index order. GEMINI_KEYS_FILE may point to a JSON list of keys,
+        each either a string or {"key", "rpm", "rpd", "models"}.
+        """
+        variables = {}
         
         # Try to load from Streamlit secrets first (for cloud deployment)
         try:
             import streamlit as st
             if hasattr(st, 'secrets'):
-                # Primary key
-                primary = st.secrets.get("GOOGLE_API_KEY")
-                if primary:
-                    keys.append(primary)
-                
-                # Secondary keys
-                key2 = st.secrets.get("GOOGLE_API_KEY_2")
-                if key2 and key2 != "your_second_api_key_here":
-                    keys.append(key2)
-                
-                key3 = st.secrets.get("GOOGLE_API_KEY_3")
-                if key3 and key3 != "your_third_api_key_here":
-                    keys.append(key3)
+                variables = {name: st.secrets[name] for name in st.secrets.keys()
+                             if _KEY_VARIABLE.match(name)}
         except:
             pass
         
         # If no keys from secrets, try environment variables (for local)
-        if not keys:
-            # Primary key
-            primary = os.getenv("GOOGLE_API_KEY")
-            if primary:
-                keys.append(primary)
-            
-            # Secondary keys
-            key2 = os.getenv("GOOGLE_API_KEY_2")
-            if key2 and key2 != "your_second_api_key_here":
-                keys.append(key2)
-            
-            key3 = os.getenv("GOOGLE_API_KEY_3")
-            if key3 and key3 != "your_third_api_key_here":
-                keys.append(key3)
+        if not variables:
+            variables = {name: value for name, value in os.environ.items()
+                         if _KEY_VARIABLE.match(name)}
+        
+        def index(name: str) -> int:
+            number = _KEY_VARIABLE.match(name).group(1)
+            return int(number) if number else 1
+        
+        configs = [
+            KeyConfig(key=str(variables[name]).strip())
+            for name in sorted(variables, key=index)
+        ]
+        configs.extend(self._load_keys_file(os.getenv("GEMINI_KEYS_FILE")))
+        
+        keys = {}
+        for config in configs:
+            if config.key and config.key not in _PLACEHOLDER_KEYS:
+                # A keys-file entry overrides the same key from the environment
+                keys[config.key] = config
         
         if not keys:
             raise ValueError("No API keys found in .env file or Streamlit secrets")
         
-        return keys
-    
-    def _load_usage(self) -> dict:
-        """Load usage data from file"""
-        if self.usage_file.exists():
-            try:
-                with open(self.usage_file, 'r') as f:
-                    return json.load(f)
-            except:
-                pass
-        
-        # Initialize usage data
-        return {
-            key: {
-                "requests_today": 0,
-                "last_reset": datetime.now().date().isoformat(),
-                "total_requests": 0
-            }
-            for key in self.keys
-        }
+        return list(keys.values())
     
-    def _save_usage(self):
-        """Save usage data to file"""
-        with open(self.usage_file, 'w') as f:
-            json.dump(self.usage_data, f, indent=2)
-    
-    def _reset_if_needed(self, key: str):
-        """Reset daily counter if it's a new day"""
-        # Initialize key if not exists
-        if key not in self.usage_data:
-            self.usage_data[key] = {
-                "requests_today": 0,
-                "last_reset": datetime.now().date().isoformat(),
-                "total_requests": 0
-            }
-            self._save_usage()
-            return
-        
-        today = datetime.now().date().isoformat()
-        if self.usage_data[key]["last_reset"] != today:
-            self.usage_data[key]["requests_today"] = 0
-            self.usage_data[key]["last_reset"] = today
-            self._save_usage()
-    
-    def get_next_key(self) -> Optional[str]:
-        """
-        Get next available API key with quota remaining
+    @staticmethod
+    def _load_keys_file(path: Optional[str]) -> List[KeyConfig]:
+        """
+        Read key configs from a JSON keys file
         
+        Args:
+            path: File path, or None
+            
         Returns:
-            API key string or None if all exhausted
+            List of KeyConfig (empty if the file is missing or unreadable)
         """
-        # Try all keys starting from current index
+        if not path:
+            return []
+        
+        try:
+            with open(Path(path), 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read keys file {path}: {str(e)}")
+            return []
+        
+        configs = []
+        for entry in entries:
+            if isinstance(entry, str):
+                configs.append(KeyConfig(key=entry.strip()))
+            elif isinstance(entry, dict) and entry.get("key"):
+                configs.append(KeyConfig(
+                    key=str(entry["key"]).strip(),
+                    rpm=entry.get("rpm"),
+                    rpd=entry.get("rpd"),
+                    models=entry.get("models")
+                ))
+        return configs
+    
+    def _home_model(self, key: str) -> str:
+        """Model a key's daily usage is counted against"""
+        models = self.configs[key].models
+        return DEFAULT_MODEL if not models or DEFAULT_MODEL in models else models[0]
+    
+    def daily_limit(self, key: str, model: str = DEFAULT_MODEL) -> int:
+        """Requests per day allowed for a key on a model"""
+        return self.rate_limiter.limits_for(key, model)["rpd"]
+    
+    def _ranked_keys(self, model: str) -> List[str]:
+        """
+        Keys entitled to `model` with daily quota left, least loaded first
+        
+        A key is out of quota when the shared counts reach its limit or the
+        server has reported its daily quota used up.
+        
+        Ordered by how soon the key can send (rate limits and quarantine),
+        then by health (backoff penalty), then by the share of its daily
+        quota already used; rotation order breaks ties.
+        """
+        # Counts come from the shared store, so other processes' requests are included
+        requests_today = self.usage_store.requests_today(self.keys, model)
+        
+        candidates: List[Tuple[Tuple[float, float, float], str]] = []
         for i in range(len(self.keys)):
-            key_index = (self.current_index + i) % len(self.keys)
-            key = self.keys[key_index]
+            key = self.keys[(self.current_index + i) % len(self.keys)]
+            if not self.configs[key].allows(model):
+                continue
             
-            self._reset_if_needed(key)
+            limit = self.daily_limit(key, model)
+            if requests_today[key] >= limit or self.rate_limiter.exhausted_today(key, model):
+                continue
             
-            # Check if key has quota remaining (20 requests/day)
-            if self.usage_data[key]["requests_today"] < 20:
-                self.current_index = key_index
-                return key
+            score = (
+                self.rate_limiter.wait_time(key, model),
+                self.rate_limiter.penalty(key, model),
+                requests_today[key] / limit
+            )
+            candidates.append((score, key))
         
-        return None
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [key for _, key in candidates]
     
-    def record_request(self, key: str):
+    def get_next_key(self, model: str = DEFAULT_MODEL) -> Optional[str]:
+        """
+        Get the least loaded healthy API key with quota remaining
+        
+        Args:
+            model: Model the request will go to
+            
+        Returns:
+            API key string or None if all exhausted
+        """
+        ranked = self._ranked_keys(model)
+        if not ranked:
+            return None
+        
+        key = ranked[0]
+        # Advance past the chosen key so equally loaded keys take turns
+        self.current_index = (self.keys.index(key) + 1) % len(self.keys)
+        return key
+    
+    def get_available_keys(self, count: int, model: str = DEFAULT_MODEL) -> List[str]:
+        """
+        Get up to `count` distinct API keys with quota remaining
+        
+        Args:
+            count: Maximum number of keys wanted (e.g. one per concurrent stage)
+            model: Model the requests will go to
+            
+        Returns:
+            List of API keys, least loaded first (may be empty)
+        """
+        return self._ranked_keys(model)[:count]
+    
+    def acquire(self, key: str, model: str = DEFAULT_MODEL,
+                max_wait: Optional[float] = None) -> bool:
+        """
+        Wait until this key's rate limits allow another request
+        
+        Blocks only as long as this particular key needs, instead of a fixed delay.
+        
+        Args:
+            key: API key about to be used
+            model: Model the request goes to
+            max_wait: Longest acceptable wait (capped by the limiter's own max_wait)
+            
+        Returns:
+            True when a request may be sent, False if the key would wait too long
+        """
+        return self.rate_limiter.acquire(key, model, self._max_wait(max_wait))
+    
+    async def acquire_async(self, key: str, model: str = DEFAULT_MODEL,
+                            max_wait: Optional[float] = None) -> bool:
+        """Async variant of acquire()"""
+        return await self.rate_limiter.acquire_async(key, model, self._max_wait(max_wait))
+    
+    def _max_wait(self, max_wait: Optional[float]) -> Optional[float]:
+        if max_wait is None:
+            return None
+        return min(max_wait, self.rate_limiter.max_wait)
+    
+    def report_rate_limited(self, key: str, error: Optional[Exception] = None,
+                            model: str = DEFAULT_MODEL):
+        """
+        Back off a key that received a 429 response
+        
+        Args:
+            key: API key that was rejected
+            error: The exception raised, used to read the server's retry delay
+            model: Model the request went to
+        """
+        retry_after = parse_retry_delay(error) if error else None
+        self.rate_limiter.report_rate_limited(key, model, retry_after)
+    
+    def report_failure(self, key: str, error: Exception, model: str = DEFAULT_MODEL):
+        """
+        Quarantine a key after a 429, 5xx or timeout
+        
+        A used-up daily quota takes the key out of rotation until the next
+        quota day, in every process sharing the usage store. Other errors (bad prompt, invalid input) say nothing
+        about the key's health and are ignored.
+        
+        Args:
+            key: API key the request was sent with
+            error: The exception raised
+            model: Model the request went to
+        """
+        kind = classify_error(error)
+        if kind == QUOTA:
+            self.rate_limiter.exhaust(key, model)
+            self.usage_store.mark_exhausted(key, self.daily_limit(key, model), model)
+        elif kind == RATE:
+            self.report_rate_limited(key, error, model)
+        elif kind == TRANSIENT:
+            # Exponential backoff, so a flapping key is tried less and less often
+            self.rate_limiter.report_rate_limited(key, model)
+    
+    def report_success(self, key: str, model: str = DEFAULT_MODEL):
+        """Clear any backoff on a key after a successful request"""
+        self.rate_limiter.report_success(key, model)
+    
+    def record_request(self, key: str, model: str = DEFAULT_MODEL):
         """
         Record that a request was made with this key
         
         Args:
             key: API key that was used
+            model: Model the request went to (each has its own daily quota)
         """
-        # Initialize key if not exists
-        if key not in self.usage_data:
-            self.usage_data[key] = {
-                "requests_today": 0,
-                "last_reset": datetime.now().date().isoformat(),
-                "total_requests": 0
-            }
-        
-        self.usage_data[key]["requests_today"] += 1
-        self.usage_data[key]["total_requests"] += 1
-        self._save_usage()
+        # Single atomic increment, safe with other processes counting the same key
+        self.usage_store.increment(key, model=model)
     
     def get_current_key(self) -> str:
         """Get the current active API key"""
@@ -165,16 +319,25 @@ class APIKeyRotator:
             "keys": []
         }
         
+        # Read-only: nothing is written when stats are displayed
+        usage = self.usage_store.usage(self.keys)
         for i, key in enumerate(self.keys, 1):
-            self._reset_if_needed(key)
             masked_key = f"{key[:20]}...{key[-4:]}"
+            home_model = self._home_model(key)
+            daily_limit = self.daily_limit(key, home_model)
+            home_today = self.usage_store.requests_today([key], home_model)[key]
+            exhausted = self.rate_limiter.exhausted_today(key, home_model)
             
             stats["keys"].append({
                 "key_number": i,
                 "key": masked_key,
-                "requests_today": self.usage_data[key]["requests_today"],
-                "remaining_today": 20 - self.usage_data[key]["requests_today"],
-                "total_requests": self.usage_data[key]["total_requests"]
+                "model": home_model,
+                "requests_today": home_today,
+                "all_models_today": usage[key]["requests_today"],
+                "daily_limit": daily_limit,
+                "remaining_today": 0 if exhausted else max(daily_limit - home_today, 0),
+                "total_requests": usage[key]["total_requests"],
+                "healthy": self.rate_limiter.penalty(key, home_model) == 0 and not exhausted
             })
         
         return stats
@@ -187,3 +350,21 @@ class APIKeyRotator:
             True if at least one key has quota remaining
         """
         return self.get_next_key() is not None
+    
+    def remaining_requests(self, model: str = DEFAULT_MODEL) -> int:
+        """
+        Requests left today on a model, summed over the keys entitled to it
+        
+        Args:
+            model: Model to count
+            
+        Returns:
+            Remaining daily requests across all keys
+        """
+        keys = [key for key in self.keys if self.configs[key].allows(model)]
+        requests_today = self.usage_store.requests_today(keys, model)
+        return sum(
+            max(self.daily_limit(key, model) - requests_today[key], 0)
+            for key in keys
+            if not self.rate_limiter.exhausted_today(key, model)
+        )
@@ -0,0 +1,205 @@
+"""
+Audio Segmenter
+Splits long audio into fixed-length, overlapping mono 16 kHz segments for
+parallel transcription, and stitches the timestamped segment transcripts
+back into one caption-style segment list without the repeated overlap
+"""
+
+import io
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from pydub import AudioSegment
+from pydub.utils import mediainfo
+
+from backend.utils.transcript_chunker import format_timestamp
+
+
+# Segment length and overlap; the overlap keeps words cut at a boundary whole
+# in at least one of the two neighbouring segments
+DEFAULT_SEGMENT_SECONDS = 600
+DEFAULT_OVERLAP_SECONDS = 15
+
+# Longest run of repeated words removed where two segments meet
+_MAX_REPEAT_WORDS = 40
+
+_WORD = re.compile(r"[\w']+")
+
+
+@dataclass
+class AudioClip:
+    """One encoded segment of the audio"""
+    index: int
+    start: float        # seconds into the full audio
+    end: float
+    data: bytes
+    mime_type: str = "audio/mp3"
+    
+    @property
+    def label(self) -> str:
+        """Human-readable position, e.g. 'Part 2 (9:45-19:45)'"""
+        return f"Part {self.index + 1} ({format_timestamp(self.start)}-{format_timestamp(self.end)})"
+
+
+class AudioSegmenter:
+    """Fixed-length overlapping audio splitter with overlap-aware stitching"""
+    
+    def __init__(self, segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                 overlap_seconds: float = DEFAULT_OVERLAP_SECONDS, bitrate: str = "32k"):
+        """
+        Initialize segmenter
+        
+        Args:
+            segment_seconds: Length of each segment
+            overlap_seconds: Audio shared by consecutive segments
+            bitrate: MP3 bitrate of the encoded segments (speech needs little)
+        """
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = min(overlap_seconds, segment_seconds / 2)
+        self.bitrate = bitrate
+    
+    @staticmethod
+    def duration(path: str) -> Optional[float]:
+        """Length of an audio file in seconds (None if it cannot be probed)"""
+        try:
+            return float(mediainfo(path)["duration"])
+        except Exception as e:
+            print(f"⚠️ Could not probe audio duration: {str(e)}")
+            return None
+    
+    def needs_segmenting(self, duration: Optional[float]) -> bool:
+        """True if the audio is longer than one segment"""
+        return bool(duration) and duration > self.segment_seconds + self.overlap_seconds
+    
+    def boundaries(self, duration: float) -> List[Tuple[float, float]]:
+        """
+        Start and end of each segment
+        
+        Args:
+            duration: Length of the audio in seconds
+            
+        Returns:
+            (start, end) pairs; consecutive segments share overlap_seconds
+        """
+        step = self.segment_seconds - self.overlap_seconds
+        bounds = []
+        start = 0.0
+        while True:
+            end = start + self.segment_seconds
+            if end >= duration - self.overlap_seconds:
+                # A remainder no longer than the overlap is folded into the last segment
+                bounds.append((start, duration))
+                return bounds
+            bounds.append((start, end))
+            start += step
+    
+    def split(self, path: str, duration: float) -> List[AudioClip]:
+        """
+        Cut the audio into overlapping segments, decoding one segment at a time
+        
+        Args:
+            path: Audio file
+            duration: Its length in seconds
+            
+        Returns:
+            Encoded segments in order
+        """
+        clips = []
+        for index, (start, end) in enumerate(self.boundaries(duration)):
+            audio = AudioSegment.from_file(
+                path,
+                start_second=start,
+                duration=end - start,
+                parameters=["-ac", "1", "-ar", "16000"]
+            )
+            buffer = io.BytesIO()
+            audio.export(buffer, format="mp3", bitrate=self.bitrate)
+            clips.append(AudioClip(index=index, start=start, end=end, data=buffer.getvalue()))
+        
+        print(f"✂️ Split {format_timestamp(duration)} of audio into {len(clips)} segments "
+              f"({sum(len(clip.data) for clip in clips) / (1024 * 1024):.1f} MB)")
+        return clips
+    
+    @staticmethod
+    def stitch(results: List[Tuple[AudioClip, List[Dict]]]) -> List[Dict]:
+        """
+        Merge per-segment passages into one timeline without the overlap repeated
+        
+        Each segment keeps the passages that start between the midpoints of its
+        overlaps with its neighbours, plus the passage running across its first
+        cut (it may hold words the previous segment lost at its end); words
+        repeated across a cut are dropped from the later segment.
+        
+        Args:
+            results: (segment, [{"start": seconds into the segment, "text": ...}]) pairs
+            
+        Returns:
+            Caption-style segments [{"text", "start", "duration"}] with absolute times
+        """
+        results = sorted(results, key=lambda pair: pair[0].index)
+        passages: List[Dict] = []
+        for position, (clip, clip_passages) in enumerate(results):
+            lower = float("-inf")
+            upper = float("inf")
+            if position > 0:
+                lower = (clip.start + results[position - 1][0].end) / 2
+            if position + 1 < len(results):
+                upper = (results[position + 1][0].start + clip.end) / 2
+            
+            inside = [passage for passage in clip_passages if lower <= clip.start + passage["start"] < upper]
+            before = [passage for passage in clip_passages if clip.start + passage["start"] < lower]
+            if before:
+                inside.insert(0, before[-1])
+            kept = [
+                {"start": round(clip.start + passage["start"], 2), "text": passage["text"], "end": clip.end}
+                for passage in inside
+            ]
+            
+            # Only the first passages after a cut can repeat the end of the previous segment
+            while passages and kept:
+                recent = " ".join(passage["text"] for passage in passages[-3:])
+                text = _drop_repeated_words(recent, kept[0]["text"])
+                if text:
+                    kept[0]["text"] = text
+                    kept[0]["start"] = max(kept[0]["start"], passages[-1]["start"])
+                    break
+                kept.pop(0)
+            passages.extend(kept)
+        
+        segments = []
+        for i, passage in enumerate(passages):
+            end = passages[i + 1]["start"] if i + 1 < len(passages) else passage["end"]
+            segments.append({
+                "text": passage["text"],
+                "start": passage["start"],
+                "duration": round(max(0.0, end - passage["start"]), 2)
+            })
+        return segments
+
+
+def _drop_repeated_words(previous: str, text: str) -> str:
+    """
+    Remove the leading words of `text` that repeat the end of `previous`
+    
+    Args:
+        previous: Text just before the cut
+        text: Text just after it
+        
+    Returns:
+        `text` without the repeated words (empty if it is entirely repeated)
+    """
+    words = text.split()
+    normalized = [" ".join(_WORD.findall(word.lower())) for word in words]
+    tail = [" ".join(_WORD.findall(word.lower())) for word in previous.split()][-_MAX_REPEAT_WORDS:]
+    
+    # Entirely contained in what was already said
+    if len(normalized) >= 3 and f" {' '.join(normalized)} " in f" {' '.join(tail)} ":
+        return ""
+    
+    # Longest prefix of `text` that is a suffix of `previous` (at least 3 words, so
+    # genuinely repeated short phrases like "and the" are kept)
+    for size in range(min(len(words), len(tail)), 2, -1):
+        if normalized[:size] == tail[-size:]:
+            return " ".join(words[size:])
+    return text
@@ -3,35 +3,466 @@ Cache Manager for storing processed video results
 Saves API calls by caching summaries, key points, and quizzes
 """
 
+import hashlib
 import json
-import os
+import sqlite3
+import threading
+import time
+import zlib
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from backend.utils.memory_cache import MemoryLRU
+
+
+# Cached components: name -> legacy JSON subdirectory (also the stats counter name)
+COMPONENTS = {
+    "transcript": "transcripts",
+    "summary": "summaries",
+    "key_points": "keypoints",
+    "quiz": "quizzes",
+}
+
+# Components generated from the transcript, cached per content hash and version
+ARTIFACTS = ("summary", "key_points", "quiz")
+
+SCHEMA_VERSION = 1
+
+# Default budget for compressed payloads on disk
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+# Lifetimes used by the app and the batch CLI: generated content is refreshed
+# more often than transcripts, quizzes most often
+DEFAULT_TTL = {
+    "transcript": timedelta(days=90),
+    "summary": timedelta(days=30),
+    "key_points": timedelta(days=30),
+    "quiz": timedelta(days=14),
+}
+
+# Rows evicted (or components expired) per batch, and batches per save
+EVICTION_BATCH = 20
+MAX_EVICTION_BATCHES = 5
+
+# Memory-tier hits are recorded in the database at least this often, so
+# eviction (here or in another process) sees which videos are really used
+ACCESS_FLUSH_SECONDS = 30
+
+# Manifest counters derived from the stored rows (kept current by triggers)
+MANIFEST_KEYS = ("videos", "total_bytes", *COMPONENTS.values())
+
+# Counter for an artifact row's component
+_ARTIFACT_COUNTER = (
+    "CASE {row}.component"
+    + "".join(f" WHEN '{name}' THEN '{COMPONENTS[name]}'" for name in ARTIFACTS)
+    + " END"
+)
+
+
+def _encode(value: Any) -> bytes:
+    """Compress a component for storage"""
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _decode(blob: bytes) -> Any:
+    """Decompress a stored component"""
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def content_hash(transcript: str) -> str:
+    """
+    Content address of a transcript, shared by re-uploads and mirrors of the same video
+    
+    Args:
+        transcript: Normalized transcript text
+        
+    Returns:
+        SHA-256 hex digest of the whitespace-collapsed, lower-cased text
+    """
+    canonical = " ".join(transcript.split()).lower()
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 
 class CacheManager:
-    """Manages local cache for processed videos"""
+    """
+    Manages local cache for processed videos (SQLite)
+    
+    Transcripts are stored per video. Summaries, key points and quizzes are stored
+    per transcript content hash and prompt/model version, so identical content is
+    generated once and a prompt change only invalidates the affected component.
+    """
     
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", memory: Optional[MemoryLRU] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: Optional[Dict[str, timedelta]] = None,
+                 versions: Optional[Dict[str, str]] = None):
         """
         Initialize cache manager
         
         Args:
-            cache_dir: Directory to store cache files
+            cache_dir: Directory to store the cache database
+            memory: Optional in-memory LRU tier consulted before the database
+            max_bytes: Budget for compressed payloads; least recently accessed
+                       entries are evicted beyond it
+            ttl: Optional time-to-live per component, e.g.
+                 {"transcript": timedelta(days=90), "quiz": timedelta(days=7)}
+            versions: Version of each generated component (see
+                      AIService.artifact_versions); outputs cached under another
+                      version are treated as missing
         """
+        self.memory = memory
+        self.max_bytes = max_bytes
+        self.ttl = ttl or {}
+        self.versions = {name: "default" for name in ARTIFACTS}
+        self.versions.update(versions or {})
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        self.db_path = self.cache_dir / "cache.db"
+        
+        # Hit/miss counts and latest access not yet written to the manifest
+        self._pending = {"hits": 0, "misses": 0}
+        self._last_access = 0.0
+        # Videos served from the memory tier -> time of their latest hit, not yet written
+        self._pending_access: Dict[str, float] = {}
+        self._accesses_flushed_at = time.monotonic()
+        
+        # Shared by the Streamlit script thread and pipeline worker threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        # Lets space freed by eviction be returned to the filesystem (new databases only)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._migrate_json_tree()
+    
+    def _create_schema(self):
+        """Create the schema on first use"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE videos (
+                    video_id TEXT PRIMARY KEY,
+                    transcript BLOB NOT NULL,
+                    transcript_at TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    last_access REAL NOT NULL DEFAULT 0,
+                    segments BLOB
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE artifacts (
+                    content_hash TEXT NOT NULL,
+                    component TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_access REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (content_hash, component, version)
+                )
+            """)
+            
+            for index in ("videos(last_access)", "videos(transcript_at)", "videos(content_hash)",
+                          "artifacts(last_access)", "artifacts(component, created_at)"):
+                name = "idx_" + index.replace("(", "_").replace(", ", "_").rstrip(")")
+                self._conn.execute(f"CREATE INDEX {name} ON {index}")
+            
+            # Manifest of counters, so stats never scan the tables
+            self._conn.execute("""
+                CREATE TABLE cache_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            self._create_manifest_triggers()
+            self._rebuild_manifest()
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _create_manifest_triggers(self):
+        """Create the triggers that keep manifest counters in step with every write"""
+        video_keys = "key IN ('videos', 'transcripts', 'total_bytes')"
+        video_delta = (
+            "CASE key WHEN 'total_bytes' THEN length({row}.transcript) + COALESCE(length({row}.segments), 0) "
+            "ELSE 1 END"
+        )
+        artifact_keys = f"key IN ('total_bytes', {_ARTIFACT_COUNTER})"
+        artifact_delta = "CASE key WHEN 'total_bytes' THEN length({row}.value) ELSE 1 END"
+        
+        self._conn.execute(f"""
+            CREATE TRIGGER videos_manifest_insert AFTER INSERT ON videos BEGIN
+                UPDATE cache_meta SET value = value + ({video_delta.format(row='NEW')})
+                WHERE {video_keys};
+            END
+        """)
+        self._conn.execute(f"""
+            CREATE TRIGGER videos_manifest_update AFTER UPDATE OF transcript, segments ON videos BEGIN
+                UPDATE cache_meta SET value = value + ({video_delta.format(row='NEW')})
+                                                    - ({video_delta.format(row='OLD')})
+                WHERE {video_keys};
+            END
+        """)
+        self._conn.execute(f"""
+            CREATE TRIGGER videos_manifest_delete AFTER DELETE ON videos BEGIN
+                UPDATE cache_meta SET value = value - ({video_delta.format(row='OLD')})
+                WHERE {video_keys};
+            END
+        """)
+        self._conn.execute(f"""
+            CREATE TRIGGER artifacts_manifest_insert AFTER INSERT ON artifacts BEGIN
+                UPDATE cache_meta SET value = value + ({artifact_delta.format(row='NEW')})
+                WHERE {artifact_keys.format(row='NEW')};
+            END
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER artifacts_manifest_update AFTER UPDATE OF value ON artifacts BEGIN
+                UPDATE cache_meta SET value = value + length(NEW.value) - length(OLD.value)
+                WHERE key = 'total_bytes';
+            END
+        """)
+        self._conn.execute(f"""
+            CREATE TRIGGER artifacts_manifest_delete AFTER DELETE ON artifacts BEGIN
+                UPDATE cache_meta SET value = value - ({artifact_delta.format(row='OLD')})
+                WHERE {artifact_keys.format(row='OLD')};
+            END
+        """)
+    
+    def _rebuild_manifest(self):
+        """Recompute manifest counters from the stored rows (caller holds the lock and transaction)"""
+        counters = dict.fromkeys(MANIFEST_KEYS, 0)
+        videos, transcript_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(transcript) + COALESCE(length(segments), 0)), 0) FROM videos"
+        ).fetchone()
+        counters.update(videos=videos, transcripts=videos, total_bytes=transcript_bytes)
+        for component, count, size in self._conn.execute(
+            "SELECT component, COUNT(*), SUM(length(value)) FROM artifacts GROUP BY component"
+        ):
+            counters[COMPONENTS[component]] = count
+            counters["total_bytes"] += size
+        
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO cache_meta (key, value) VALUES (?, ?)",
+            counters.items()
+        )
+        # Usage counters cannot be derived, so they are only initialized
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO cache_meta (key, value) VALUES (?, 0)",
+            [("hits",), ("misses",), ("last_access",)]
+        )
+    
+    def rebuild_manifest(self):
+        """
+        Recount the manifest from the stored rows
+        
+        Only needed if the database was modified outside CacheManager; hit/miss
+        counts and the last access time are kept.
+        """
+        with self._lock, self._conn:
+            self._rebuild_manifest()
+    
+    def _flush_counters(self):
+        """
+        Write pending hit/miss counts to the manifest, and the access times of
+        memory-tier hits to their rows (caller holds the lock and transaction)
+        """
+        if self._pending_access:
+            accesses = list(self._pending_access.items())
+            self._conn.executemany(
+                "UPDATE videos SET last_access = MAX(last_access, ?) WHERE video_id = ?",
+                [(accessed, video_id) for video_id, accessed in accesses]
+            )
+            self._conn.executemany(
+                "UPDATE artifacts SET last_access = MAX(last_access, ?) "
+                "WHERE content_hash = (SELECT content_hash FROM videos WHERE video_id = ?)",
+                [(accessed, video_id) for video_id, accessed in accesses]
+            )
+            self._pending_access = {}
+        self._accesses_flushed_at = time.monotonic()
         
-        # Create subdirectories
-        (self.cache_dir / "transcripts").mkdir(exist_ok=True)
-        (self.cache_dir / "summaries").mkdir(exist_ok=True)
-        (self.cache_dir / "keypoints").mkdir(exist_ok=True)
-        (self.cache_dir / "quizzes").mkdir(exist_ok=True)
+        if not (self._pending["hits"] or self._pending["misses"] or self._last_access):
+            return
+        for key, count in self._pending.items():
+            self._conn.execute(
+                "UPDATE cache_meta SET value = value + ? WHERE key = ?", (count, key)
+            )
+        self._conn.execute(
+            "UPDATE cache_meta SET value = MAX(value, ?) WHERE key = 'last_access'",
+            (self._last_access,)
+        )
+        self._pending = {"hits": 0, "misses": 0}
+        self._last_access = 0.0
     
-    def _get_cache_path(self, video_id: str, content_type: str) -> Path:
-        """Get cache file path for a video and content type"""
-        return self.cache_dir / content_type / f"{video_id}.json"
+    def _migrate_json_tree(self):
+        """
+        One-shot import of the legacy cache/<component>/<video_id>.json files
+        
+        Existing database values win over legacy files. Files are removed once
+        their contents are committed; summaries, key points and quizzes whose
+        video has no cached transcript can't be stored, so those files are kept
+        and retried on the next start.
+        """
+        # Transcripts first: generated components are keyed by their hash
+        legacy_files = [
+            (column, path)
+            for column, subdir in COMPONENTS.items()
+            if (self.cache_dir / subdir).is_dir()
+            for path in (self.cache_dir / subdir).glob("*.json")
+        ]
+        if not legacy_files:
+            return
+        
+        print(f"📦 Migrating {len(legacy_files)} cached files to {self.db_path}...")
+        migrated = []
+        kept = []
+        with self._lock, self._conn:
+            for column, path in legacy_files:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    print(f"Skipping unreadable cache file {path}: {e}")
+                    continue
+                
+                if self._write(
+                    path.stem,
+                    {column: data.get("content")},
+                    data.get("cached_at") or datetime.now().isoformat(),
+                    overwrite=False
+                ):
+                    migrated.append(path)
+                else:
+                    kept.append(path)
+        
+        for path in migrated:
+            path.unlink()
+        for subdir in COMPONENTS.values():
+            try:
+                (self.cache_dir / subdir).rmdir()
+            except OSError:
+                pass
+        print(f"✅ Migrated {len(migrated)} cached files")
+        if kept:
+            # Generated components need the video's transcript; keep them for a later run
+            print(f"⚠️ Kept {len(kept)} cached files whose video has no cached transcript:")
+            for path in kept:
+                print(f"   {path}")
+    
+    def _write(self, video_id: str, components: Dict[str, Any], timestamp: str,
+               overwrite: bool = True) -> bool:
+        """
+        Store a video's transcript and/or generated components (caller holds the lock and transaction)
+        
+        Args:
+            video_id: YouTube video ID
+            components: Component name -> value; None values are skipped. A
+                        "segments" entry is stored with the transcript
+            timestamp: Cache time recorded for each written component
+            overwrite: If False, keep values that are already stored
+            
+        Returns:
+            True if everything was stored, False if generated components were
+            given for a video whose transcript is not cached
+        """
+        now = time.time()
+        conflict = "DO UPDATE SET {}" if overwrite else "DO NOTHING"
+        
+        transcript = components.get("transcript")
+        if transcript:
+            # Caption segments belong to this transcript; a new transcript without them clears them
+            segments = components.get("segments")
+            self._conn.execute(
+                "INSERT INTO videos (video_id, transcript, transcript_at, content_hash, last_access, segments) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(video_id) " + conflict.format(
+                    "transcript = excluded.transcript, transcript_at = excluded.transcript_at, "
+                    "content_hash = excluded.content_hash, last_access = excluded.last_access, "
+                    "segments = excluded.segments"
+                ),
+                (video_id, _encode(transcript), timestamp, content_hash(transcript), now,
+                 _encode(segments) if segments else None)
+            )
+        
+        artifacts = {name: components.get(name) for name in ARTIFACTS if components.get(name)}
+        if not artifacts:
+            return True
+        
+        row = self._conn.execute(
+            "SELECT content_hash FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        
+        for name, value in artifacts.items():
+            key = (row[0], name, self.versions[name])
+            self._conn.execute(
+                "INSERT INTO artifacts (content_hash, component, version, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(content_hash, component, version) " + conflict.format(
+                    "value = excluded.value, created_at = excluded.created_at, "
+                    "last_access = excluded.last_access"
+                ),
+                (*key, _encode(value), timestamp, now)
+            )
+            # Outputs of earlier prompt/model versions will never be read again
+            self._conn.execute(
+                "DELETE FROM artifacts WHERE content_hash = ? AND component = ? AND version != ?",
+                key
+            )
+        return True
+    
+    def _expiry_cutoffs(self) -> Dict[str, str]:
+        """ISO timestamps before which each component with a TTL is stale"""
+        now = datetime.now()
+        return {name: (now - ttl).isoformat() for name, ttl in self.ttl.items()}
+    
+    def _read_video(self, video_id: str) -> Dict[str, Any]:
+        """
+        Load a video's current components and mark them recently accessed
+        
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            Component name -> value for components that are stored, current
+            and not expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcript, transcript_at, content_hash FROM videos WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+            if row is None:
+                return {}
+            transcript, transcript_at, digest = row
+            
+            artifacts = [
+                (component, value, created_at)
+                for component, version, value, created_at in self._conn.execute(
+                    "SELECT component, version, value, created_at FROM artifacts WHERE content_hash = ?",
+                    (digest,)
+                )
+                if self.versions.get(component) == version
+            ]
+            
+            with self._conn:
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE videos SET last_access = ? WHERE video_id = ?", (now, video_id)
+                )
+                self._conn.executemany(
+                    "UPDATE artifacts SET last_access = ? "
+                    "WHERE content_hash = ? AND component = ? AND version = ?",
+                    [(now, digest, component, self.versions[component]) for component, _, _ in artifacts]
+                )
+                self._flush_counters()
+        
+        cutoffs = self._expiry_cutoffs()
+        data = {}
+        for component, value, cached_at in [("transcript", transcript, transcript_at), *artifacts]:
+            if component not in cutoffs or cached_at >= cutoffs[component]:
+                data[component] = _decode(value)
+        return data
     
     def is_cached(self, video_id: str) -> bool:
         """
@@ -43,11 +474,10 @@ class CacheManager:
         Returns:
             True if all components are cached
         """
-        required = ["transcripts", "summaries", "keypoints", "quizzes"]
-        return all(
-            self._get_cache_path(video_id, content_type).exists()
-            for content_type in required
-        )
+        if self.memory and self.memory.get(video_id) is not None:
+            return True
+        
+        return self.get_cached_data(video_id) is not None
     
     def get_cached_data(self, video_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -59,87 +489,234 @@ class CacheManager:
         Returns:
             Dictionary with transcript, summary, key_points, quiz or None
         """
-        if not self.is_cached(video_id):
-            return None
+        data = self.get_cached_components(video_id)
+        complete = len(data) == len(COMPONENTS)
         
-        try:
-            data = {}
-            
-            # Load transcript
-            with open(self._get_cache_path(video_id, "transcripts"), 'r', encoding='utf-8') as f:
-                data['transcript'] = json.load(f)['content']
-            
-            # Load summary
-            with open(self._get_cache_path(video_id, "summaries"), 'r', encoding='utf-8') as f:
-                data['summary'] = json.load(f)['content']
-            
-            # Load key points
-            with open(self._get_cache_path(video_id, "keypoints"), 'r', encoding='utf-8') as f:
-                data['key_points'] = json.load(f)['content']
-            
-            # Load quiz
-            with open(self._get_cache_path(video_id, "quizzes"), 'r', encoding='utf-8') as f:
-                data['quiz'] = json.load(f)['content']
+        # Counted in memory and written with the next database transaction
+        with self._lock:
+            self._pending["hits" if complete else "misses"] += 1
+            if complete:
+                self._last_access = time.time()
+        
+        return data if complete else None
+    
+    def get_cached_components(self, video_id: str) -> Dict[str, Any]:
+        """
+        Retrieve whichever components are cached for a video
+        
+        Lets an interrupted run (e.g. quota exhausted after the summary) resume
+        by generating only what is missing. Generated components are found by
+        transcript content, so a mirror of an already processed video gets them
+        as soon as its transcript is cached.
+        
+        Args:
+            video_id: YouTube video ID
             
-            return data
+        Returns:
+            Dictionary with the available transcript, summary, key_points and
+            quiz entries (empty if nothing is cached)
+        """
+        if self.memory:
+            data = self.memory.get(video_id)
+            if data is not None:
+                self._record_memory_hit(video_id)
+                return data
         
+        try:
+            data = self._read_video(video_id)
+            # Only complete entries are promoted to the memory tier
+            if self.memory and len(data) == len(COMPONENTS):
+                self.memory.put(video_id, data)
+            return data
+            
         except Exception as e:
             print(f"Error loading cached data: {e}")
+            return {}
+    
+    def _record_memory_hit(self, video_id: str):
+        """Note a memory-tier read; written with the next transaction, or batched every ACCESS_FLUSH_SECONDS"""
+        with self._lock:
+            self._pending_access[video_id] = time.time()
+            if time.monotonic() - self._accesses_flushed_at < ACCESS_FLUSH_SECONDS:
+                return
+            try:
+                with self._conn:
+                    self._flush_counters()
+            except sqlite3.Error as e:
+                print(f"Error recording cache access: {e}")
+    
+    def get_segments(self, video_id: str) -> Optional[List[Dict]]:
+        """
+        Caption segments stored with a video's transcript
+        
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            Segments ({"text", "start", "duration"}) or None if none were cached
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT segments FROM videos WHERE video_id = ?", (video_id,)
+                ).fetchone()
+            return _decode(row[0]) if row and row[0] else None
+        except Exception as e:
+            print(f"Error loading cached segments: {e}")
             return None
     
-    def save_to_cache(self, video_id: str, transcript: str = None, 
-                     summary: str = None, key_points: str = None, 
-                     quiz: Dict = None) -> bool:
+    def save_to_cache(self, video_id: str, transcript: str = None,
+                     summary: str = None, key_points: str = None,
+                     quiz: Dict = None, analysis: Any = None,
+                     segments: Optional[List[Dict]] = None) -> bool:
         """
         Save processed data to cache
         
         Args:
             video_id: YouTube video ID
             transcript: Video transcript
+            segments: Caption segments of the transcript (stored only with it)
             summary: Generated summary
             key_points: Extracted key points
             quiz: Generated quiz data
+            analysis: AnalysisResult from AIService.analyze; fills in any
+                      component not passed explicitly
             
         Returns:
-            True if saved successfully
+            True if saved successfully (generated components need the video's
+            transcript to be cached first)
         """
         try:
-            timestamp = datetime.now().isoformat()
+            if analysis is not None:
+                summary = summary or analysis.summary
+                key_points = key_points or analysis.key_points
+                quiz = quiz or analysis.quiz
             
-            # Save transcript
-            if transcript:
-                self._save_component(video_id, "transcripts", transcript, timestamp)
+            timestamp = datetime.now().isoformat()
+            components = {
+                "transcript": transcript,
+                "summary": summary,
+                "key_points": key_points,
+                "quiz": quiz,
+            }
             
-            # Save summary
-            if summary:
-                self._save_component(video_id, "summaries", summary, timestamp)
+            # All components are written in one transaction
+            with self._lock, self._conn:
+                saved = self._write(video_id, {**components, "segments": segments}, timestamp)
+                self._flush_counters()
             
-            # Save key points
-            if key_points:
-                self._save_component(video_id, "keypoints", key_points, timestamp)
+            if not saved:
+                print(f"Not caching generated content for {video_id}: transcript is not cached")
+                return False
             
-            # Save quiz
-            if quiz:
-                self._save_component(video_id, "quizzes", quiz, timestamp)
+            if self.memory:
+                if transcript:
+                    # A new transcript may map to different generated content
+                    self.memory.invalidate(video_id)
+                else:
+                    # Write-through (only entries already resident)
+                    self.memory.update(
+                        video_id, {name: value for name, value in components.items() if value}
+                    )
             
+            self._evict()
             return True
-        
+            
         except Exception as e:
             print(f"Error saving to cache: {e}")
             return False
     
-    def _save_component(self, video_id: str, content_type: str, 
-                       content: Any, timestamp: str):
-        """Save a single component to cache"""
-        cache_data = {
-            "video_id": video_id,
-            "content": content,
-            "cached_at": timestamp
-        }
+    def _evict(self):
+        """
+        Incrementally enforce component TTLs and the size budget
+        
+        Each call expires at most one batch of stale entries per component and
+        evicts at most MAX_EVICTION_BATCHES batches of least recently accessed
+        transcripts and generated components, using indexes instead of scanning
+        the whole cache.
+        """
+        video_ids: Set[str] = set()
+        hashes: Set[str] = set()
+        with self._lock, self._conn:
+            for name, cutoff in self._expiry_cutoffs().items():
+                if name == "transcript":
+                    rows = self._conn.execute(
+                        "SELECT video_id, content_hash FROM videos WHERE transcript_at < ? LIMIT ?",
+                        (cutoff, EVICTION_BATCH)
+                    ).fetchall()
+                    self._delete([("videos", video_id, digest) for video_id, digest in rows], video_ids, hashes)
+                else:
+                    rows = self._conn.execute(
+                        "SELECT rowid, content_hash FROM artifacts "
+                        "WHERE component = ? AND created_at < ? LIMIT ?",
+                        (name, cutoff, EVICTION_BATCH)
+                    ).fetchall()
+                    self._delete([("artifacts", rowid, digest) for rowid, digest in rows], video_ids, hashes)
+            
+            for _ in range(MAX_EVICTION_BATCHES):
+                excess = self._total_bytes() - self.max_bytes
+                if excess <= 0:
+                    break
+                candidates = sorted(
+                    self._conn.execute(
+                        "SELECT last_access, 'videos', video_id, content_hash, "
+                        "length(transcript) + COALESCE(length(segments), 0) "
+                        "FROM videos ORDER BY last_access LIMIT ?", (EVICTION_BATCH,)
+                    ).fetchall()
+                    + self._conn.execute(
+                        "SELECT last_access, 'artifacts', rowid, content_hash, length(value) "
+                        "FROM artifacts ORDER BY last_access LIMIT ?", (EVICTION_BATCH,)
+                    ).fetchall()
+                )
+                if not candidates:
+                    break
+                
+                # Oldest entries first, only as many as needed to get under budget
+                victims = []
+                for _, table, key, digest, size in candidates:
+                    victims.append((table, key, digest))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._delete(victims, video_ids, hashes)
+            
+            if hashes:
+                # Videos whose transcripts point at removed generated content
+                placeholders = ", ".join("?" for _ in hashes)
+                video_ids.update(row[0] for row in self._conn.execute(
+                    f"SELECT video_id FROM videos WHERE content_hash IN ({placeholders})", list(hashes)
+                ))
         
-        path = self._get_cache_path(video_id, content_type)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2, ensure_ascii=False)
+        if video_ids or hashes:
+            print(f"🧹 Cache cleanup: {len(video_ids)} videos expired or evicted")
+            with self._lock:
+                self._conn.execute("PRAGMA incremental_vacuum").fetchall()
+            if self.memory:
+                for video_id in video_ids:
+                    self.memory.invalidate(video_id)
+    
+    def _delete(self, victims: List[Tuple[str, Any, str]], video_ids: Set[str], hashes: Set[str]):
+        """
+        Delete transcripts and generated components (caller holds the lock and transaction)
+        
+        Args:
+            victims: (table, video_id or artifact rowid, content hash) triples
+            video_ids: Collects video IDs whose transcript was removed
+            hashes: Collects content hashes whose generated components were removed
+        """
+        for table, key, digest in victims:
+            if table == "videos":
+                self._conn.execute("DELETE FROM videos WHERE video_id = ?", (key,))
+                video_ids.add(key)
+            else:
+                self._conn.execute("DELETE FROM artifacts WHERE rowid = ?", (key,))
+                hashes.add(digest)
+    
+    def _total_bytes(self) -> int:
+        """Compressed payload bytes currently stored (caller holds the lock)"""
+        return self._conn.execute(
+            "SELECT value FROM cache_meta WHERE key = 'total_bytes'"
+        ).fetchone()[0]
     
     def clear_cache(self, video_id: Optional[str] = None):
         """
@@ -148,31 +725,47 @@ class CacheManager:
         Args:
             video_id: Specific video ID to clear, or None to clear all
         """
-        if video_id:
-            # Clear specific video
-            for content_type in ["transcripts", "summaries", "keypoints", "quizzes"]:
-                path = self._get_cache_path(video_id, content_type)
-                if path.exists():
-                    path.unlink()
-        else:
-            # Clear all cache
-            import shutil
-            if self.cache_dir.exists():
-                shutil.rmtree(self.cache_dir)
-                self.cache_dir.mkdir(exist_ok=True)
+        with self._lock, self._conn:
+            if video_id:
+                # Clear specific video, and its generated content unless another video shares it
+                row = self._conn.execute(
+                    "SELECT content_hash FROM videos WHERE video_id = ?", (video_id,)
+                ).fetchone()
+                self._conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+                if row:
+                    self._conn.execute(
+                        "DELETE FROM artifacts WHERE content_hash = ? AND NOT EXISTS "
+                        "(SELECT 1 FROM videos WHERE content_hash = ?)",
+                        (row[0], row[0])
+                    )
+            else:
+                # Clear all cache
+                self._conn.execute("DELETE FROM videos")
+                self._conn.execute("DELETE FROM artifacts")
+        
+        if self.memory:
+            self.memory.invalidate(video_id)
     
-    def get_cache_stats(self) -> Dict[str, int]:
+    def get_cache_stats(self) -> Dict[str, Any]:
         """
-        Get cache statistics
+        Get cache statistics from the manifest (constant time)
         
         Returns:
             Dictionary with cache stats
         """
+        with self._lock:
+            manifest = dict(self._conn.execute("SELECT key, value FROM cache_meta"))
+            hits = manifest["hits"] + self._pending["hits"]
+            misses = manifest["misses"] + self._pending["misses"]
+            last_access = max(manifest["last_access"], self._last_access)
+        
         stats = {
-            "total_videos": len(list((self.cache_dir / "transcripts").glob("*.json"))),
-            "transcripts": len(list((self.cache_dir / "transcripts").glob("*.json"))),
-            "summaries": len(list((self.cache_dir / "summaries").glob("*.json"))),
-            "keypoints": len(list((self.cache_dir / "keypoints").glob("*.json"))),
-            "quizzes": len(list((self.cache_dir / "quizzes").glob("*.json")))
+            "total_videos": manifest["transcripts"],
+            **{counter: manifest[counter] for counter in COMPONENTS.values()},
+            "total_bytes": manifest["total_bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "last_access": datetime.fromtimestamp(last_access).isoformat() if last_access else None
         }
         return stats
@@ -0,0 +1,316 @@
+"""
+Job Queue
+Durable SQLite queue of video processing jobs, shared by the Streamlit app
+(which enqueues and polls) and worker processes (which claim and run them),
+so work survives reruns, closed tabs and app restarts
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+ACTIVE = (QUEUED, RUNNING)
+
+# A running job whose worker has not reported for this long is considered abandoned
+DEFAULT_STALE_SECONDS = 120
+
+
+@dataclass
+class Job:
+    """One video processing job"""
+    id: str
+    video_id: str
+    status: str
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    attempts: int = 0
+    worker: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    partial: Dict[str, str] = field(default_factory=dict)   # stage -> text streamed so far
+    
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+
+class JobQueue:
+    """Cross-process job queue with atomic claiming and stale-job recovery"""
+    
+    def __init__(self, db_path: str = "cache/jobs.db", stale_after: float = DEFAULT_STALE_SECONDS,
+                 max_attempts: int = 3):
+        """
+        Initialize job queue
+        
+        Args:
+            db_path: SQLite database shared by the app and the workers
+            stale_after: Seconds without a heartbeat after which a running job is requeued
+            max_attempts: Claims after which an abandoned job is failed instead of requeued
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True)
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    events TEXT NOT NULL DEFAULT '[]',
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    partial TEXT NOT NULL DEFAULT '{}'
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_video ON jobs (video_id, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    heartbeat REAL NOT NULL
+                )
+            """)
+    
+    _COLUMNS = "id, video_id, status, events, error, attempts, worker, created_at, updated_at, partial"
+    
+    @staticmethod
+    def _job(row) -> Job:
+        job_id, video_id, status, events, error, attempts, worker, created_at, updated_at, partial = row
+        return Job(job_id, video_id, status, json.loads(events), error, attempts, worker,
+                   created_at, updated_at, json.loads(partial))
+    
+    def enqueue(self, video_id: str) -> Job:
+        """
+        Queue a video, unless it already has a queued or running job
+        
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            The new job, or the video's active one
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE video_id = ? AND status IN (?, ?) "
+                f"ORDER BY created_at DESC LIMIT 1",
+                (video_id, *ACTIVE)
+            ).fetchone()
+            if row:
+                return self._job(row)
+            
+            job = Job(uuid.uuid4().hex, video_id, QUEUED, created_at=now, updated_at=now)
+            self._conn.execute(
+                "INSERT INTO jobs (id, video_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job.id, video_id, QUEUED, now, now)
+            )
+        print(f"📥 Queued job {job.id[:8]} for {video_id}")
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """Read a job by ID"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+    
+    def latest(self, video_id: str) -> Optional[Job]:
+        """Most recent job of a video, in any state"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE video_id = ? ORDER BY created_at DESC LIMIT 1",
+                (video_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+    
+    def latest_many(self, video_ids: List[str]) -> Dict[str, Job]:
+        """
+        Most recent job of each video, in one read (e.g. for a playlist)
+        
+        Args:
+            video_ids: YouTube video IDs
+            
+        Returns:
+            Video ID -> latest job, for the videos that have one
+        """
+        if not video_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in video_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE video_id IN ({placeholders}) ORDER BY created_at",
+                list(video_ids)
+            ).fetchall()
+        # Later jobs overwrite earlier ones
+        return {job.video_id: job for job in map(self._job, rows)}
+    
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Atomically take the oldest queued job
+        
+        Running jobs whose worker stopped heartbeating are requeued first (or
+        failed, after max_attempts claims).
+        
+        Args:
+            worker: ID of the claiming worker
+            
+        Returns:
+            The claimed job (now running), or None if the queue is empty
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            # Take the write lock up front, so two workers never claim the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._recover_stale(now)
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (QUEUED,)
+            ).fetchone()
+            if not row:
+                return None
+            
+            job = self._job(row)
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now, job.id)
+            )
+        job.status, job.worker, job.attempts, job.updated_at = RUNNING, worker, job.attempts + 1, now
+        return job
+    
+    def _recover_stale(self, now: float):
+        """Requeue (or fail) running jobs abandoned by a crashed or killed worker"""
+        cutoff = now - self.stale_after
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, error = 'Worker stopped responding', partial = '{}', "
+            "updated_at = ? "
+            "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+            (FAILED, now, RUNNING, cutoff, self.max_attempts)
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, partial = '{}', updated_at = ? "
+            "WHERE status = ? AND updated_at < ?",
+            (QUEUED, now, RUNNING, cutoff)
+        )
+    
+    def add_event(self, job_id: str, event: Dict[str, Any]):
+        """
+        Append a progress event to a running job (also refreshes its heartbeat)
+        
+        Args:
+            job_id: Job ID
+            event: JSON-serializable event, e.g. {"stage": "summary", "status": "completed"}
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET events = json_insert(events, '$[#]', json(?)), updated_at = ? WHERE id = ?",
+                (json.dumps(event), time.time(), job_id)
+            )
+    
+    def set_partial(self, job_id: str, stage: str, text: Optional[str]):
+        """
+        Record the text a stage has streamed so far (also refreshes the heartbeat)
+        
+        Args:
+            job_id: Job ID
+            stage: Stage being streamed, e.g. "summary"
+            text: Text so far, or None to clear it once the stage has finished
+        """
+        path = f"$.{stage}"
+        with self._lock, self._conn:
+            if text is None:
+                self._conn.execute(
+                    "UPDATE jobs SET partial = json_remove(partial, ?), updated_at = ? WHERE id = ?",
+                    (path, time.time(), job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET partial = json_set(partial, ?, ?), updated_at = ? WHERE id = ?",
+                    (path, text, time.time(), job_id)
+                )
+    
+    def touch(self, job_id: str):
+        """Heartbeat for a running job, so it is not taken for abandoned"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+    
+    def finish(self, job_id: str, error: Optional[str] = None):
+        """
+        Mark a job done, or failed if an error is given
+        
+        Args:
+            job_id: Job ID
+            error: Failure reason, if any
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, partial = '{}', updated_at = ? WHERE id = ?",
+                (FAILED if error else DONE, error, time.time(), job_id)
+            )
+    
+    def requeue(self, job_id: str):
+        """Put a running job back in the queue (e.g. on worker shutdown)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, attempts = MAX(attempts - 1, 0), partial = '{}', "
+                "updated_at = ? WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, RUNNING)
+            )
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+    
+    def heartbeat(self, worker: str):
+        """Record that a worker process is alive"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO workers (id, heartbeat) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (worker, time.time())
+            )
+    
+    def unregister(self, worker: str):
+        """Remove a worker that is shutting down"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM workers WHERE id = ?", (worker,))
+    
+    def live_workers(self) -> int:
+        """Number of workers that heartbeated recently"""
+        cutoff = time.time() - self.stale_after
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (cutoff,)
+            ).fetchone()[0]
+    
+    def prune(self, keep_days: int = 7):
+        """Delete finished jobs and dead workers older than `keep_days` days"""
+        cutoff = time.time() - keep_days * 86400
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            )
+            self._conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
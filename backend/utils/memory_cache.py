@@ -0,0 +1,136 @@
+"""
+In-Memory LRU Cache
+Process-wide, byte-bounded tier in front of the disk cache so hot videos
+are served without touching the filesystem on every Streamlit rerun
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate the memory footprint of cached data by its UTF-8 JSON size
+    
+    Args:
+        value: JSON-serializable data
+        
+    Returns:
+        Size in bytes
+    """
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+class MemoryLRU:
+    """Thread-safe LRU cache bounded by total size in bytes"""
+    
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize memory cache
+        
+        Args:
+            max_bytes: Total size budget; least recently used entries are evicted beyond it
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an entry and mark it most recently used
+        
+        Args:
+            key: Cache key (video ID)
+            
+        Returns:
+            Copy of the cached dictionary or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+    
+    def put(self, key: str, value: Dict[str, Any]):
+        """
+        Store an entry, evicting least recently used ones to stay within budget
+        
+        Args:
+            key: Cache key (video ID)
+            value: Dictionary to cache
+        """
+        size = estimate_size(value)
+        with self._lock:
+            self._store(key, dict(value), size)
+    
+    def update(self, key: str, changes: Dict[str, Any]):
+        """
+        Write-through: merge changed fields into an entry if it is resident
+        
+        Args:
+            key: Cache key (video ID)
+            changes: Fields to overwrite
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                merged = {**entry[0], **changes}
+                self._store(key, merged, estimate_size(merged))
+    
+    def invalidate(self, key: Optional[str] = None):
+        """
+        Drop one entry, or everything
+        
+        Args:
+            key: Cache key to drop, or None to clear the whole tier
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.current_bytes = 0
+            else:
+                self._remove(key)
+    
+    def _store(self, key: str, value: Dict[str, Any], size: int):
+        """Insert an entry and evict down to budget (caller holds the lock)"""
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+    
+    def _remove(self, key: str):
+        """Remove an entry (caller holds the lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get memory tier statistics
+        
+        Returns:
+            Dictionary with entry count, bytes used/budget and hit/miss counts
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,372 @@
+"""
+Per-Key Rate Limiter
+A token bucket for requests-per-minute and a daily allowance (reset at the
+quota day boundary) on every API key, with backoff learned from 429 responses
+"""
+
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Free tier limits per model tier; add entries (or call set_limits) for other models
+MODEL_LIMITS = {
+    "gemini-2.5-flash": {"rpm": 5, "rpd": 20},
+    "gemini-2.5-flash-lite": {"rpm": 10, "rpd": 20},
+}
+
+# Backoff applied to a key after a 429 without a server-provided retry delay
+MIN_BACKOFF_SECONDS = 15.0
+MAX_BACKOFF_SECONDS = 300.0
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception is a 429 / quota error"""
+    message = str(error).lower()
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in message
+        or "quota" in message
+        or "rate limit" in message
+    )
+
+
+SERVER_ERROR_CODES = (500, 502, 503, 504)
+
+
+def quota_day() -> str:
+    """Date the daily quota is counted against (shared with UsageStore)"""
+    return datetime.now().date().isoformat()
+
+
+def seconds_until_next_quota_day() -> float:
+    """Seconds until quota_day() changes"""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max((midnight - now).total_seconds(), 0.0)
+
+
+def is_server_error(error: Exception) -> bool:
+    """Check whether an exception is a transient 5xx / unavailable error"""
+    # google.api_core exceptions carry the HTTP status as .code, HTTP clients as .status_code
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    message = str(error).lower()
+    return (
+        type(error).__name__ in ("InternalServerError", "ServiceUnavailable", "DeadlineExceeded",
+                                 "BadGateway", "GatewayTimeout")
+        or code in SERVER_ERROR_CODES
+        # api_core messages lead with the status, e.g. "503 The model is overloaded"
+        or re.match(r"\s*(500|502|503|504)\b", message) is not None
+        or "unavailable" in message
+        or "overloaded" in message
+        or "internal error" in message
+    )
+
+
+def parse_retry_delay(error: Exception) -> Optional[float]:
+    """Extract the server-suggested retry delay (e.g. 'retry in 13.5s') from an error"""
+    match = re.search(r"retry (?:in|after) ([\d.]+)\s*s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled evenly over `period` seconds"""
+    
+    def __init__(self, capacity: int, period: float):
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self, now: float):
+        """Take one token (call only when wait_time() is 0)"""
+        self._refill(now)
+        self.tokens -= 1
+
+
+class DailyAllowance:
+    """
+    `capacity` requests per quota day, restored in full when quota_day() changes
+    
+    Same interface as TokenBucket; `now` is ignored since the day comes from the wall clock.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.day = quota_day()
+    
+    def _refill(self):
+        today = quota_day()
+        if today != self.day:
+            self.day = today
+            self.tokens = self.capacity
+    
+    def wait_time(self, now: float) -> float:
+        """Seconds until one request is allowed (the next quota day if used up)"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return seconds_until_next_quota_day()
+    
+    def consume(self, now: float):
+        """Take one request (call only when wait_time() is 0)"""
+        self._refill()
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Per-key, per-model RPM/RPD limits shared by every caller in the process"""
+    
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 max_wait: float = 120.0):
+        """
+        Initialize rate limiter
+        
+        Args:
+            limits: Model name -> {"rpm": ..., "rpd": ...}; defaults to MODEL_LIMITS
+            max_wait: Longest acquire() will block before reporting the key unavailable
+        """
+        self.limits = {model: dict(l) for model, l in (limits or MODEL_LIMITS).items()}
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Dict[str, TokenBucket]] = {}
+        self._backoff: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._key_limits: Dict[Tuple[str, str], Dict[str, int]] = {}
+    
+    def set_limits(self, model: str, rpm: int, rpd: int):
+        """
+        Configure limits for a model tier (applies to buckets created afterwards)
+        
+        Args:
+            model: Model name
+            rpm: Requests per minute per key
+            rpd: Requests per day per key
+        """
+        with self._lock:
+            self.limits[model] = {"rpm": rpm, "rpd": rpd}
+            for bucket_key in [k for k in self._buckets if k[1] == model]:
+                del self._buckets[bucket_key]
+    
+    def set_key_limits(self, key: str, model: str, rpm: int, rpd: int):
+        """
+        Override the model tier's limits for one key (e.g. a paid-tier key)
+        
+        Args:
+            key: API key
+            model: Model name
+            rpm: Requests per minute for this key
+            rpd: Requests per day for this key
+        """
+        limits = {"rpm": rpm, "rpd": rpd}
+        with self._lock:
+            if self._key_limits.get((key, model)) == limits:
+                return
+            self._key_limits[(key, model)] = limits
+            self._buckets.pop((key, model), None)
+    
+    def limits_for(self, key: str, model: str = DEFAULT_MODEL) -> Dict[str, int]:
+        """
+        Effective limits of a key on a model
+        
+        Returns:
+            {"rpm": ..., "rpd": ...}
+        """
+        with self._lock:
+            return dict(self._limits_locked(key, model))
+    
+    def _limits_locked(self, key: str, model: str) -> Dict[str, int]:
+        return (
+            self._key_limits.get((key, model))
+            or self.limits.get(model)
+            or self.limits[DEFAULT_MODEL]
+        )
+    
+    def _get_buckets(self, key: str, model: str) -> Dict[str, TokenBucket]:
+        """Get (or lazily create) the buckets for a key/model pair - caller holds the lock"""
+        buckets = self._buckets.get((key, model))
+        if buckets is None:
+            limits = self._limits_locked(key, model)
+            buckets = {
+                "rpm": TokenBucket(limits["rpm"], 60.0),
+                "rpd": DailyAllowance(limits["rpd"]),
+            }
+            self._buckets[(key, model)] = buckets
+        return buckets
+    
+    def seed_usage(self, key: str, requests_today: int, model: str = DEFAULT_MODEL):
+        """
+        Start a key's daily bucket from persisted usage (only the first time it is seen)
+        
+        Args:
+            key: API key
+            requests_today: Requests already made with this key today
+            model: Model name
+        """
+        with self._lock:
+            if (key, model) in self._buckets:
+                return
+            buckets = self._get_buckets(key, model)
+            buckets["rpd"].tokens = max(0.0, buckets["rpd"].capacity - requests_today)
+    
+    def _wait_time_locked(self, key: str, model: str, now: float) -> float:
+        buckets = self._get_buckets(key, model)
+        backoff = self._backoff.get((key, model))
+        backoff_wait = max(0.0, backoff["until"] - now) if backoff else 0.0
+        return max(
+            backoff_wait,
+            buckets["rpm"].wait_time(now),
+            buckets["rpd"].wait_time(now)
+        )
+    
+    def wait_time(self, key: str, model: str = DEFAULT_MODEL) -> float:
+        """
+        Seconds this key must wait before its next request
+        
+        Args:
+            key: API key
+            model: Model name
+            
+        Returns:
+            0.0 if a request can be sent right now
+        """
+        with self._lock:
+            return self._wait_time_locked(key, model, time.monotonic())
+    
+    def try_acquire(self, key: str, model: str = DEFAULT_MODEL) -> float:
+        """
+        Take a request slot if one is free
+        
+        Args:
+            key: API key
+            model: Model name
+            
+        Returns:
+            0.0 if the slot was taken, otherwise the seconds to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._wait_time_locked(key, model, now)
+            if wait == 0.0:
+                buckets = self._get_buckets(key, model)
+                buckets["rpm"].consume(now)
+                buckets["rpd"].consume(now)
+            return wait
+    
+    def acquire(self, key: str, model: str = DEFAULT_MODEL,
+                max_wait: Optional[float] = None) -> bool:
+        """
+        Block until this key may send a request
+        
+        Args:
+            key: API key
+            model: Model name
+            max_wait: Override for the longest acceptable wait
+            
+        Returns:
+            True once a slot is taken, False if the key needs longer than max_wait
+        """
+        limit = self.max_wait if max_wait is None else max_wait
+        while True:
+            wait = self.try_acquire(key, model)
+            if wait == 0.0:
+                return True
+            if wait > limit:
+                return False
+            time.sleep(wait)
+    
+    async def acquire_async(self, key: str, model: str = DEFAULT_MODEL,
+                            max_wait: Optional[float] = None) -> bool:
+        """Async variant of acquire() - sleeps without blocking the event loop"""
+        limit = self.max_wait if max_wait is None else max_wait
+        while True:
+            wait = self.try_acquire(key, model)
+            if wait == 0.0:
+                return True
+            if wait > limit:
+                return False
+            await asyncio.sleep(wait)
+    
+    def report_rate_limited(self, key: str, model: str = DEFAULT_MODEL,
+                            retry_after: Optional[float] = None):
+        """
+        Back off a key after a 429 response
+        
+        Uses the server's retry delay when given, otherwise doubles the previous
+        backoff (starting at MIN_BACKOFF_SECONDS, capped at MAX_BACKOFF_SECONDS).
+        
+        Args:
+            key: API key that was rejected
+            model: Model name
+            retry_after: Server-suggested delay in seconds, if known
+        """
+        with self._lock:
+            previous = self._backoff.get((key, model), {}).get("penalty", 0.0)
+            if retry_after is not None:
+                penalty = retry_after
+            else:
+                penalty = min(max(previous * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+            self._backoff[(key, model)] = {
+                "penalty": penalty,
+                "until": time.monotonic() + penalty
+            }
+    
+    def report_success(self, key: str, model: str = DEFAULT_MODEL):
+        """Clear any backoff on a key after a successful request"""
+        with self._lock:
+            self._backoff.pop((key, model), None)
+    
+    def exhaust(self, key: str, model: str = DEFAULT_MODEL):
+        """Empty a key's daily bucket after the server reports its daily quota used up"""
+        with self._lock:
+            rpd = self._get_buckets(key, model)["rpd"]
+            rpd._refill()
+            rpd.tokens = 0.0
+    
+    def exhausted_today(self, key: str, model: str = DEFAULT_MODEL) -> bool:
+        """True if a key has no daily requests left until the next quota day"""
+        with self._lock:
+            rpd = self._get_buckets(key, model)["rpd"]
+            rpd._refill()
+            return rpd.tokens < 1
+    
+    def penalty(self, key: str, model: str = DEFAULT_MODEL) -> float:
+        """Current backoff penalty of a key in seconds (0 for a healthy key)"""
+        with self._lock:
+            return self._backoff.get((key, model), {}).get("penalty", 0.0)
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter() -> RateLimiter:
+    """Process-wide limiter, so buckets survive Streamlit reruns and new rotators"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
@@ -0,0 +1,79 @@
+"""
+Retry Policy
+Classifies Gemini errors and computes exponential backoff with jitter, so
+AIService can retry transient failures and fail over to another API key
+"""
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.utils.rate_limiter import is_rate_limit_error, is_server_error
+
+
+# Error classes, from the caller's point of view
+QUOTA = "quota"             # the key's daily quota is used up - switch keys
+RATE = "rate"               # per-minute limit hit - switch keys or back off
+TRANSIENT = "transient"     # 5xx, timeout, dropped connection - back off and retry
+FATAL = "fatal"             # bad request, invalid key, blocked prompt - give up
+
+_TRANSIENT_TYPES = (TimeoutError, ConnectionError)
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify a Gemini API error
+    
+    Args:
+        error: Exception raised by a request
+        
+    Returns:
+        QUOTA, RATE, TRANSIENT or FATAL
+    """
+    message = str(error).lower()
+    if is_rate_limit_error(error):
+        # Gemini names the exhausted quota, e.g. GenerateRequestsPerDayPerProjectPerModel
+        if "perday" in message or "per day" in message or "daily" in message:
+            return QUOTA
+        return RATE
+    
+    if (
+        is_server_error(error)
+        or isinstance(error, _TRANSIENT_TYPES)
+        or "timed out" in message
+        or "timeout" in message
+        or "connection reset" in message
+        or "connection aborted" in message
+    ):
+        return TRANSIENT
+    
+    return FATAL
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and an overall deadline"""
+    max_attempts: int = 4
+    base_delay: float = 1.0         # first backoff ceiling in seconds, doubled per attempt
+    max_delay: float = 30.0
+    deadline: float = 120.0         # total seconds a call may spend, waits included
+    
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before the next attempt
+        
+        Args:
+            attempt: Zero-based number of the attempt that just failed
+            retry_after: Server-suggested delay, if any (used as the floor)
+            
+        Returns:
+            Randomized delay, so concurrent callers do not retry in lockstep
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    
+    def remaining(self, started: float) -> float:
+        """Seconds left before the deadline of a call started at `started` (time.monotonic())"""
+        return max(0.0, self.deadline - (time.monotonic() - started))
@@ -0,0 +1,174 @@
+"""
+Single-Flight
+Coalesces concurrent computations of the same result (e.g. one video's
+transcript or summary). Within a process, later callers await the in-flight
+call; across processes, a SQLite lease lets one process compute while the
+others wait for the result to appear in the shared cache
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+# A lease not renewed for this long is taken over (its holder crashed or was killed)
+DEFAULT_LEASE_SECONDS = 60
+
+# Marker handed to in-process waiters when the leader was cancelled: compute again
+_RETRY = object()
+
+
+class SingleFlight:
+    """Per-key deduplication of in-flight async computations"""
+    
+    def __init__(self, db_path: Optional[str] = "cache/inflight.db",
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 1.0):
+        """
+        Initialize single-flight group
+        
+        Args:
+            db_path: SQLite database for cross-process leases (None: this process only)
+            lease_seconds: Lease lifetime; the holder renews it while computing
+            poll_interval: Seconds between checks while another process computes
+        """
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        
+        self._conn = None
+        if db_path:
+            Path(db_path).parent.mkdir(exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._lock, self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS leases (
+                        key TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+    
+    async def do(self, key: str, compute: Callable[[], Awaitable[Any]],
+                 lookup: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Compute a result once for all concurrent callers with the same key
+        
+        Args:
+            key: Identity of the result, e.g. "<video_id>:summary"
+            compute: Coroutine factory producing the result (should also store it
+                     where `lookup` finds it)
+            lookup: Reads a stored result (None if absent); enables waiting on
+                    other processes, which can only share results through storage
+            
+        Returns:
+            The result computed by this call, or by the call it joined
+        """
+        while True:
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = concurrent.futures.Future()
+            
+            if not leader:
+                # Thread-safe future: the leader may be running on another event loop
+                print(f"⏳ Joining in-flight {key}")
+                value = await asyncio.wrap_future(future)
+                if value is _RETRY:
+                    continue
+                return value
+            
+            try:
+                value = await self._lead(key, compute, lookup)
+            except asyncio.CancelledError:
+                future.set_result(_RETRY)
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(value)
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+    
+    async def _lead(self, key: str, compute: Callable[[], Awaitable[Any]],
+                    lookup: Optional[Callable[[], Any]]) -> Any:
+        """Compute as this process's leader, first waiting out another process's lease"""
+        if not self._conn or not lookup:
+            return await compute()
+        
+        waited = False
+        while not self._try_lease(key):
+            if not waited:
+                print(f"⏳ Waiting for another process computing {key}")
+                waited = True
+            value = lookup()
+            if value is not None:
+                return value
+            await asyncio.sleep(self.poll_interval)
+        
+        try:
+            # The previous holder may have finished just before we got the lease
+            value = lookup() if waited else None
+            if value is not None:
+                return value
+            
+            renewal = asyncio.create_task(self._renew(key))
+            try:
+                return await compute()
+            finally:
+                renewal.cancel()
+        finally:
+            self._release(key)
+    
+    def _try_lease(self, key: str) -> bool:
+        """Take the key's lease if it is free or expired"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ?",
+                (key, self.owner, now + self.lease_seconds, now)
+            )
+            return cursor.rowcount == 1
+    
+    async def _renew(self, key: str):
+        """Extend the lease while the computation runs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                    (time.time() + self.lease_seconds, key, self.owner)
+                )
+    
+    def _release(self, key: str):
+        """Give up the key's lease"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+
+_shared_groups: Dict[str, SingleFlight] = {}
+_shared_lock = threading.Lock()
+
+
+def get_single_flight(db_path: str = "cache/inflight.db") -> SingleFlight:
+    """Process-wide group per lease database, so every pipeline in the process shares it"""
+    with _shared_lock:
+        group = _shared_groups.get(db_path)
+        if group is None:
+            group = SingleFlight(db_path)
+            _shared_groups[db_path] = group
+        return group
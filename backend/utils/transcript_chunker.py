@@ -0,0 +1,185 @@
+"""
+Transcript Chunker
+Splits long transcripts into token-bounded chunks at caption segment or
+sentence boundaries, for map-reduce summarization
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+
+# Rough average for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+# Transcripts above this size are chunked; below it they are sent whole
+DEFAULT_THRESHOLD_TOKENS = 24000
+
+# Target size of each chunk
+DEFAULT_CHUNK_TOKENS = 8000
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+@dataclass
+class TranscriptChunk:
+    """A contiguous slice of the transcript"""
+    index: int
+    text: str
+    tokens: int
+    start: Optional[float] = None   # seconds, when built from caption segments
+    end: Optional[float] = None
+    
+    @property
+    def label(self) -> str:
+        """Human-readable position, e.g. 'Part 2 (10:05-20:11)'"""
+        label = f"Part {self.index + 1}"
+        if self.start is not None and self.end is not None:
+            label += f" ({format_timestamp(self.start)}-{format_timestamp(self.end)})"
+        return label
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as m:ss or h:mm:ss"""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+class TranscriptChunker:
+    """Token-aware transcript splitter"""
+    
+    def __init__(self, threshold_tokens: int = DEFAULT_THRESHOLD_TOKENS,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS):
+        """
+        Initialize chunker
+        
+        Args:
+            threshold_tokens: Transcripts estimated above this are chunked
+            chunk_tokens: Target estimated tokens per chunk
+        """
+        self.threshold_tokens = threshold_tokens
+        self.chunk_tokens = chunk_tokens
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Estimate the token count of a text without calling the API
+        
+        Args:
+            text: Any text
+            
+        Returns:
+            Estimated number of tokens
+        """
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    
+    def needs_chunking(self, transcript: str) -> bool:
+        """Check whether a transcript is long enough to go through map-reduce"""
+        return self.estimate_tokens(transcript) > self.threshold_tokens
+    
+    def chunk(self, transcript: str, segments: Optional[List[Dict]] = None) -> List[TranscriptChunk]:
+        """
+        Split a transcript into chunks
+        
+        Uses caption segments when available so chunk boundaries follow caption
+        timing, otherwise splits the plain text at sentence boundaries.
+        
+        Args:
+            transcript: Full transcript text
+            segments: Caption segments ({"text", "start", "duration"}) from TranscriptService
+            
+        Returns:
+            List of chunks (a single chunk for short transcripts)
+        """
+        if segments:
+            return self.chunk_segments(segments)
+        return self.chunk_text(transcript)
+    
+    def chunk_segments(self, segments: List[Dict]) -> List[TranscriptChunk]:
+        """
+        Group caption segments into chunks of about chunk_tokens each
+        
+        Args:
+            segments: Caption segments with "text", "start" and "duration"
+            
+        Returns:
+            List of timed chunks
+        """
+        chunks = []
+        texts, tokens, start, end = [], 0, None, None
+        
+        for segment in segments:
+            text = segment["text"].strip()
+            if not text:
+                continue
+            segment_tokens = self.estimate_tokens(text) + 1
+            
+            if texts and tokens + segment_tokens > self.chunk_tokens:
+                chunks.append(TranscriptChunk(len(chunks), " ".join(texts), tokens, start, end))
+                texts, tokens, start = [], 0, None
+            
+            if start is None:
+                start = segment.get("start")
+            end = segment.get("start", 0) + segment.get("duration", 0)
+            texts.append(text)
+            tokens += segment_tokens
+        
+        if texts:
+            chunks.append(TranscriptChunk(len(chunks), " ".join(texts), tokens, start, end))
+        return chunks
+    
+    def _sentences(self, transcript: str) -> Iterator[str]:
+        """
+        Sentences of a text, with any longer than chunk_tokens cut at word boundaries
+        
+        Unpunctuated auto-captions would otherwise come out as one huge sentence.
+        """
+        for sentence in _SENTENCE_END.split(transcript.strip()):
+            if not sentence:
+                continue
+            if self.estimate_tokens(sentence) <= self.chunk_tokens:
+                yield sentence
+                continue
+            
+            words, tokens = [], 0
+            for word in sentence.split():
+                word_tokens = self.estimate_tokens(word) + 1
+                if words and tokens + word_tokens > self.chunk_tokens:
+                    yield " ".join(words)
+                    words, tokens = [], 0
+                words.append(word)
+                tokens += word_tokens
+            if words:
+                yield " ".join(words)
+    
+    def chunk_text(self, transcript: str) -> List[TranscriptChunk]:
+        """
+        Split plain text into chunks of about chunk_tokens each at sentence
+        boundaries (word boundaries inside sentences longer than a chunk)
+        
+        Args:
+            transcript: Transcript text (e.g. from audio transcription)
+            
+        Returns:
+            List of untimed chunks
+        """
+        chunks = []
+        sentences, tokens = [], 0
+        
+        for sentence in self._sentences(transcript):
+            sentence_tokens = self.estimate_tokens(sentence) + 1
+            
+            if sentences and tokens + sentence_tokens > self.chunk_tokens:
+                chunks.append(TranscriptChunk(len(chunks), " ".join(sentences), tokens))
+                sentences, tokens = [], 0
+            
+            sentences.append(sentence)
+            tokens += sentence_tokens
+        
+        if sentences:
+            chunks.append(TranscriptChunk(len(chunks), " ".join(sentences), tokens))
+        return chunks
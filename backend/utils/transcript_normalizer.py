@@ -0,0 +1,124 @@
+"""
+Transcript Normalizer
+Cleans caption transcripts before prompting: removes rolling-caption
+overlap, non-speech markers and whitespace noise (and optionally fillers)
+so fewer input tokens are billed
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from backend.utils.transcript_chunker import TranscriptChunker
+
+
+# [Music], [Applause], (laughs), ♪ ... ♪ and similar non-speech annotations
+_NON_SPEECH = re.compile(r'\[[^\]]*\]|\((?:music|applause|laughter|laughs|inaudible|silence)[^)]*\)|[♪♫]+',
+                         re.IGNORECASE)
+_FILLERS = re.compile(r'\b(?:u+m+|u+h+|e+r+m+|u+h+m+|h+m+|m+h+m+)\b,?\s*', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+# Rolling-caption overlap (in words) looked for between consecutive segments;
+# single-word repeats ("no, no") are left alone
+MIN_OVERLAP_WORDS = 2
+MAX_OVERLAP_WORDS = 30
+
+
+@dataclass
+class NormalizationResult:
+    """Cleaned transcript plus before/after size report"""
+    text: str
+    segments: Optional[List[Dict]] = None
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+class TranscriptNormalizer:
+    """Streaming clean-up stages between TranscriptService and AIService"""
+    
+    def __init__(self, drop_fillers: bool = False):
+        """
+        Initialize normalizer
+        
+        Args:
+            drop_fillers: Also remove filler words such as "um" and "uh"
+        """
+        self.drop_fillers = drop_fillers
+    
+    def clean_text(self, text: str) -> str:
+        """
+        Strip non-speech markers, optional fillers and extra whitespace from a text
+        
+        Args:
+            text: Raw caption or transcript text
+            
+        Returns:
+            Cleaned text
+        """
+        text = _NON_SPEECH.sub(" ", text)
+        if self.drop_fillers:
+            text = _FILLERS.sub("", text)
+        return _WHITESPACE.sub(" ", text).strip()
+    
+    def _clean_segments(self, segments: Iterable[Dict]) -> Iterator[Dict]:
+        """Stage 1: clean each segment's text, dropping segments left empty"""
+        for segment in segments:
+            text = self.clean_text(segment.get("text", ""))
+            if text:
+                yield {**segment, "text": text}
+    
+    @staticmethod
+    def _dedupe_segments(segments: Iterable[Dict]) -> Iterator[Dict]:
+        """Stage 2: remove words repeated from the previous segment (rolling captions)"""
+        previous_words: List[str] = []
+        for segment in segments:
+            words = segment["text"].split()
+            lowered = [w.lower() for w in words]
+            
+            overlap = 0
+            for size in range(min(len(previous_words), len(words), MAX_OVERLAP_WORDS), MIN_OVERLAP_WORDS - 1, -1):
+                if previous_words[-size:] == lowered[:size]:
+                    overlap = size
+                    break
+            
+            remaining = words[overlap:]
+            if remaining:
+                previous_words = (previous_words + lowered[overlap:])[-MAX_OVERLAP_WORDS:]
+                yield {**segment, "text": " ".join(remaining)}
+    
+    def normalize_segments(self, segments: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Stream cleaned, de-duplicated caption segments
+        
+        Args:
+            segments: Caption segments ({"text", "start", "duration"})
+            
+        Returns:
+            Iterator of cleaned segments (timing preserved)
+        """
+        return self._dedupe_segments(self._clean_segments(segments))
+    
+    def normalize(self, transcript: str, segments: Optional[List[Dict]] = None) -> NormalizationResult:
+        """
+        Normalize a transcript, using its caption segments when available
+        
+        Args:
+            transcript: Transcript text from TranscriptService
+            segments: Caption segments from TranscriptService, if captions were used
+            
+        Returns:
+            NormalizationResult with text, segments and before/after stats
+        """
+        if segments:
+            cleaned_segments = list(self.normalize_segments(segments))
+            text = " ".join(segment["text"] for segment in cleaned_segments)
+        else:
+            cleaned_segments = None
+            text = self.clean_text(transcript)
+        
+        stats = {
+            "chars_before": len(transcript),
+            "chars_after": len(text),
+            "tokens_before": TranscriptChunker.estimate_tokens(transcript),
+            "tokens_after": TranscriptChunker.estimate_tokens(text),
+        }
+        return NormalizationResult(text=text, segments=cleaned_segments, stats=stats)
@@ -41,6 +41,61 @@ class URLUtils:
             print(f"Error extracting video ID: {str(e)}")
             return None
     
+    @staticmethod
+    def is_collection_url(url: str) -> bool:
+        """
+        Check if URL points to a playlist or channel rather than a single video
+        
+        Args:
+            url: YouTube URL
+            
+        Returns:
+            True for playlist and channel URLs (a watch URL inside a playlist is a video)
+        """
+        try:
+            parsed_url = urlparse(url)
+            if "youtube.com" not in parsed_url.netloc:
+                return False
+            if parsed_url.path == "/playlist":
+                # Format: https://www.youtube.com/playlist?list=PLAYLIST_ID
+                return "list" in parse_qs(parsed_url.query)
+            # Formats: /@handle, /channel/ID, /c/NAME, /user/NAME (optionally with a tab)
+            return parsed_url.path.startswith(("/@", "/channel/", "/c/", "/user/"))
+        except Exception:
+            return False
+    
+    @staticmethod
+    def normalize_collection_url(url: str) -> Optional[str]:
+        """
+        Canonical URL of a playlist or channel, used as its metadata cache key
+        
+        Channels are expanded through their uploads tab ("videos"), unless the URL
+        names the streams or shorts tab.
+        
+        Args:
+            url: Playlist or channel URL
+            
+        Returns:
+            Normalized URL or None if it names no playlist or channel
+        """
+        try:
+            parsed_url = urlparse(url)
+            if parsed_url.path == "/playlist":
+                playlist_id = parse_qs(parsed_url.query)["list"][0]
+                return f"https://www.youtube.com/playlist?list={playlist_id}"
+            
+            parts = [part for part in parsed_url.path.split("/") if part]
+            name_length = 1 if parts[0].startswith("@") else 2
+            if len(parts) < name_length:
+                # e.g. /channel or /c without the channel name
+                return None
+            channel, tabs = parts[:name_length], parts[name_length:]
+            tab = tabs[0] if tabs and tabs[0] in ("videos", "streams", "shorts") else "videos"
+            return "https://www.youtube.com/" + "/".join(channel + [tab])
+        except Exception as e:
+            print(f"Error normalizing playlist URL: {str(e)}")
+            return None
+    
     @staticmethod
     def is_valid_youtube_url(url: str) -> bool:
         """
@@ -0,0 +1,218 @@
+"""
+API Usage Store
+SQLite-backed per-key request counters shared by every process using the
+same cache directory (e.g. several Streamlit workers)
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from backend.utils.rate_limiter import DEFAULT_MODEL, quota_day
+
+
+def key_id(key: str) -> str:
+    """Stable identifier for an API key, so the raw key is never written to disk"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+class UsageStore:
+    """Atomic per-key, per-model, per-day request counters"""
+    
+    def __init__(self, db_path: str = "cache/api_usage.db"):
+        """
+        Initialize usage store
+        
+        Args:
+            db_path: SQLite database shared by all processes
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            # One row per key, model and day, so a new day starts from zero without
+            # a reset write and each model's quota is counted separately
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS model_usage (
+                    key_id TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (key_id, model, day)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS total_usage (
+                    key_id TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+    
+    @staticmethod
+    def _today() -> str:
+        return quota_day()
+    
+    def import_json(self, usage_file: Path):
+        """
+        One-shot import of the legacy api_usage.json, which is removed afterwards
+        
+        Args:
+            usage_file: Path of the old JSON usage file
+        """
+        if not usage_file.exists():
+            return
+        
+        try:
+            with open(usage_file, 'r') as f:
+                usage_data = json.load(f)
+        except Exception as e:
+            print(f"Skipping unreadable usage file {usage_file}: {e}")
+            return
+        
+        today = self._today()
+        with self._lock, self._conn:
+            for key, usage in usage_data.items():
+                if usage.get("last_reset") == today:
+                    self._conn.execute(
+                        "INSERT INTO model_usage (key_id, model, day, requests) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key_id, model, day) DO UPDATE SET requests = MAX(requests, excluded.requests)",
+                        (key_id(key), DEFAULT_MODEL, today, usage.get("requests_today", 0))
+                    )
+                self._conn.execute(
+                    "INSERT INTO total_usage (key_id, requests) VALUES (?, ?) "
+                    "ON CONFLICT(key_id) DO UPDATE SET requests = MAX(requests, excluded.requests)",
+                    (key_id(key), usage.get("total_requests", 0))
+                )
+        usage_file.unlink(missing_ok=True)
+        print(f"✅ Migrated API usage from {usage_file} to {self.db_path}")
+    
+    def increment(self, key: str, count: int = 1, model: str = DEFAULT_MODEL):
+        """
+        Add requests to a key's counters in one atomic transaction
+        
+        Args:
+            key: API key that was used
+            count: Number of requests made
+            model: Model the requests went to
+        """
+        kid = key_id(key)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO model_usage (key_id, model, day, requests) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key_id, model, day) DO UPDATE SET requests = requests + excluded.requests",
+                (kid, model, self._today(), count)
+            )
+            self._conn.execute(
+                "INSERT INTO total_usage (key_id, requests) VALUES (?, ?) "
+                "ON CONFLICT(key_id) DO UPDATE SET requests = requests + excluded.requests",
+                (kid, count)
+            )
+    
+    def mark_exhausted(self, key: str, limit: int, model: str = DEFAULT_MODEL):
+        """
+        Record that the server reported a key's daily quota used up
+        
+        Raises today's count to the limit (never lowers it), so every process
+        sharing the store skips the key until the next quota day.
+        
+        Args:
+            key: API key that was rejected
+            limit: The key's daily request limit on this model
+            model: Model the request went to
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO model_usage (key_id, model, day, requests) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key_id, model, day) DO UPDATE SET requests = MAX(requests, excluded.requests)",
+                (key_id(key), model, self._today(), limit)
+            )
+    
+    def requests_today(self, keys: Iterable[str], model: Optional[str] = None) -> Dict[str, int]:
+        """
+        Read today's request counts (read-only)
+        
+        Args:
+            keys: API keys to look up
+            model: Count only this model's requests (None: all models)
+            
+        Returns:
+            API key -> requests made today by all processes
+        """
+        ids = {key_id(key): key for key in keys}
+        counts = dict.fromkeys(ids.values(), 0)
+        if not ids:
+            return counts
+        
+        placeholders = ", ".join("?" for _ in ids)
+        query = (
+            f"SELECT key_id, SUM(requests) FROM model_usage "
+            f"WHERE day = ? AND key_id IN ({placeholders})"
+        )
+        params = [self._today(), *ids]
+        if model is not None:
+            query += " AND model = ?"
+            params.append(model)
+        with self._lock:
+            rows = self._conn.execute(query + " GROUP BY key_id", params).fetchall()
+        for kid, requests in rows:
+            counts[ids[kid]] = requests
+        return counts
+    
+    def usage(self, keys: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Read today's and all-time request counts (read-only)
+        
+        Args:
+            keys: API keys to look up
+            
+        Returns:
+            API key -> {"requests_today": ..., "total_requests": ...}
+        """
+        keys = list(keys)
+        today = self.requests_today(keys)
+        ids = {key_id(key): key for key in keys}
+        totals = dict.fromkeys(keys, 0)
+        if ids:
+            placeholders = ", ".join("?" for _ in ids)
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key_id, requests FROM total_usage WHERE key_id IN ({placeholders})",
+                    tuple(ids)
+                ).fetchall()
+            for kid, requests in rows:
+                totals[ids[kid]] = requests
+        
+        return {
+            key: {"requests_today": today[key], "total_requests": totals[key]}
+            for key in keys
+        }
+    
+    def prune(self, keep_days: int = 7):
+        """Delete daily rows older than `keep_days` days"""
+        cutoff = datetime.fromordinal(datetime.now().toordinal() - keep_days).date().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM model_usage WHERE day < ?", (cutoff,))
+
+
+_shared_stores: Dict[str, UsageStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_usage_store(db_path: str = "cache/api_usage.db") -> UsageStore:
+    """Process-wide store per database, so Streamlit reruns reuse one connection"""
+    with _shared_lock:
+        store = _shared_stores.get(db_path)
+        if store is None:
+            store = UsageStore(db_path)
+            store.import_json(Path(db_path).with_suffix(".json"))
+            store.prune()
+            _shared_stores[db_path] = store
+        return store
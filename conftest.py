@@ -0,0 +1,36 @@
+"""
+Shared pytest fixtures
+
+The test_*.py scripts below call the live Gemini API and are run by hand;
+pytest only collects the offline tests.
+"""
+
+import pytest
+
+from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.rate_limiter import RateLimiter
+from backend.utils.usage_store import UsageStore
+
+
+collect_ignore = ["test_ai_service.py", "test_api.py", "test_gemini_transcript.py", "test_speed.py"]
+
+TEST_KEYS = ["AIzaTestKeyOne-00000000000000000000000", "AIzaTestKeyTwo-00000000000000000000000"]
+
+
+@pytest.fixture
+def rotator(tmp_path, monkeypatch):
+    """APIKeyRotator over two fake keys, with its own limiter and usage store"""
+    for name in ("GOOGLE_API_KEY", "GOOGLE_API_KEY_2", "GEMINI_KEYS_FILE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", TEST_KEYS[0])
+    monkeypatch.setenv("GOOGLE_API_KEY_2", TEST_KEYS[1])
+    return APIKeyRotator(rate_limiter=RateLimiter(), usage_store=UsageStore(str(tmp_path / "usage.db")))
+
+
+@pytest.fixture
+def daily_quota_error():
+    """The 429 Gemini returns once a key's daily quota is used up"""
+    return Exception(
+        "429 Quota exceeded for metric: generativelanguage.googleapis.com/"
+        "generate_content_free_tier_requests, limit: 20 per day"
+    )
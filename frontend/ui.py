@@ -5,8 +5,10 @@ ULTIMATE FREE MODE: Cache + Multi-Key Rotation + Caption-First + Smart Delays
 """
 
 import streamlit as st
+import subprocess
 import sys
 import os
+import threading
 import time
 from dotenv import load_dotenv
 
@@ -16,12 +18,16 @@ load_dotenv()
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from backend.services.transcript_service import TranscriptService
 from backend.services.ai_service import AIService
+from backend.services.context_cache import GeminiContextCache
+from backend.services.pipeline import STAGES
+from backend.services.playlist_service import PlaylistService
 from backend.utils.url_utils import URLUtils
 from backend.utils.file_utils import FileUtils
-from backend.utils.cache_manager import CacheManager
+from backend.utils.cache_manager import CacheManager, COMPONENTS, DEFAULT_TTL
+from backend.utils.memory_cache import MemoryLRU
 from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.job_queue import JobQueue, DONE, FAILED, QUEUED, RUNNING
 
 
 # Configure page - minimal layout
@@ -40,12 +46,259 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Section headings and progress messages for pipeline stages
+SECTION_TITLES = {
+    "summary": "📝 Summary",
+    "key_points": "🎯 Key Learning Points",
+    "quiz": "📊 Quiz",
+}
+
+STAGE_MESSAGES = {
+    "transcript": "📥 Extracting transcript...",
+    "map": "🧩 Long video - condensing transcript sections in parallel...",
+    "analysis": "🤖 Generating summary, key points and quiz...",
+    "summary": "🤖 Generating AI summary...",
+    "key_points": "🎯 Extracting key points...",
+    "quiz": "📊 Creating quiz...",
+}
+
+
+@st.cache_resource
+def get_cache_manager() -> CacheManager:
+    """Process-wide cache shared by all sessions, with a 64 MB in-memory LRU tier"""
+    return CacheManager(
+        memory=MemoryLRU(max_bytes=64 * 1024 * 1024),
+        max_bytes=int(os.getenv("CACHE_MAX_MB", "500")) * 1024 * 1024,
+        ttl=DEFAULT_TTL,
+        versions=AIService.artifact_versions()
+    )
+
+
+@st.cache_resource
+def get_context_cache():
+    """Process-wide Gemini context cache, if GEMINI_CONTEXT_CACHE is enabled"""
+    if os.getenv("GEMINI_CONTEXT_CACHE", "").lower() in ("1", "true", "yes"):
+        return GeminiContextCache()
+    return None
+
+
+# Seconds between status polls while a background job runs
+JOB_POLL_SECONDS = 1.5
+
+# Seconds to wait for a launched worker to report in before launching another
+WORKER_START_GRACE = 30
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Process-wide handle on the job queue shared with the worker processes"""
+    return JobQueue()
+
+
+@st.cache_resource
+def _worker_launcher() -> dict:
+    """Launch bookkeeping shared by all sessions of this app process"""
+    return {"lock": threading.Lock(), "launched_at": 0.0}
+
+
+def ensure_worker(jobs: JobQueue):
+    """
+    Start a detached background worker (worker.py) if none is running
+    
+    Set JOB_WORKER_AUTOSTART=0 when workers are run as a separate service.
+    
+    Args:
+        jobs: Job queue the workers heartbeat into
+    """
+    if os.getenv("JOB_WORKER_AUTOSTART", "1").lower() in ("0", "false", "no"):
+        return
+    if jobs.live_workers():
+        return
+    
+    launcher = _worker_launcher()
+    with launcher["lock"]:
+        if time.time() - launcher["launched_at"] < WORKER_START_GRACE:
+            return
+        launcher["launched_at"] = time.time()
+        
+        worker_script = os.path.join(os.path.dirname(__file__), "..", "worker.py")
+        log_file = open(jobs.db_path.parent / "worker.log", "a")
+        # Own session, so the worker outlives app restarts and keeps running jobs
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(worker_script)],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+        log_file.close()
+        print("👷 Started background worker")
+
+
+def job_event_message(event: dict):
+    """Progress line for a recorded job event (None if it has none)"""
+    stage, state = event["stage"], event["status"]
+    if state == "cached":
+        # Left over from an earlier, interrupted run - no API call needed
+        if stage == "transcript":
+            return f"♻️ Transcript loaded from cache ({event.get('words', 0)} words)"
+        return f"♻️ {SECTION_TITLES[stage]} loaded from cache"
+    if state == "started":
+        return STAGE_MESSAGES.get(stage)
+    if state == "failed":
+        return f"⚠️ {event['error']}"
+    if stage == "transcript":
+        return f"✅ Transcript extracted ({event.get('words', 0)} words)"
+    if stage == "normalize":
+        stats = event["detail"]
+        return (f"🧹 Cleaned transcript: {stats['chars_before']:,} → {stats['chars_after']:,} characters "
+                f"(~{stats['tokens_before']:,} → {stats['tokens_after']:,} tokens)")
+    if stage == "map":
+        return f"✅ Condensed {event['detail']} sections ({event['elapsed']:.1f}s)"
+    if stage == "analysis":
+        return f"✅ Analysis ready ({event['elapsed']:.1f}s)"
+    return f"✅ {SECTION_TITLES[stage]} ready ({event['elapsed']:.1f}s)"
+
+
+def show_job_progress(job, components: dict):
+    """
+    Render a background job's progress and, while it runs, the sections cached so far
+    
+    Args:
+        job: Job from the queue
+        components: Components cached for the video so far
+    """
+    if job.status == QUEUED:
+        label, state = "⏳ Waiting for a worker...", "running"
+    elif job.active:
+        label, state = "🔍 Analyzing video...", "running"
+    elif job.status == DONE:
+        label, state = "✅ Analysis complete!", "complete"
+    else:
+        label, state = "❌ Failed", "error"
+    
+    status = st.status(label, expanded=job.active, state=state)
+    for event in job.events:
+        message = job_event_message(event)
+        if message:
+            status.write(message)
+    
+    if job.active:
+        for stage in STAGES:
+            value = components.get(stage)
+            if stage == "quiz" and value:
+                st.info(f"📊 Quiz ready ({len(value)} questions)")
+            elif value:
+                st.markdown(f"### {SECTION_TITLES[stage]}\n\n{value}")
+            elif job.partial.get(stage):
+                # Text the worker has streamed so far
+                st.markdown(f"### {SECTION_TITLES[stage]}\n\n{job.partial[stage]} ▌")
+        st.caption("💡 You can close this tab - processing continues in the background.")
+
+
+def retry_button(jobs: JobQueue, video_id: str):
+    """Offer to queue a failed video again"""
+    if st.button("🔄 Try again"):
+        jobs.enqueue(video_id)
+        st.rerun()
+
+
+@st.cache_resource
+def get_playlist_service() -> PlaylistService:
+    """Process-wide playlist expander with its metadata cache"""
+    return PlaylistService()
+
+
+JOB_ICONS = {
+    QUEUED: "⏳",
+    RUNNING: "🔄",
+    DONE: "✅",
+    FAILED: "❌",
+}
+
+
+def process_playlist(url: str, cache: CacheManager, key_rotator: APIKeyRotator):
+    """
+    Expand a playlist or channel, optionally queue all its videos for the
+    background workers, and let the user pick one to study
+    
+    Args:
+        url: Playlist or channel URL
+        cache: Cache manager
+        key_rotator: API key rotator
+        
+    Returns:
+        Watch URL of the selected video, or None
+    """
+    with st.spinner("📚 Loading playlist..."):
+        playlist = get_playlist_service().expand(url)
+    if not playlist or not playlist.entries:
+        st.error("❌ Could not load this playlist or channel.")
+        return None
+    
+    titles = {entry.video_id: entry.title or entry.video_id for entry in playlist.entries}
+    
+    # Cache reads record access times, so completeness is checked once per
+    # playlist and session; job states (a single read) are polled instead
+    checked = st.session_state.setdefault("playlist_cached", {})
+    if playlist.url not in checked:
+        checked[playlist.url] = {
+            video_id for video_id in titles
+            if len(cache.get_cached_components(video_id)) == len(COMPONENTS)
+        }
+    cached = checked[playlist.url]
+    
+    jobs = get_job_queue()
+    latest = jobs.latest_many(list(titles))
+    done = cached | {video_id for video_id, job in latest.items() if job.status == DONE}
+    active = [video_id for video_id, job in latest.items() if job.active and video_id not in cached]
+    remaining = [video_id for video_id in titles if video_id not in done and video_id not in active]
+    
+    st.markdown(f"### 📚 {playlist.title}")
+    st.caption(f"{len(titles)} videos · {playlist.total_duration / 3600:.1f} h · "
+               f"{len(done)} already processed")
+    
+    if remaining and st.button(f"⚡ Process all {len(remaining)} remaining videos"):
+        if not key_rotator.has_available_quota():
+            st.error("All API keys exhausted for today. Please add more keys or wait until tomorrow.")
+        else:
+            for video_id in remaining:
+                jobs.enqueue(video_id)
+            ensure_worker(jobs)
+            st.rerun()
+    
+    if active:
+        ensure_worker(jobs)
+        st.progress(len(done) / len(titles))
+        with st.status(f"🔍 Processing {len(active)} videos in the background...", expanded=True):
+            for video_id in titles:
+                job = latest.get(video_id)
+                if job and video_id not in cached:
+                    line = f"{JOB_ICONS[job.status]} {titles[video_id]}"
+                    st.write(line + (f" - {job.error}" if job.status == FAILED else ""))
+        if not key_rotator.has_available_quota():
+            st.warning("⚠️ API quota exhausted - queued videos will be processed when it resets.")
+        st.caption("💡 You can close this tab - processing continues in the background.")
+    
+    video_id = st.selectbox(
+        "Choose a video to study",
+        [None] + list(titles),
+        format_func=lambda video_id: "Select a video..." if video_id is None else titles[video_id]
+    )
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    
+    if active:
+        # Poll until the queued videos are done
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    return None
+
 
 def main():
     """Main application function - ChatGPT style interface"""
     
     # Initialize cache and key rotator
-    cache = CacheManager()
+    cache = get_cache_manager()
     
     try:
         key_rotator = APIKeyRotator()
@@ -55,16 +308,16 @@ def main():
                 "```\n"
                 "GOOGLE_API_KEY=your_key_1\n"
                 "GOOGLE_API_KEY_2=your_key_2  # Optional\n"
-                "GOOGLE_API_KEY_3=your_key_3  # Optional\n"
+                "GOOGLE_API_KEY_3=your_key_3  # Optional, add _4, _5, ... as needed\n"
                 "```")
         st.stop()
     
     # Load API key from rotator
-    api_key = key_rotator.get_current_key()
+    api_key = key_rotator.get_next_key()
     
     if not api_key:
         st.error("⚠️ All API keys exhausted for today")
-        st.info("💡 **Free tier limits reached (20 requests/day per key)**\n\n"
+        st.info("💡 **Daily request limits reached on every key**\n\n"
                 "Options:\n"
                 "- Wait until tomorrow for quota reset\n"
                 "- Add more API keys to .env file\n"
@@ -74,7 +327,7 @@ def main():
         stats = key_rotator.get_stats()
         st.markdown("### 📊 API Usage Stats")
         for key_info in stats['keys']:
-            st.write(f"**Key {key_info['key_number']}**: {key_info['requests_today']}/20 used today "
+            st.write(f"**Key {key_info['key_number']}**: {key_info['requests_today']}/{key_info['daily_limit']} used today "
                     f"(Remaining: {key_info['remaining_today']})")
         
         cache_stats = cache.get_cache_stats()
@@ -93,14 +346,17 @@ def main():
         for key_info in stats['keys']:
             remaining = key_info['remaining_today']
             used = key_info['requests_today']
-            progress = used / 20
-            st.write(f"**Key {key_info['key_number']}**: {used}/20 requests used")
+            progress = min(used / key_info['daily_limit'], 1.0)
+            health = "" if key_info['healthy'] else " (cooling down)"
+            st.write(f"**Key {key_info['key_number']}**: {used}/{key_info['daily_limit']} requests used{health}")
             st.progress(progress)
         
         cache_stats = cache.get_cache_stats()
         st.markdown("#### Cache Status")
         st.write(f"📦 **Cached videos**: {cache_stats['total_videos']}")
-        st.write(f"✅ **Cache saves**: ~{cache_stats['total_videos'] * 4} API calls saved!")
+        st.write(f"✅ **Cache hits**: {cache_stats['hits']} (misses: {cache_stats['misses']})")
+        st.write(f"💾 **Cache size**: {cache_stats['total_bytes'] / (1024 * 1024):.1f} / "
+                 f"{cache_stats['max_bytes'] / (1024 * 1024):.0f} MB")
     
     # Single input - ChatGPT style
     video_url = st.text_input(
@@ -117,6 +373,12 @@ def main():
             st.error("❌ Invalid YouTube URL. Please check and try again.")
             st.stop()
         
+        # Playlists and channels: expand them, then study one video at a time
+        if URLUtils.is_collection_url(video_url):
+            video_url = process_playlist(video_url, cache, key_rotator)
+            if not video_url:
+                st.stop()
+        
         # Extract video ID
         video_id = URLUtils.extract_video_id(video_url)
         if not video_id:
@@ -138,87 +400,51 @@ def main():
             quiz_data = cached_data['quiz']
         
         else:
-            # Processing with status updates
-            with st.status("🔍 Analyzing video...", expanded=True) as status:
-                
-                # Step 1: Check if we have available quota
+            # Processing runs in a background worker, so reruns, refreshes and
+            # closed tabs do not abort it; this script only enqueues and polls
+            jobs = get_job_queue()
+            job = jobs.latest(video_id)
+            
+            if job is None or job.status == DONE:
+                # Never processed, or processed but no longer fully cached (evicted)
                 if not key_rotator.has_available_quota():
-                    status.update(label="❌ Quota Exhausted", state="error")
                     st.error("All API keys exhausted for today. Please add more keys or wait until tomorrow.")
                     st.stop()
-                
-                # Step 2: Get transcript (caption-first, no API call if available)
-                st.write("📥 Extracting transcript...")
-                transcript_service = TranscriptService(api_key)
-                transcript, _ = transcript_service.get_transcript(video_id)
-                
-                if not transcript:
-                    status.update(label="❌ Failed", state="error")
-                    st.error("Could not extract transcript from this video.")
-                    st.info("💡 **Possible reasons:**\n"
-                           "- Video may be age-restricted or private\n"
-                           "- Audio download blocked (YouTube bot protection)\n"
-                           "- API quota exceeded (free tier: 20 requests/day)\n"
-                           "- Network connectivity issue\n\n"
-                           "**✅ Best Solution:** Use videos with captions enabled\n"
-                           "- Khan Academy, TED Talks, Coursera work perfectly!\n"
-                           "- Captions = FREE + FAST (no API calls for transcription)\n\n"
-                           "**⚠️ Note:** Audio transcription may not work on Streamlit Cloud due to YouTube's bot protection. "
-                           "For videos without captions, consider running the app locally.")
-                    st.stop()
-                
-                st.write(f"✅ Transcript extracted ({len(transcript.split())} words)")
-                
-                # Save transcript to cache
-                cache.save_to_cache(video_id, transcript=transcript)
-                
-                # Step 3: Generate AI content with key rotation
-                st.write("🤖 Generating AI summary...")
-                
-                # Get fresh key for each request
-                current_key = key_rotator.get_next_key()
-                if not current_key:
-                    status.update(label="❌ Quota Exhausted", state="error")
-                    st.error("API quota exhausted. Please wait until tomorrow.")
-                    st.stop()
-                
-                ai_service = AIService(current_key)
-                summary = ai_service.generate_summary(transcript)
-                key_rotator.record_request(current_key)
-                cache.save_to_cache(video_id, summary=summary)
-                
-                time.sleep(13)  # Wait 13 seconds (5 requests/min = 12s between requests + buffer)
-                
-                st.write("🎯 Extracting key points...")
-                
-                # Rotate to next key
-                current_key = key_rotator.get_next_key()
-                if not current_key:
-                    st.warning("⚠️ Quota exhausted. Saving partial results to cache.")
-                    key_points = None
-                    quiz_data = None
-                else:
-                    ai_service.update_api_key(current_key)
-                    key_points = ai_service.extract_key_points(transcript)
-                    key_rotator.record_request(current_key)
-                    cache.save_to_cache(video_id, key_points=key_points)
-                    
-                    time.sleep(13)  # Wait before quiz generation
-                    
-                    st.write("📊 Creating quiz...")
-                    
-                    # Rotate to next key
-                    current_key = key_rotator.get_next_key()
-                    if not current_key:
-                        st.warning("⚠️ Quota exhausted. Saving partial results to cache.")
-                        quiz_data = None
-                    else:
-                        ai_service.update_api_key(current_key)
-                        quiz_data = ai_service.generate_quiz(transcript)
-                        key_rotator.record_request(current_key)
-                        cache.save_to_cache(video_id, quiz=quiz_data)
-                
-                status.update(label="✅ Analysis complete!", state="complete")
+                job = jobs.enqueue(video_id)
+            
+            ensure_worker(jobs)
+            components = cache.get_cached_components(video_id)
+            show_job_progress(job, components)
+            
+            if job.active:
+                # Poll until the worker finishes; partial results appear as they land
+                time.sleep(JOB_POLL_SECONDS)
+                st.rerun()
+            
+            transcript = components.get("transcript")
+            
+            if not transcript:
+                st.error("Could not extract transcript from this video.")
+                st.info("💡 **Possible reasons:**\n"
+                       "- Video may be age-restricted or private\n"
+                       "- Audio download blocked (YouTube bot protection)\n"
+                       "- API quota exceeded (daily request limit on every key)\n"
+                       "- Network connectivity issue\n\n"
+                       "**✅ Best Solution:** Use videos with captions enabled\n"
+                       "- Khan Academy, TED Talks, Coursera work perfectly!\n"
+                       "- Captions = FREE + FAST (no API calls for transcription)\n\n"
+                       "**⚠️ Note:** Audio transcription may not work on Streamlit Cloud due to YouTube's bot protection. "
+                       "For videos without captions, consider running the app locally.")
+                retry_button(jobs, video_id)
+                st.stop()
+            
+            if job.status == FAILED:
+                st.warning(f"⚠️ {job.error}. Showing partial results.")
+                retry_button(jobs, video_id)
+            
+            summary = components.get("summary")
+            key_points = components.get("key_points")
+            quiz_data = components.get("quiz")
         
         # Display results - ChatGPT style streaming appearance
         st.markdown("---")
@@ -0,0 +1,24 @@
+"""
+YouTube Learning Assistant - Batch Ingestion Entry Point
+Pre-processes a file of YouTube URLs or video IDs into the cache
+
+Usage:
+    python ingest.py videos.txt --workers 3
+"""
+
+import sys
+import os
+
+from dotenv import load_dotenv
+
+# Add project root to path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# Load environment variables (API keys, CACHE_MAX_MB, ...)
+load_dotenv()
+
+from backend.services.batch_ingest import main
+
+if __name__ == "__main__":
+    sys.exit(main())
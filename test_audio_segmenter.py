@@ -0,0 +1,74 @@
+"""
+Offline tests for audio segment boundaries and transcript stitching
+"""
+
+from backend.utils.audio_segmenter import AudioClip, AudioSegmenter
+
+
+def clip(index: int, start: float, end: float) -> AudioClip:
+    return AudioClip(index=index, start=start, end=end, data=b"")
+
+
+def test_boundaries_overlap_and_fold_short_remainder():
+    segmenter = AudioSegmenter(segment_seconds=600, overlap_seconds=15)
+    
+    assert segmenter.boundaries(1500) == [(0.0, 600.0), (585.0, 1185.0), (1170.0, 1500)]
+    # 10 s past the second segment is shorter than the overlap: no third segment
+    assert segmenter.boundaries(1195) == [(0.0, 600.0), (585.0, 1195)]
+    assert not segmenter.needs_segmenting(610)
+    assert segmenter.needs_segmenting(620)
+
+
+def test_stitch_trims_words_repeated_across_the_cut():
+    first, second = clip(0, 0.0, 600.0), clip(1, 585.0, 1185.0)
+    results = [
+        # Given out of order: stitching follows the segment index
+        (second, [
+            {"start": 3.0, "text": "into sugar molecules inside the stroma"},
+            {"start": 10.0, "text": "molecules inside the stroma and then"},
+            {"start": 20.0, "text": "next we look at respiration"},
+        ]),
+        (first, [
+            {"start": 0.0, "text": "welcome to biology"},
+            {"start": 580.0, "text": "the calvin cycle fixes carbon"},
+            {"start": 590.0, "text": "into sugar molecules inside the stroma"},
+        ]),
+    ]
+    
+    segments = AudioSegmenter.stitch(results)
+    
+    assert [s["text"] for s in segments] == [
+        "welcome to biology",
+        "the calvin cycle fixes carbon",
+        "into sugar molecules inside the stroma",
+        "and then",
+        "next we look at respiration",
+    ]
+    assert [s["start"] for s in segments] == [0.0, 580.0, 590.0, 595.0, 605.0]
+    # Each segment lasts until the next one starts; the last until the audio ends
+    assert [s["duration"] for s in segments] == [580.0, 10.0, 5.0, 10.0, 580.0]
+
+
+def test_stitch_keeps_short_genuine_repeats():
+    first, second = clip(0, 0.0, 600.0), clip(1, 585.0, 1185.0)
+    results = [
+        (first, [{"start": 590.0, "text": "light goes in and the"}]),
+        (second, [{"start": 10.0, "text": "and the oxygen comes out"}]),
+    ]
+    
+    texts = [s["text"] for s in AudioSegmenter.stitch(results)]
+    
+    assert texts == ["light goes in and the", "and the oxygen comes out"]
+
+
+def test_stitch_drops_passages_outside_the_segment_share():
+    first, second = clip(0, 0.0, 600.0), clip(1, 585.0, 1185.0)
+    results = [
+        # Past the overlap midpoint (592.5 s): the second segment covers it
+        (first, [{"start": 100.0, "text": "early point"}, {"start": 598.0, "text": "cut off mid wor"}]),
+        (second, [{"start": 13.0, "text": "the full sentence is heard here"}]),
+    ]
+    
+    texts = [s["text"] for s in AudioSegmenter.stitch(results)]
+    
+    assert texts == ["early point", "the full sentence is heard here"]
@@ -0,0 +1,41 @@
+"""
+Offline tests for BatchIngestor's quota handling
+"""
+
+import asyncio
+
+from backend.services.batch_ingest import BatchIngestor, Checkpoint, EXIT_QUOTA
+from backend.utils.cache_manager import CacheManager
+
+
+def make_ingestor(rotator, tmp_path) -> BatchIngestor:
+    return BatchIngestor(rotator, CacheManager(cache_dir=str(tmp_path / "cache")), Checkpoint(),
+                         workers=1)
+
+
+def test_stops_when_server_reports_quota_used_up(rotator, daily_quota_error, tmp_path):
+    ingestor = make_ingestor(rotator, tmp_path)
+    processed = []
+    
+    async def process(video_id):
+        # The first video uses up every key's daily quota on the server side
+        processed.append(video_id)
+        for key in rotator.keys:
+            rotator.report_failure(key, daily_quota_error)
+        return "pending"
+    
+    ingestor._process = process
+    report = asyncio.run(ingestor.run(["video00001", "video00002", "video00003"]))
+    
+    assert processed == ["video00001"]
+    assert report.pending == ["video00001", "video00002", "video00003"]
+    assert report.exit_code == EXIT_QUOTA
+
+
+def test_remaining_quota_skips_exhausted_keys(rotator, daily_quota_error, tmp_path):
+    ingestor = make_ingestor(rotator, tmp_path)
+    full = ingestor._remaining_quota()
+    
+    rotator.report_failure(rotator.keys[0], daily_quota_error)
+    
+    assert ingestor._remaining_quota() == full - rotator.daily_limit(rotator.keys[0])
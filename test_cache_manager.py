@@ -0,0 +1,95 @@
+"""
+Offline tests for the SQLite cache
+"""
+
+import json
+
+from backend.utils.cache_manager import COMPONENTS, CacheManager
+
+
+QUIZ = [{"question": "Where does photosynthesis happen?", "options": ["Chloroplasts", "Roots"], "answer": 0}]
+
+
+def write_legacy(cache_dir, component: str, video_id: str, content):
+    """A file as written by the JSON-tree cache"""
+    folder = cache_dir / COMPONENTS[component]
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / f"{video_id}.json", "w", encoding="utf-8") as f:
+        json.dump({"video_id": video_id, "content": content, "cached_at": "2025-01-01T00:00:00"}, f)
+
+
+def test_json_tree_migrated_and_removed(tmp_path):
+    write_legacy(tmp_path, "transcript", "video00001", "Plants turn light into sugar.")
+    write_legacy(tmp_path, "summary", "video00001", "Photosynthesis summary")
+    write_legacy(tmp_path, "key_points", "video00001", "- Light\n- Sugar")
+    write_legacy(tmp_path, "quiz", "video00001", QUIZ)
+    
+    cache = CacheManager(cache_dir=str(tmp_path))
+    
+    assert cache.get_cached_data("video00001") == {
+        "transcript": "Plants turn light into sugar.",
+        "summary": "Photosynthesis summary",
+        "key_points": "- Light\n- Sugar",
+        "quiz": QUIZ,
+    }
+    assert not list(tmp_path.rglob("*.json"))
+    assert cache.get_cache_stats()["total_videos"] == 1
+
+
+def test_json_tree_keeps_files_it_cannot_migrate(tmp_path):
+    # A summary without its transcript has no content hash to be filed under
+    write_legacy(tmp_path, "summary", "video00002", "Orphaned summary")
+    
+    cache = CacheManager(cache_dir=str(tmp_path))
+    
+    assert (tmp_path / "summaries" / "video00002.json").exists()
+    assert cache.get_cached_components("video00002") == {}
+
+
+def test_database_values_win_over_legacy_files(tmp_path):
+    CacheManager(cache_dir=str(tmp_path)).save_to_cache("video00001", transcript="Current transcript")
+    write_legacy(tmp_path, "transcript", "video00001", "Stale transcript")
+    
+    cache = CacheManager(cache_dir=str(tmp_path))
+    
+    assert cache.get_cached_components("video00001")["transcript"] == "Current transcript"
+
+
+def test_generated_content_shared_by_identical_transcripts(tmp_path):
+    cache = CacheManager(cache_dir=str(tmp_path))
+    cache.save_to_cache("original01", transcript="Plants turn light into sugar.")
+    cache.save_to_cache("original01", summary="Shared summary", key_points="- Light", quiz=QUIZ)
+    
+    # A re-upload whose transcript differs only in case and whitespace
+    cache.save_to_cache("reupload01", transcript="plants  turn light\ninto sugar.")
+    
+    assert cache.is_cached("reupload01")
+    assert cache.get_cached_data("reupload01")["summary"] == "Shared summary"
+    assert cache.get_cache_stats()["summaries"] == 1
+    
+    # Clearing one video keeps the content the other still uses
+    cache.clear_cache("original01")
+    assert cache.get_cached_data("reupload01")["quiz"] == QUIZ
+
+
+def test_changed_transcript_does_not_reuse_old_content(tmp_path):
+    cache = CacheManager(cache_dir=str(tmp_path))
+    cache.save_to_cache("video00001", transcript="First version of the captions.")
+    cache.save_to_cache("video00001", summary="Summary of the first version")
+    
+    cache.save_to_cache("video00001", transcript="Corrected captions with new content.")
+    
+    assert "summary" not in cache.get_cached_components("video00001")
+
+
+def test_version_change_invalidates_only_that_component(tmp_path):
+    CacheManager(cache_dir=str(tmp_path)).save_to_cache(
+        "video00001", transcript="Plants turn light into sugar."
+    )
+    CacheManager(cache_dir=str(tmp_path)).save_to_cache(
+        "video00001", summary="Summary", key_points="- Light", quiz=QUIZ
+    )
+    
+    cache = CacheManager(cache_dir=str(tmp_path), versions={"quiz": "new-prompt/v2"})
+    
+    assert set(cache.get_cached_components("video00001")) == {"transcript", "summary", "key_points"}
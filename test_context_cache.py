@@ -0,0 +1,191 @@
+"""
+Offline tests for transcript context caching
+
+FakeContextCache stands in for the Gemini cachedContents API, so AIService
+requests are answered locally against the registered text.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import pytest
+
+from backend.services.ai_service import AIService, CACHED_TRANSCRIPT, MODEL_NAME
+from backend.services.context_cache import CachedContext, ContextCache
+from backend.services.model_router import ModelRouter
+
+
+@dataclass
+class FakeResponse:
+    """Minimal stand-in for a GenerateContentResponse"""
+    text: str
+    
+    @property
+    def parts(self):
+        return [self.text] if self.text else []
+
+
+class FakeModel:
+    """Offline model answering prompts against a FakeContextCache context"""
+    
+    def __init__(self, cache: "FakeContextCache", context: CachedContext):
+        self.cache = cache
+        self.context = context
+    
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        self.cache.requests.append((self.context.name, prompt))
+        text = self.cache.responder(prompt, self.context.handle)
+        if stream:
+            return iter(FakeResponse(word + " ") for word in text.split())
+        return FakeResponse(text)
+    
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        response = self.generate_content(prompt, stream=stream, **kwargs)
+        if not stream:
+            return response
+        
+        async def chunks():
+            for chunk in response:
+                yield chunk
+        return chunks()
+
+
+class FakeContextCache(ContextCache):
+    """
+    In-memory context cache
+    
+    Records every registration in `created` and every prompt in `requests`;
+    answers come from `responder(prompt, cached_text)`.
+    """
+    
+    def __init__(self, responder: Optional[Callable[[str, str], str]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.responder = responder or (lambda prompt, text: f"Answer from {len(text)} cached characters")
+        self.created = []
+        self.requests = []
+    
+    def _create(self, api_key: str, text: str, digest: str, model: str) -> CachedContext:
+        context = CachedContext(
+            name=f"cachedContents/fake-{len(self.created) + 1}",
+            api_key=api_key,
+            digest=digest,
+            expires_at=self.clock() + self.ttl.total_seconds(),
+            handle=text
+        )
+        self.created.append(context)
+        return context
+    
+    def model_for(self, context: CachedContext, api_key: str) -> FakeModel:
+        return FakeModel(self, context)
+
+
+class FailingContextCache(FakeContextCache):
+    """Context cache whose registrations always raise `error`"""
+    
+    def __init__(self, error: Exception, **kwargs):
+        super().__init__(**kwargs)
+        self.error = error
+        self.attempts = 0
+    
+    def _create(self, api_key: str, text: str, digest: str, model: str) -> CachedContext:
+        self.attempts += 1
+        raise self.error
+
+
+TRANSCRIPT = " ".join(f"Sentence {i} of a long lecture about photosynthesis." for i in range(600))
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return FakeContextCache(clock=lambda: clock[0])
+
+
+def make_service(cache: ContextCache, key: str = "AIzaTestKeyOne") -> AIService:
+    return AIService(key, context_cache=cache, router=ModelRouter())
+
+
+def test_one_registration_per_key_model_and_transcript(cache):
+    service = make_service(cache)
+    
+    assert service.generate_summary(TRANSCRIPT) == f"Answer from {len(TRANSCRIPT)} cached characters"
+    service.generate_summary(TRANSCRIPT)
+    assert len(cache.created) == 1
+    
+    # key_points is routed to another model, which needs its own context
+    service.extract_key_points(TRANSCRIPT)
+    assert len(cache.created) == 2
+    
+    # Contexts belong to the key that registered them
+    service.update_api_key("AIzaTestKeyTwo")
+    service.generate_summary(TRANSCRIPT)
+    assert len(cache.created) == 3
+    assert [c.api_key for c in cache.created] == ["AIzaTestKeyOne", "AIzaTestKeyOne", "AIzaTestKeyTwo"]
+    assert len({c.digest for c in cache.created}) == 1
+    
+    # Prompts reference the context instead of carrying the transcript
+    assert all(CACHED_TRANSCRIPT in prompt and TRANSCRIPT not in prompt
+               for _, prompt in cache.requests)
+
+
+def test_context_reused_within_ttl(cache, clock):
+    service = make_service(cache)
+    service.generate_summary(TRANSCRIPT)
+    
+    clock[0] += cache.ttl.total_seconds() / 2
+    service.generate_summary(TRANSCRIPT)
+    
+    assert len(cache.created) == 1
+    assert [name for name, _ in cache.requests] == [cache.created[0].name] * 2
+
+
+def test_context_registered_again_after_expiry(cache, clock):
+    service = make_service(cache)
+    service.generate_summary(TRANSCRIPT)
+    
+    clock[0] += cache.ttl.total_seconds()
+    service.generate_summary(TRANSCRIPT)
+    
+    assert len(cache.created) == 2
+    assert cache.requests[-1][0] == cache.created[1].name
+    # The expired entry was dropped rather than kept alongside the new one
+    assert len(cache._contexts) == 1
+    assert len(cache._entry_locks) == 1
+
+
+def test_short_transcript_sent_inline(cache):
+    service = make_service(cache)
+    short = "A two minute clip about leaves."
+    
+    prompt, model = service._with_context(AIService._summary_prompt, short, MODEL_NAME)
+    
+    assert cache.acquire(service.api_key, short) is None
+    assert short in prompt
+    assert not isinstance(model, FakeModel)
+    assert cache.created == []
+
+
+def test_unsupported_after_non_rate_limit_error():
+    cache = FailingContextCache(Exception("400 CachedContent is not supported for this model"))
+    
+    assert cache.acquire("AIzaTestKeyOne", TRANSCRIPT) is None
+    assert ("AIzaTestKeyOne", MODEL_NAME) in cache._unsupported
+    
+    # Not retried for that key and model
+    assert cache.acquire("AIzaTestKeyOne", TRANSCRIPT) is None
+    assert cache.attempts == 1
+
+
+def test_rate_limit_error_is_retried_later():
+    cache = FailingContextCache(Exception("429 Resource has been exhausted"))
+    
+    assert cache.acquire("AIzaTestKeyOne", TRANSCRIPT) is None
+    assert cache.acquire("AIzaTestKeyOne", TRANSCRIPT) is None
+    
+    assert cache._unsupported == set()
+    assert cache.attempts == 2
@@ -0,0 +1,42 @@
+"""
+Offline tests for JobWorker's quota handling
+"""
+
+import asyncio
+
+from backend.services.job_worker import JobWorker
+from backend.utils.api_key_rotator import APIKeyRotator
+from backend.utils.cache_manager import CacheManager
+from backend.utils.job_queue import JobQueue, QUEUED
+from backend.utils.rate_limiter import RateLimiter
+
+
+def test_exhausted_keys_are_not_available(rotator, daily_quota_error):
+    for key in rotator.keys:
+        rotator.report_failure(key, daily_quota_error)
+    
+    assert not rotator.has_available_quota()
+    assert rotator.get_available_keys(2) == []
+    assert rotator.remaining_requests() == 0
+    assert all(not stats["healthy"] and stats["remaining_today"] == 0
+               for stats in rotator.get_stats()["keys"])
+    
+    # Another process sharing the usage store sees the exhaustion too
+    other = APIKeyRotator(rate_limiter=RateLimiter(), usage_store=rotator.usage_store)
+    assert not other.has_available_quota()
+
+
+def test_job_stays_queued_without_quota(rotator, daily_quota_error, tmp_path):
+    for key in rotator.keys:
+        rotator.report_failure(key, daily_quota_error)
+    
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    job = queue.enqueue("dQw4w9WgXcQ")
+    worker = JobWorker(rotator, CacheManager(cache_dir=str(tmp_path / "cache")), queue,
+                       concurrency=1, poll_interval=0.01)
+    
+    asyncio.run(worker.run(once=True))
+    
+    job = queue.get(job.id)
+    assert job.status == QUEUED
+    assert job.attempts == 0
@@ -0,0 +1,47 @@
+"""
+Offline tests for the pipeline's key selection
+"""
+
+from backend.services.model_router import ModelRouter
+from backend.services.pipeline import ProcessingPipeline
+from backend.utils.rate_limiter import DEFAULT_MODEL
+from backend.utils.single_flight import SingleFlight
+
+
+LIGHT_MODEL = ModelRouter().route("chunk_map").model
+
+
+def make_pipeline(rotator) -> ProcessingPipeline:
+    return ProcessingPipeline(rotator, router=ModelRouter(), single_flight=SingleFlight(None))
+
+
+def test_chunk_keys_ranked_on_the_routed_model(rotator, daily_quota_error):
+    # The first key is out of quota on the light model only
+    rotator.report_failure(rotator.keys[0], daily_quota_error, LIGHT_MODEL)
+    pipeline = make_pipeline(rotator)
+    
+    assert pipeline._task_keys("chunk_map", 2) == (LIGHT_MODEL, [rotator.keys[1]])
+    assert rotator.get_available_keys(2) == rotator.keys
+
+
+def test_task_keys_fall_back_with_the_route(rotator, daily_quota_error):
+    for key in rotator.keys:
+        rotator.report_failure(key, daily_quota_error, LIGHT_MODEL)
+    pipeline = make_pipeline(rotator)
+    
+    model, keys = pipeline._task_keys("chunk_map", 2)
+    
+    assert model == DEFAULT_MODEL
+    assert sorted(keys) == sorted(rotator.keys)
+
+
+def test_stage_keys_ranked_on_each_stage_model(rotator, daily_quota_error):
+    # key_points goes to the light model, where only the second key has quota left
+    rotator.report_failure(rotator.keys[0], daily_quota_error, LIGHT_MODEL)
+    pipeline = make_pipeline(rotator)
+    
+    keys = pipeline._stage_keys(["summary", "key_points", "quiz"])
+    
+    assert keys["key_points"] == rotator.keys[1]
+    # The two stages on the full model get distinct keys
+    assert {keys["summary"], keys["quiz"]} == set(rotator.keys)
@@ -0,0 +1,78 @@
+"""
+Offline tests for the per-key rate limiter
+"""
+
+import pytest
+from google.api_core import exceptions
+
+from backend.utils import rate_limiter
+from backend.utils.rate_limiter import DailyAllowance, RateLimiter, TokenBucket, is_server_error
+
+
+def test_token_bucket_refills_evenly():
+    bucket = TokenBucket(capacity=5, period=60.0)
+    start = bucket.updated
+    for _ in range(5):
+        assert bucket.wait_time(start) == 0.0
+        bucket.consume(start)
+    
+    assert bucket.wait_time(start) == pytest.approx(12.0)
+    # One token back after a fifth of the period, never more than the capacity
+    assert bucket.wait_time(start + 12.0) == 0.0
+    bucket.wait_time(start + 3600.0)
+    assert bucket.tokens == 5
+
+
+def test_daily_allowance_resets_at_day_boundary(monkeypatch):
+    day = ["2026-10-17"]
+    monkeypatch.setattr(rate_limiter, "quota_day", lambda: day[0])
+    allowance = DailyAllowance(capacity=2)
+    allowance.consume(0.0)
+    allowance.consume(0.0)
+    
+    # Used up until the next quota day, however much time passes within it
+    assert allowance.wait_time(86000.0) > 0
+    
+    day[0] = "2026-10-18"
+    assert allowance.wait_time(0.0) == 0.0
+    assert allowance.tokens == 2
+
+
+def test_exhausted_key_waits_for_next_day(monkeypatch):
+    day = ["2026-10-17"]
+    monkeypatch.setattr(rate_limiter, "quota_day", lambda: day[0])
+    limiter = RateLimiter(limits={"model": {"rpm": 10, "rpd": 20}})
+    
+    limiter.exhaust("key", "model")
+    assert limiter.exhausted_today("key", "model")
+    assert limiter.try_acquire("key", "model") > 0
+    
+    day[0] = "2026-10-18"
+    assert not limiter.exhausted_today("key", "model")
+    assert limiter.try_acquire("key", "model") == 0.0
+
+
+@pytest.mark.parametrize("error", [
+    exceptions.InternalServerError("boom"),
+    exceptions.ServiceUnavailable("try later"),
+    Exception("503 The model is overloaded. Please try again later."),
+    Exception("500 An internal error has occurred"),
+])
+def test_server_errors(error):
+    assert is_server_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    Exception("400 Request contains 1500 tokens over the limit"),
+    Exception("Video abc5003xyz is private"),
+    exceptions.InvalidArgument("bad prompt"),
+])
+def test_not_server_errors(error):
+    assert not is_server_error(error)
+
+
+def test_server_error_from_status_code_attribute():
+    class HTTPError(Exception):
+        status_code = 502
+    
+    assert is_server_error(HTTPError("Bad gateway from proxy"))
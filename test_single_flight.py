@@ -0,0 +1,112 @@
+"""
+Offline tests for single-flight coalescing
+"""
+
+import asyncio
+
+import pytest
+
+from backend.utils.single_flight import SingleFlight
+
+
+def counting(value, delay: float = 0.05):
+    """Coroutine factory that records how often it ran"""
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value
+    return compute, calls
+
+
+def test_concurrent_callers_share_one_computation():
+    group = SingleFlight(None)
+    compute, calls = counting("summary")
+    
+    async def main():
+        return await asyncio.gather(*[group.do("video:summary", compute) for _ in range(5)])
+    
+    assert asyncio.run(main()) == ["summary"] * 5
+    assert len(calls) == 1
+
+
+def test_different_keys_computed_separately():
+    group = SingleFlight(None)
+    compute, calls = counting("value")
+    
+    async def main():
+        return await asyncio.gather(group.do("a:summary", compute), group.do("b:summary", compute))
+    
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_error_reaches_joined_callers_and_is_not_cached():
+    group = SingleFlight(None)
+    
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("quota exhausted")
+    
+    async def main():
+        return await asyncio.gather(group.do("k", fail), group.do("k", fail), return_exceptions=True)
+    
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+    
+    compute, calls = counting("recovered", delay=0)
+    assert asyncio.run(group.do("k", compute)) == "recovered"
+    assert len(calls) == 1
+
+
+def test_waiters_take_over_when_leader_is_cancelled():
+    group = SingleFlight(None)
+    compute, calls = counting("value")
+    
+    async def main():
+        leader = asyncio.create_task(group.do("k", compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(group.do("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+    
+    assert asyncio.run(main()) == "value"
+    assert len(calls) == 2
+
+
+def test_other_process_waits_for_stored_result(tmp_path):
+    db = str(tmp_path / "inflight.db")
+    first, second = SingleFlight(db, poll_interval=0.01), SingleFlight(db, poll_interval=0.01)
+    store = {}
+    
+    async def compute():
+        await asyncio.sleep(0.1)
+        store["k"] = "from first"
+        return "from first"
+    
+    async def never():
+        raise AssertionError("computed twice")
+    
+    async def main():
+        leader = asyncio.create_task(first.do("k", compute, lambda: store.get("k")))
+        await asyncio.sleep(0.02)
+        return await asyncio.gather(leader, second.do("k", never, lambda: store.get("k")))
+    
+    assert asyncio.run(main()) == ["from first", "from first"]
+
+
+def test_expired_lease_taken_over(tmp_path):
+    db = str(tmp_path / "inflight.db")
+    crashed = SingleFlight(db, lease_seconds=0.2)
+    survivor = SingleFlight(db, lease_seconds=0.2, poll_interval=0.02)
+    
+    # The holder took the lease and died without renewing or releasing it
+    assert crashed._try_lease("k")
+    assert not survivor._try_lease("k")
+    
+    compute, calls = counting("recomputed", delay=0)
+    assert asyncio.run(survivor.do("k", compute, lambda: None)) == "recomputed"
+    assert len(calls) == 1
@@ -0,0 +1,63 @@
+"""
+Offline tests for transcript normalization
+"""
+
+from backend.utils.transcript_normalizer import TranscriptNormalizer
+
+
+def segment(text: str, start: float) -> dict:
+    return {"text": text, "start": start, "duration": 2.0}
+
+
+def test_rolling_caption_overlap_removed():
+    segments = [
+        segment("today we are going to talk", 0.0),
+        segment("going to talk about photosynthesis", 2.0),
+        segment("about photosynthesis in plants", 4.0),
+    ]
+    
+    result = TranscriptNormalizer().normalize("", segments)
+    
+    assert result.text == "today we are going to talk about photosynthesis in plants"
+    # Timing of each segment is kept
+    assert [s["start"] for s in result.segments] == [0.0, 2.0, 4.0]
+
+
+def test_overlap_match_ignores_case():
+    segments = [segment("This Is How It Works", 0.0), segment("how it works in practice", 2.0)]
+    
+    assert TranscriptNormalizer().normalize("", segments).text == "This Is How It Works in practice"
+
+
+def test_single_word_repeats_kept():
+    segments = [segment("no", 0.0), segment("no, no that is wrong", 1.0), segment("wrong wrong", 2.0)]
+    
+    assert TranscriptNormalizer().normalize("", segments).text == "no no, no that is wrong wrong wrong"
+
+
+def test_fully_repeated_segment_dropped():
+    segments = [segment("the light reactions", 0.0), segment("the light reactions", 2.0),
+                segment("happen in the thylakoids", 4.0)]
+    
+    result = TranscriptNormalizer().normalize("", segments)
+    
+    assert result.text == "the light reactions happen in the thylakoids"
+    assert [s["start"] for s in result.segments] == [0.0, 4.0]
+
+
+def test_non_speech_markers_and_fillers():
+    normalizer = TranscriptNormalizer(drop_fillers=True)
+    segments = [segment("[Music] um so this is ♪ the intro ♪", 0.0), segment("(applause)", 2.0)]
+    
+    result = normalizer.normalize("", segments)
+    
+    assert result.text == "so this is the intro"
+    assert len(result.segments) == 1
+
+
+def test_plain_text_cleaned_without_segments():
+    result = TranscriptNormalizer().normalize("Hello   [Applause]  world\n\n")
+    
+    assert result.text == "Hello world"
+    assert result.segments is None
+    assert result.stats["chars_after"] < result.stats["chars_before"]
@@ -0,0 +1,24 @@
+"""
+YouTube Learning Assistant - Background Worker Entry Point
+Processes videos queued by the app, independently of browser sessions
+
+Usage:
+    python worker.py --workers 2
+"""
+
+import sys
+import os
+
+from dotenv import load_dotenv
+
+# Add project root to path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# Load environment variables (API keys, CACHE_MAX_MB, ...)
+load_dotenv()
+
+from backend.services.job_worker import main
+
+if __name__ == "__main__":
+    sys.exit(main())